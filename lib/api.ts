@@ -162,6 +162,17 @@ export const checkApiHealth = async (): Promise<{ status: 'online' | 'offline';
   }
 };
 
+// Home screen: joined meetups, nearby public meetups and recent messages in one call.
+// Sections that timed out on the server are null and listed in `missing`.
+export const getHome = async (params: { user_id: string; lat?: number; lng?: number }) => {
+  const query = new URLSearchParams({ user_id: params.user_id });
+  if (params.lat !== undefined && params.lng !== undefined) {
+    query.set('lat', String(params.lat));
+    query.set('lng', String(params.lng));
+  }
+  return apiRequest(`/home?${query.toString()}`);
+};
+
 // Create meetup API call
 export const createMeetup = async (data: any) => {
   return apiRequest('/create_meetup', {
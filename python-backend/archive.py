@@ -0,0 +1,101 @@
+"""
+Cold storage for the chat history of archived meetups
+
+Once a meetup is archived its messages are compacted out of the hot messages
+table into immutable blocks in object storage (Supabase Storage, or the
+local file directory in mock mode), next to the meetup's files:
+
+    archive/<meetup_id>/<random>.blk   zlib-compressed JSON array of up to
+                                       BLOCK_MESSAGES messages, oldest first
+
+The database lists each meetup's blocks in order (message_archive_blocks:
+storage path, byte length, message count and the newest message's
+(created_at, id)). archive_message_block() records a block and deletes the
+hot rows it holds in one transaction, and it is only called once storage has
+confirmed the upload, so a crash or restart at any point leaves every
+message either in a recorded block or still in the hot table. A block that
+was uploaded but never recorded is not referenced by anything; the next
+compaction writes those messages again.
+
+Pages are located from the per-block message counts, so only the blocks
+that overlap the requested page are downloaded and decompressed. Until a
+meetup is sealed, readers put the hot rows newer than the last block in
+front of the archive, so a meetup reads the same before, during and after
+its compaction.
+"""
+
+import asyncio
+import json
+import uuid
+import zlib
+from typing import Any, Dict, List, NamedTuple
+
+BLOCK_MESSAGES = 256
+
+
+class BlockRef(NamedTuple):
+    storage_path: str
+    length: int
+    count: int
+    # (created_at, id) of the block's newest message: the hot rows after it are not archived
+    last_created_at: str
+    last_id: str
+
+
+def encode_block(messages: List[Dict[str, Any]]) -> bytes:
+    return zlib.compress(json.dumps(messages, separators=(",", ":"), default=str).encode("utf-8"), 6)
+
+
+def decode_block(data: bytes) -> List[Dict[str, Any]]:
+    return json.loads(zlib.decompress(data))
+
+
+class MessageArchive:
+    """Compressed message blocks, stored through a file storage backend"""
+
+    def __init__(self, storage: Any):
+        self.storage = storage
+
+    async def write_block(self, meetup_id: str, messages: List[Dict[str, Any]]) -> BlockRef:
+        """
+        Upload messages (oldest first, at most BLOCK_MESSAGES) as a new block
+        Returns once storage has confirmed the upload; raises otherwise.
+        """
+        data = await asyncio.to_thread(encode_block, messages)
+        # A fresh name per attempt, so a retried or concurrent compaction never overwrites a recorded block
+        storage_path = f"archive/{meetup_id}/{uuid.uuid4().hex}.blk"
+        await self.storage.put(storage_path, data, "application/octet-stream")
+        newest = messages[-1]
+        return BlockRef(storage_path, len(data), len(messages), newest["timestamp"], newest["id"])
+
+    async def read_block(self, ref: BlockRef) -> List[Dict[str, Any]]:
+        """One block's messages, oldest first"""
+        chunks = [chunk async for chunk in self.storage.read(ref.storage_path, 0, ref.length - 1)]
+        return await asyncio.to_thread(decode_block, b"".join(chunks))
+
+    async def read_page(self, blocks: List[BlockRef], limit: int, offset: int = 0) -> List[Dict[str, Any]]:
+        """
+        A page of archived messages, newest first (same order as get_messages)
+        Only the blocks overlapping [offset, offset + limit) are read.
+        """
+        wanted: List[BlockRef] = []
+        skip = offset
+        first_skip = 0
+        remaining = limit
+        # Walk blocks newest first, skipping whole blocks that lie before the page
+        for ref in reversed(blocks):
+            if remaining <= 0:
+                break
+            if skip >= ref.count:
+                skip -= ref.count
+                continue
+            if not wanted:
+                first_skip = skip
+            wanted.append(ref)
+            remaining -= ref.count - skip
+            skip = 0
+
+        page: List[Dict[str, Any]] = []
+        for block in await asyncio.gather(*(self.read_block(ref) for ref in wanted)):
+            page.extend(reversed(block))
+        return page[first_skip:first_skip + limit]
@@ -0,0 +1,567 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for the PennApps Meetup API backend
+
+Runs against the in-process data structures, so no server or Supabase
+project is needed.
+
+Usage:
+    python bench.py                 # run every benchmark
+    python bench.py search          # run a single benchmark
+"""
+
+import argparse
+import itertools
+import random
+import statistics
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Tuple
+
+WORDS = (
+    "pizza demo judges api bug deploy team table wifi slides react native "
+    "python backend hackathon sponsor swag coffee workshop mentor idea build "
+    "laptop charger room floor hall stage prize track submit devpost expo "
+    "map chat invite token schema index query cache latency server client"
+).split()
+
+
+def _percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+def _report(name: str, samples_ms: List[float]) -> None:
+    print(
+        f"  {name:<28} p50={_percentile(samples_ms, 0.50):8.3f}ms "
+        f"p99={_percentile(samples_ms, 0.99):8.3f}ms "
+        f"mean={statistics.mean(samples_ms):8.3f}ms"
+    )
+
+
+def _random_sentence(rng: random.Random, min_words: int = 4, max_words: int = 18) -> str:
+    # Zipf-ish skew so a handful of words dominate like real chat
+    return " ".join(
+        WORDS[min(int(rng.paretovariate(1.2)) - 1, len(WORDS) - 1)] if rng.random() < 0.6 else rng.choice(WORDS)
+        for _ in range(rng.randint(min_words, max_words))
+    )
+
+
+def bench_search(messages: int = 100_000, queries: int = 500) -> None:
+    """Chat search latency on a single meetup with a large history"""
+    from search import MessageSearchIndex
+
+    print(f"🔍 search: {messages:,} messages in one meetup")
+    rng = random.Random(42)
+    meetup_id = str(uuid.uuid4())
+    index = MessageSearchIndex()
+    start = datetime.now() - timedelta(days=1)
+
+    t0 = time.perf_counter()
+    for i in range(messages):
+        index.add({
+            "id": str(uuid.uuid4()),
+            "meetup_id": meetup_id,
+            "user_id": f"user-{rng.randint(1, 500)}",
+            "message": _random_sentence(rng),
+            "message_type": "text",
+            "timestamp": start + timedelta(seconds=i),
+        })
+    build_s = time.perf_counter() - t0
+    print(f"  index build: {build_s:.2f}s ({messages / build_s:,.0f} msg/s)")
+
+    cases: Dict[str, Callable[[], str]] = {
+        "common term": lambda: WORDS[0],
+        "rare term": lambda: rng.choice(WORDS[-10:]),
+        "two terms": lambda: f"{rng.choice(WORDS)} {rng.choice(WORDS)}",
+        "three terms": lambda: " ".join(rng.choice(WORDS) for _ in range(3)),
+    }
+    for name, make_query in cases.items():
+        samples = []
+        for _ in range(queries):
+            query = make_query()
+            t0 = time.perf_counter()
+            index.search(meetup_id, query, limit=20)
+            samples.append((time.perf_counter() - t0) * 1000)
+        _report(name, samples)
+
+    # Paging deep into a common term exercises the cursor path
+    samples = []
+    _, cursor = index.search(meetup_id, WORDS[0], limit=20)
+    for _ in range(50):
+        if cursor is None:
+            break
+        t0 = time.perf_counter()
+        _, cursor = index.search(meetup_id, WORDS[0], limit=20, cursor=cursor)
+        samples.append((time.perf_counter() - t0) * 1000)
+    if samples:
+        _report("cursor page (common term)", samples)
+    print()
+
+
+def bench_meetup_search(meetups: int = 20_000, sessions: int = 200) -> None:
+    """As-you-type meetup search latency, typing titles one keystroke at a time"""
+    from search import MeetupSearchIndex
+
+    print(f"🔍 meetup_search: {meetups:,} meetups")
+    rng = random.Random(7)
+    index = MeetupSearchIndex()
+    now = datetime.now()
+
+    # Titles draw from a few thousand pseudo-words with a Zipf skew, like real event names
+    syllables = ["ba", "ca", "de", "fi", "go", "ha", "ji", "ko", "lu", "ma", "ne", "po", "ra", "si", "tu", "vo", "ze"]
+    vocabulary = WORDS + sorted({
+        "".join(rng.choice(syllables) for _ in range(rng.randint(2, 4))) for _ in range(3000)
+    })
+
+    cum_weights = list(itertools.accumulate(1.0 / (rank + 1) for rank in range(len(vocabulary))))
+
+    def word() -> str:
+        return rng.choices(vocabulary, cum_weights=cum_weights)[0]
+
+    titles = []
+    for _ in range(meetups):
+        title = " ".join(word() for _ in range(rng.randint(2, 5)))
+        titles.append(title)
+        start = now + timedelta(minutes=rng.randint(-600, 6000))
+        index.add({
+            "id": str(uuid.uuid4()),
+            "title": title,
+            "description": " ".join(word() for _ in range(rng.randint(5, 25))),
+            "start_ts": start,
+            "end_ts": start + timedelta(hours=rng.randint(1, 6)),
+            "lat": 39.95 + rng.uniform(-0.05, 0.05),
+            "lng": -75.19 + rng.uniform(-0.05, 0.05),
+            "visibility": "public" if rng.random() < 0.7 else "private",
+        })
+
+    def visible(meetup):
+        return meetup["visibility"] == "public"
+
+    keystrokes, filtered = [], []
+    for _ in range(sessions):
+        title = rng.choice(titles)
+        for i in range(1, len(title) + 1):
+            t0 = time.perf_counter()
+            index.search(title[:i], visible, limit=20)
+            keystrokes.append((time.perf_counter() - t0) * 1000)
+        t0 = time.perf_counter()
+        index.search(title, visible, window_start=now, window_end=now + timedelta(hours=24),
+                     near=(39.95, -75.19, 2000), limit=20)
+        filtered.append((time.perf_counter() - t0) * 1000)
+    _report("keystroke", keystrokes)
+    _report("text + window + radius", filtered)
+    print(f"  cache hit rate: {index.cache_hits / (index.cache_hits + index.cache_misses):.0%}")
+    print()
+
+
+def bench_wire(iterations: int = 300) -> None:
+    """Payload size and encode CPU of representative list pages per wire format"""
+    from wire import JSON, COLUMNAR_JSON, MSGPACK, available_formats, available_encodings, encode_body, compress
+
+    print("📦 wire: 50-message page and 20-meetup search page")
+    rng = random.Random(3)
+    meetup_id = str(uuid.uuid4())
+    users = [str(uuid.uuid4()) for _ in range(8)]
+    now = datetime.now()
+    messages_page = {
+        "messages": [
+            {
+                "id": str(uuid.uuid4()),
+                "meetup_id": meetup_id,
+                "user_id": user_id,
+                "user_name": f"user{users.index(user_id)}",
+                "message": _random_sentence(rng, 3, 20),
+                "message_type": "text" if rng.random() < 0.95 else "announcement",
+                "timestamp": (now - timedelta(seconds=30 * i)).isoformat(),
+                "is_own_message": user_id == users[0],
+            }
+            for i, user_id in enumerate(rng.choice(users) for _ in range(50))
+        ],
+        "total_count": 50,
+        "has_more": True,
+    }
+    meetups_page = {
+        "meetups": [
+            {
+                "id": str(uuid.uuid4()),
+                "title": _random_sentence(rng, 2, 5),
+                "description": _random_sentence(rng, 8, 30),
+                "start_ts": (now + timedelta(minutes=rng.randint(0, 600))).isoformat(),
+                "end_ts": (now + timedelta(minutes=rng.randint(600, 900))).isoformat(),
+                "lat": round(39.95 + rng.uniform(-0.02, 0.02), 6),
+                "lng": round(-75.19 + rng.uniform(-0.02, 0.02), 6),
+                "visibility": "public",
+                "attendee_count": rng.randint(1, 300),
+                "is_member": False,
+                "score": 1.0,
+            }
+            for _ in range(20)
+        ]
+    }
+
+    labels = {JSON: "json", COLUMNAR_JSON: "columnar", MSGPACK: "msgpack"}
+    for page_name, page, list_key in (("messages", messages_page, "messages"), ("meetups", meetups_page, "meetups")):
+        print(f"  {page_name} page")
+        for media_type in available_formats():
+            for encoding in [None] + available_encodings():
+                t0 = time.perf_counter()
+                for _ in range(iterations):
+                    body = encode_body(page, list_key, media_type)
+                    if encoding:
+                        body = compress(body, encoding)
+                cpu_ms = (time.perf_counter() - t0) * 1000 / iterations
+                label = labels[media_type] + (f"+{encoding}" if encoding else "")
+                print(f"    {label:<20} {len(body):>7,} bytes  {cpu_ms:6.3f}ms encode")
+    print()
+
+
+def bench_startup(runs: int = 3) -> None:
+    """Import-time profile and time-to-first-successful-request of a fresh uvicorn worker"""
+    import os
+    import socket
+    import subprocess
+    import sys
+    import urllib.request
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    print("🚀 startup")
+
+    # Heaviest imports by cumulative time, as reported by -X importtime
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=here, capture_output=True, text=True
+    )
+    imports = []
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            _, cumulative, name = line[len("import time:"):].split("|")
+            if cumulative.strip().isdigit():
+                imports.append((int(cumulative), name.rstrip()))
+    # Direct imports of main are indented one level below it
+    direct = [(us, name) for us, name in imports if len(name) - len(name.lstrip()) == 3]
+    print(f"  import main: {next((us for us, name in imports if name.strip() == 'main'), 0) / 1000:.0f}ms")
+    for us, name in sorted(direct, reverse=True)[:8]:
+        print(f"    {name.strip():<28} {us / 1000:7.1f}ms")
+
+    def wait_for(url: str, deadline: float) -> float:
+        while time.perf_counter() < deadline:
+            try:
+                with urllib.request.urlopen(url, timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter()
+            except OSError:
+                pass
+            time.sleep(0.005)
+        raise TimeoutError(url)
+
+    health, ready = [], []
+    for _ in range(runs):
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+        t0 = time.perf_counter()
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+            cwd=here, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        try:
+            deadline = t0 + 30
+            health.append((wait_for(f"http://127.0.0.1:{port}/health", deadline) - t0) * 1000)
+            ready.append((wait_for(f"http://127.0.0.1:{port}/ready", deadline) - t0) * 1000)
+        finally:
+            server.terminate()
+            server.wait()
+    _report("first 200 from /health", health)
+    _report("first 200 from /ready", ready)
+    print()
+
+
+def bench_files(size_mb: int = 100, part_mb: int = 16, runs: int = 3) -> None:
+    """Upload/download throughput of a large file through a uvicorn worker on local storage"""
+    import os
+    import socket
+    import subprocess
+    import sys
+    import tempfile
+    import httpx
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    size = size_mb * 1024 * 1024
+    chunk = os.urandom(1024 * 1024)
+    print(f"📁 files ({size_mb}MB, {part_mb}MB PATCH parts)")
+
+    def peak_rss_mb(pid: int) -> float:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+        return float("nan")
+
+    def body(n_bytes: int):
+        for _ in range(n_bytes // len(chunk)):
+            yield chunk
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    storage_dir = tempfile.mkdtemp(prefix="bench-files-")
+    env = {k: v for k, v in os.environ.items() if not k.startswith("SUPABASE_")}
+    env.update(
+        FILE_STORAGE_DIR=storage_dir,
+        MAX_FILE_BYTES=str(size),
+        MAX_MEETUP_BYTES=str(size * runs),
+        SWEEPER_ENABLED="false"
+    )
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=here, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    base = f"http://127.0.0.1:{port}"
+    upload_mbs, download_mbs, range_ms = [], [], []
+    try:
+        with httpx.Client(base_url=base, timeout=60) as client:
+            deadline = time.perf_counter() + 30
+            while True:
+                try:
+                    if client.get("/ready").status_code == 200:
+                        break
+                except httpx.TransportError:
+                    pass
+                if time.perf_counter() > deadline:
+                    raise TimeoutError("server did not become ready")
+                time.sleep(0.05)
+            rss_idle = peak_rss_mb(server.pid)
+
+            for _ in range(runs):
+                created = client.post("/meetups/bench/uploads", json={
+                    "user_id": "bench", "filename": "video.mp4", "file_type": "image", "length": size
+                }).json()
+                t0 = time.perf_counter()
+                for offset in range(0, size, part_mb * 1024 * 1024):
+                    part = min(part_mb * 1024 * 1024, size - offset)
+                    response = client.patch(
+                        f"/uploads/{created['upload_id']}",
+                        params={"user_id": "bench"},
+                        headers={"Upload-Offset": str(offset)},
+                        content=body(part)
+                    )
+                    response.raise_for_status()
+                upload_mbs.append(size_mb / (time.perf_counter() - t0))
+                file_id = response.json()["file_id"]
+
+                t0 = time.perf_counter()
+                received = 0
+                with client.stream("GET", f"/meetups/bench/files/{file_id}", params={"user_id": "bench"}) as download:
+                    for data in download.iter_raw():
+                        received += len(data)
+                assert received == size
+                download_mbs.append(size_mb / (time.perf_counter() - t0))
+
+                for _ in range(50):
+                    start = random.randrange(size - 65536)
+                    t0 = time.perf_counter()
+                    client.get(
+                        f"/meetups/bench/files/{file_id}",
+                        params={"user_id": "bench"},
+                        headers={"Range": f"bytes={start}-{start + 65535}"}
+                    ).raise_for_status()
+                    range_ms.append((time.perf_counter() - t0) * 1000)
+
+            rss_peak = peak_rss_mb(server.pid)
+    finally:
+        server.terminate()
+        server.wait()
+
+    print(f"  upload      {statistics.mean(upload_mbs):8.1f} MB/s  (best {max(upload_mbs):.1f})")
+    print(f"  download    {statistics.mean(download_mbs):8.1f} MB/s  (best {max(download_mbs):.1f})")
+    _report("64KB range request", range_ms)
+    print(f"  worker peak RSS {rss_peak:.0f}MB (idle {rss_idle:.0f}MB) after {runs}x {size_mb}MB each way")
+    print()
+
+
+def bench_presence(clients: int = 50_000, meetups: int = 1_000, minutes: int = 15) -> None:
+    """Soak of the presence tracker: heartbeating clients joining, leaving and dropping off"""
+    import heapq
+    import tracemalloc
+    from presence import PresenceTracker, PRESENCE_HEARTBEAT_SECONDS, PRESENCE_TTL_SECONDS
+
+    print(f"🟢 presence: {clients:,} clients in {meetups:,} meetups, {minutes} simulated minutes")
+    rng = random.Random(11)
+    now = [0.0]
+    tracker = PresenceTracker(clock=lambda: now[0], wall_clock=lambda: now[0])
+
+    # A few big meetups and a long tail of small ones
+    cum_weights = list(itertools.accumulate(1.0 / (rank + 1) for rank in range(meetups)))
+    meetup_ids = [str(uuid.uuid4()) for _ in range(meetups)]
+    homes = [rng.choices(meetup_ids, cum_weights=cum_weights)[0] for _ in range(clients)]
+    user_ids = [str(uuid.uuid4()) for _ in range(clients)]
+    last_beat: Dict[int, float] = {}
+
+    # (time, client): clients start at random points of one heartbeat interval
+    events = [(rng.uniform(0, PRESENCE_HEARTBEAT_SECONDS), c) for c in range(clients)]
+    heapq.heapify(events)
+    end = minutes * 60.0
+    beats, leaves, counts, pages = [], [], [], []
+    next_read = 1.0
+
+    started = time.perf_counter()
+    while events and events[0][0] < end:
+        at, c = heapq.heappop(events)
+        now[0] = at
+        roll = rng.random()
+        if roll < 0.002:
+            # App closed: explicit leave, back in a few minutes
+            t0 = time.perf_counter()
+            tracker.leave(homes[c], user_ids[c])
+            leaves.append((time.perf_counter() - t0) * 1000)
+            last_beat.pop(c, None)
+            heapq.heappush(events, (at + rng.uniform(60, 600), c))
+            continue
+        if roll < 0.004:
+            # Lost connection: heartbeats just stop, back in a few minutes
+            heapq.heappush(events, (at + rng.uniform(60, 600), c))
+            continue
+        t0 = time.perf_counter()
+        tracker.heartbeat(homes[c], user_ids[c])
+        beats.append((time.perf_counter() - t0) * 1000)
+        last_beat[c] = at
+        heapq.heappush(events, (at + PRESENCE_HEARTBEAT_SECONDS * rng.uniform(0.9, 1.1), c))
+
+        # Clients polling the online list, about ten times a simulated second
+        while next_read <= at:
+            meetup_id = rng.choices(meetup_ids, cum_weights=cum_weights)[0]
+            t0 = time.perf_counter()
+            tracker.count(meetup_id)
+            counts.append((time.perf_counter() - t0) * 1000)
+            t0 = time.perf_counter()
+            page, after = tracker.online(meetup_id, 50)
+            while after is not None:
+                page, after = tracker.online(meetup_id, 50, after)
+            pages.append((time.perf_counter() - t0) * 1000)
+            next_read += 0.1
+    elapsed = time.perf_counter() - started
+
+    # Online means a heartbeat within the TTL; expiry is rounded up to the next tick
+    expected: Dict[str, int] = {}
+    for c, at in last_beat.items():
+        if now[0] - at < PRESENCE_TTL_SECONDS:
+            expected[homes[c]] = expected.get(homes[c], 0) + 1
+    wrong = sum(1 for m in meetup_ids if tracker.count(m) != expected.get(m, 0))
+
+    # Footprint of a tracker with every client online
+    tracemalloc.start()
+    full = PresenceTracker(clock=lambda: now[0], wall_clock=lambda: now[0])
+    for c in range(clients):
+        full.heartbeat(homes[c], user_ids[c])
+    footprint = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    _report("heartbeat", beats)
+    _report("leave", leaves)
+    _report("online count", counts)
+    _report("full online list (50/page)", pages)
+    stats = tracker.stats()
+    print(
+        f"  {len(beats):,} heartbeats in {elapsed:.1f}s ({len(beats) / elapsed:,.0f}/s; "
+        f"real clients send {clients / PRESENCE_HEARTBEAT_SECONDS:,.0f}/s)"
+    )
+    print(f"  online at end: {stats['online']:,}, expired {stats['expired']:,}, left {stats['left']:,}")
+    print(f"  meetups with a count off the heartbeat log: {wrong} of {meetups:,}")
+    print(f"  memory with all {clients:,} online: {footprint / 1024 / 1024:.1f}MB ({footprint / clients:.0f} bytes each)")
+    print()
+
+
+def bench_active(meetups: int = 100_000, queries: int = 300) -> None:
+    """Time-window overlap lookups: interval tree vs separate start_ts/end_ts btrees"""
+    import bisect
+    from intervals import IntervalTree
+
+    print(f"🕒 active: {meetups:,} meetups over a year, half of them still ahead")
+    rng = random.Random(5)
+    year = 365 * 24 * 3600.0
+    rows = []
+    for i in range(meetups):
+        start = rng.uniform(-year / 2, year / 2)
+        rows.append((start, start + rng.uniform(1, 6) * 3600, str(i)))
+
+    tree = IntervalTree(seed=1)
+    t0 = time.perf_counter()
+    for start, end, key in rows:
+        tree.add(key, start, end)
+    print(f"  tree build: {time.perf_counter() - t0:.2f}s")
+
+    # The current layout: one btree per column, each bounding one side of the overlap
+    by_start = sorted(rows)
+    starts = [r[0] for r in by_start]
+    by_end = sorted(rows, key=lambda r: r[1])
+    ends = [r[1] for r in by_end]
+
+    def start_index(lo: float, hi: float) -> Tuple[int, int]:
+        # start_ts <= hi from the index, then end_ts >= lo row by row
+        read = bisect.bisect_right(starts, hi)
+        return sum(1 for r in by_start[:read] if r[1] >= lo), read
+
+    def end_index(lo: float, hi: float) -> Tuple[int, int]:
+        # end_ts >= lo from the index, then start_ts <= hi row by row
+        first = bisect.bisect_left(ends, lo)
+        return sum(1 for r in by_end[first:] if r[0] <= hi), len(ends) - first
+
+    windows = {"happening now": 0.0, "next 2 hours": 2 * 3600.0, "next 24 hours": 24 * 3600.0}
+    for name, width in windows.items():
+        at = [rng.uniform(-year / 4, year / 4) for _ in range(queries)]
+        samples: Dict[str, List[float]] = {"interval tree": [], "start_ts btree": [], "end_ts btree": []}
+        examined: Dict[str, List[int]] = {key: [] for key in samples}
+        for lo in at:
+            hi = lo + width
+            t0 = time.perf_counter()
+            found = sum(1 for _ in tree.overlapping(lo, hi))
+            samples["interval tree"].append((time.perf_counter() - t0) * 1000)
+            examined["interval tree"].append(found)
+            for label, scan in (("start_ts btree", start_index), ("end_ts btree", end_index)):
+                t0 = time.perf_counter()
+                matches, read = scan(lo, hi)
+                samples[label].append((time.perf_counter() - t0) * 1000)
+                examined[label].append(read)
+                assert matches == found
+        print(f"  {name} (~{statistics.mean(examined['interval tree']):.0f} matches)")
+        for label, ms in samples.items():
+            _report(f"  {label}", ms)
+        print(
+            f"    rows read per query: start_ts btree {statistics.mean(examined['start_ts btree']):,.0f}, "
+            f"end_ts btree {statistics.mean(examined['end_ts btree']):,.0f}"
+        )
+
+    # A first page of 20 only walks as far as it needs to
+    at = [rng.uniform(-year / 4, year / 4) for _ in range(queries)]
+    samples_page = []
+    for lo in at:
+        t0 = time.perf_counter()
+        list(itertools.islice(tree.overlapping(lo, lo + 24 * 3600), 20))
+        samples_page.append((time.perf_counter() - t0) * 1000)
+    _report("tree, first 20 of next 24h", samples_page)
+    print()
+
+
+BENCHMARKS: Dict[str, Callable[[], None]] = {
+    "search": bench_search,
+    "meetup_search": bench_meetup_search,
+    "wire": bench_wire,
+    "startup": bench_startup,
+    "files": bench_files,
+    "presence": bench_presence,
+    "active": bench_active,
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("names", nargs="*", metavar="name", help=f"Benchmarks to run: {', '.join(BENCHMARKS)} (default: all)")
+    args = parser.parse_args()
+    unknown = [name for name in args.names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmark(s): {', '.join(unknown)}")
+
+    for name in args.names or BENCHMARKS:
+        BENCHMARKS[name]()
@@ -0,0 +1,441 @@
+#!/usr/bin/env python3
+"""
+Synthetic data for scale testing
+
+Generates users, meetups, memberships, invite tokens and chat messages with
+the skew real usage has: a few hot meetups with thousands of members and
+most of the chat, a long tail of small ones, power users who host and join
+far more than others, chat that comes in bursts around each meetup, and
+public meetups carrying fuzzed coordinates exactly as create_meetup() makes
+them. Meetups that ended more than a day ago are archived, with their chat
+still in the messages table, as the sweeper would leave them before
+compaction.
+
+Output goes to one of:
+- a directory of COPY files plus load.sql, for psql:
+      python datagen.py --scale medium --out /tmp/meetup-data
+      psql "$DATABASE_URL" -f /tmp/meetup-data/load.sql
+- a Postgres database directly through COPY (needs: pip install psycopg):
+      python datagen.py --scale medium --dsn "$DATABASE_URL"
+- the in-memory mock-mode backend, via load_mock(); set MOCK_DATA_SCALE to
+  have the API fill itself at startup when Supabase is not configured.
+
+Load into an empty database created from sql/schema.sql. The same --seed
+always produces the same data.
+"""
+
+import argparse
+import bisect
+import itertools
+import math
+import os
+import random
+import sys
+import time
+from array import array
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, IO, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+from search import fuzzed_coords
+
+
+class Scale(NamedTuple):
+    users: int
+    meetups: int
+    messages: int
+
+
+SCALES: Dict[str, Scale] = {
+    "small": Scale(users=10_000, meetups=2_000, messages=100_000),
+    "medium": Scale(users=200_000, meetups=40_000, messages=2_000_000),
+    "large": Scale(users=2_000_000, meetups=400_000, messages=20_000_000),
+}
+
+# Columns in the order rows are generated, per table, in load order
+TABLES: Dict[str, Tuple[str, ...]] = {
+    "users": ("id", "clerk_id", "handle", "photo_url", "created_at"),
+    "meetups": (
+        "id", "host_id", "title", "description", "start_ts", "end_ts", "lat", "lng", "visibility",
+        "public_lat", "public_lng", "is_archived", "created_at", "ended_at", "attendee_count"
+    ),
+    "memberships": ("meetup_id", "user_id", "role", "soft_banned", "joined_at"),
+    "invite_tokens": ("id", "meetup_id", "token", "expires_at", "revoked_at", "created_by", "created_at"),
+    "messages": ("id", "meetup_id", "user_id", "type", "text", "parent_id", "created_at"),
+}
+
+WORDS = (
+    "pizza demo judges api bug deploy team table wifi slides react native "
+    "python backend hackathon sponsor swag coffee workshop mentor idea build "
+    "laptop charger room floor hall stage prize track submit devpost expo "
+    "map chat invite token schema index query cache latency server client "
+    "lunch dinner snacks badge lanyard keynote panel judging finals help "
+    "anyone know where is the when does start meet at near by front back"
+).split()
+
+# Campus-style hotspots meetups cluster around (lat, lng)
+HOTSPOTS = [(39.9522, -75.1932), (39.9566, -75.1899), (39.9496, -75.1503), (39.9812, -75.1554), (40.0076, -75.2123)]
+
+MAX_MEETUP_MEMBERS = 5_000
+SENTENCE_POOL = 50_000
+ARCHIVE_AFTER = timedelta(days=1)
+
+
+def _uuid_maker(rng: random.Random):
+    """
+    Deterministic, storage-free IDs: row i of a table gets a UUID whose
+    first 8 hex digits are a 32-bit bijection of i (so IDs are unique and
+    spread out like random ones) and whose tail is fixed per table
+    """
+    tail = rng.getrandbits(96)
+    suffix = "{:04x}-4{:03x}-{:04x}-{:012x}".format(
+        tail >> 80, (tail >> 68) & 0xFFF, 0x8000 | ((tail >> 48) & 0x3FFF), tail & 0xFFFFFFFFFFFF
+    )
+    offset = rng.getrandbits(32)
+
+    def make(i: int) -> str:
+        x = (i * 0x9E3779B1 + offset) & 0xFFFFFFFF
+        x ^= x >> 16
+        return f"{x:08x}-{suffix}"
+    return make
+
+
+class Dataset:
+    """
+    Rows for every table, generated lazily table by table
+
+    Meetup sizes and members are drawn up front (as compact arrays) because
+    meetups carry their attendee_count and messages need their authors;
+    everything else is streamed.
+    """
+
+    def __init__(self, scale: Scale, seed: int = 1, now: Optional[datetime] = None):
+        if scale.users < 2 or scale.meetups < 1:
+            raise ValueError("Need at least 2 users and 1 meetup")
+        self.scale = scale
+        self.seed = seed
+        self.now = now or datetime.now(timezone.utc).replace(microsecond=0)
+        rng = random.Random(seed)
+        self.user_id = _uuid_maker(rng)
+        self.meetup_id = _uuid_maker(rng)
+        self.token_id = _uuid_maker(rng)
+        self.message_id = _uuid_maker(rng)
+
+        # A user's pick weight for hosting and joining: a Zipf-like activity curve
+        self._user_weights = list(itertools.accumulate(1.0 / (rank + 10) for rank in range(scale.users)))
+        # Any stride coprime with the user count maps ranks onto users one to one
+        self._stride = next(s for s in range(7919, 7919 + scale.users + 2) if math.gcd(s, scale.users) == 1)
+        self._plan(rng)
+
+    def _pick_user(self, rng: random.Random) -> int:
+        # Ranks are scattered across user indices so power users aren't all early signups
+        rank = min(bisect.bisect(self._user_weights, rng.random() * self._user_weights[-1]), self.scale.users - 1)
+        return (rank * self._stride) % self.scale.users
+
+    def _plan(self, rng: random.Random) -> None:
+        n = self.scale.meetups
+        self.starts = array("d")
+        self.hours = array("f")
+        self.members: List[array] = []
+        for _ in range(n):
+            # Two months back to one month ahead, mostly afternoons and evenings
+            day = self.now.replace(hour=0, minute=0, second=0) + timedelta(days=rng.randint(-60, 30))
+            start = day + timedelta(hours=rng.choice((10, 12, 14, 16, 17, 18, 18, 19, 19, 20)), minutes=rng.choice((0, 15, 30)))
+            self.starts.append(start.timestamp())
+            self.hours.append(rng.choice((1, 1.5, 2, 2, 3, 4, 6, 8, 36)))
+
+            size = min(int(2 + 3 * rng.paretovariate(1.2)), MAX_MEETUP_MEMBERS, self.scale.users)
+            host = self._pick_user(rng)
+            chosen = {host}
+            roster = array("I", [host])
+            while len(roster) < size:
+                user = self._pick_user(rng)
+                if user not in chosen:
+                    chosen.add(user)
+                    roster.append(user)
+            self.members.append(roster)
+
+        # Chat volume grows faster than size, so hot meetups get most of it;
+        # meetups that haven't started (an hour of pre-chat aside) get none
+        now = self.now.timestamp()
+        weights = [
+            len(self.members[i]) ** 1.3 if self.starts[i] - 3600 < now else 0.0
+            for i in range(n)
+        ]
+        total = sum(weights) or 1.0
+        self.message_counts = array("I", (int(self.scale.messages * w / total) for w in weights))
+        shortfall = self.scale.messages - sum(self.message_counts)
+        active = [i for i in range(n) if weights[i]]
+        for i in rng.choices(active, weights=[weights[i] for i in active], k=shortfall) if active else ():
+            self.message_counts[i] += 1
+
+    def _start(self, i: int) -> datetime:
+        return datetime.fromtimestamp(self.starts[i], timezone.utc)
+
+    def _end(self, i: int) -> datetime:
+        return self._start(i) + timedelta(hours=float(self.hours[i]))
+
+    def _archived(self, i: int) -> bool:
+        return self._end(i) < self.now - ARCHIVE_AFTER
+
+    def users(self) -> Iterator[Tuple[Any, ...]]:
+        rng = random.Random(self.seed + 1)
+        for i in range(self.scale.users):
+            user_id = self.user_id(i)
+            created = self.now - timedelta(days=rng.uniform(0, 365))
+            yield user_id, f"user_{user_id.replace('-', '')[:24]}", f"{rng.choice(WORDS)}{i}", None, created
+
+    def meetups(self) -> Iterator[Tuple[Any, ...]]:
+        rng = random.Random(self.seed + 2)
+        for i in range(self.scale.meetups):
+            meetup_id = self.meetup_id(i)
+            if rng.random() < 0.8:
+                base_lat, base_lng = rng.choice(HOTSPOTS)
+                lat, lng = rng.gauss(base_lat, 0.004), rng.gauss(base_lng, 0.004)
+            else:
+                lat, lng = rng.uniform(39.85, 40.10), rng.uniform(-75.30, -75.00)
+            public = rng.random() < 0.3
+            start, end = self._start(i), self._end(i)
+            if public and end - start > timedelta(hours=6):
+                # create_meetup() caps public meetups at six hours
+                end = start + timedelta(hours=6)
+            public_lat, public_lng = fuzzed_coords(lat, lng, meetup_id) if public else (None, None)
+            archived = self._archived(i)
+            title = " ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 5))).title()
+            description = " ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 25))) if rng.random() < 0.8 else None
+            yield (
+                meetup_id, self.user_id(self.members[i][0]), title, description, start, end,
+                round(lat, 6), round(lng, 6), "public" if public else "private",
+                public_lat, public_lng, archived, start - timedelta(days=rng.uniform(0.1, 14)),
+                end if archived else None, len(self.members[i])
+            )
+
+    def memberships(self) -> Iterator[Tuple[Any, ...]]:
+        rng = random.Random(self.seed + 3)
+        for i, roster in enumerate(self.members):
+            meetup_id = self.meetup_id(i)
+            start = self._start(i)
+            yield meetup_id, self.user_id(roster[0]), "host", False, start - timedelta(days=1)
+            for user in roster[1:]:
+                # Most people join in the last couple of days
+                joined = start - timedelta(hours=rng.expovariate(1 / 36))
+                yield meetup_id, self.user_id(user), "member", rng.random() < 0.002, joined
+
+    def invite_tokens(self) -> Iterator[Tuple[Any, ...]]:
+        rng = random.Random(self.seed + 4)
+        for i in range(self.scale.meetups):
+            start, end = self._start(i), self._end(i)
+            revoked = end if self._archived(i) else None
+            yield (
+                self.token_id(i), self.meetup_id(i), "%032x" % rng.getrandbits(128), end, revoked,
+                self.user_id(self.members[i][0]), start - timedelta(days=1)
+            )
+
+    def messages(self) -> Iterator[Tuple[Any, ...]]:
+        rng = random.Random(self.seed + 5)
+        # Zipf-distributed words, so some search terms are far more common than others
+        word_weights = list(itertools.accumulate(1.0 / (rank + 1) for rank in range(len(WORDS))))
+        sentences = [
+            " ".join(rng.choices(WORDS, cum_weights=word_weights, k=rng.randint(2, 18)))
+            for _ in range(SENTENCE_POOL)
+        ]
+        now = self.now.timestamp()
+        n = 0
+        for i, count in enumerate(self.message_counts):
+            if not count:
+                continue
+            meetup_id = self.meetup_id(i)
+            roster = self.members[i]
+            first = self.starts[i] - 3600
+            last = min(self.starts[i] + self.hours[i] * 3600 + 1800, now)
+
+            # Bursts of quick back-and-forth around a few moments of the meetup
+            times: List[float] = []
+            bursts = max(1, count // 25)
+            for b in range(bursts):
+                t = rng.uniform(first, last)
+                for _ in range(count // bursts + (b < count % bursts)):
+                    t += rng.expovariate(1 / 20)
+                    times.append(min(t, last))
+            times.sort()
+
+            recent: List[str] = []
+            for t in times:
+                message_id = self.message_id(n)
+                n += 1
+                if rng.random() < 0.02:
+                    author, kind = roster[0], "announcement"
+                else:
+                    # A few chatty members write most of the messages
+                    author = roster[min(int(rng.paretovariate(1.1)) - 1, len(roster) - 1)]
+                    kind = "chat"
+                parent = rng.choice(recent) if recent and rng.random() < 0.08 else None
+                yield (
+                    message_id, meetup_id, self.user_id(author), kind, rng.choice(sentences), parent,
+                    datetime.fromtimestamp(t, timezone.utc)
+                )
+                recent.append(message_id)
+                if len(recent) > 20:
+                    del recent[0]
+
+    def rows(self, table: str) -> Iterator[Tuple[Any, ...]]:
+        return getattr(self, table)()
+
+
+# --- Postgres COPY ----------------------------------------------------------
+
+_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+
+def _copy_value(value: Any) -> str:
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, str):
+        return value.translate(_ESCAPES)
+    return str(value)
+
+
+def copy_lines(rows: Iterator[Sequence[Any]], batch: int = 10_000) -> Iterator[str]:
+    """COPY text-format chunks of up to batch rows"""
+    while True:
+        chunk = list(itertools.islice(rows, batch))
+        if not chunk:
+            return
+        yield "".join("\t".join(map(_copy_value, row)) + "\n" for row in chunk)
+
+
+# Session settings and trigger handling around the load. The attendee_count
+# trigger recounts a meetup's members on every insert, which makes loading
+# hot meetups quadratic; meetups rows already carry the final count.
+_LOAD_TRIGGERS = [
+    ("memberships", "trigger_update_attendee_count"),
+]
+_LOAD_BEFORE = [
+    "SET synchronous_commit = off",
+    "SET maintenance_work_mem = '512MB'",
+] + [f"ALTER TABLE {table} DISABLE TRIGGER {trigger}" for table, trigger in _LOAD_TRIGGERS]
+# Run inside the load's transaction
+_LOAD_ENABLE = [f"ALTER TABLE {table} ENABLE TRIGGER {trigger}" for table, trigger in _LOAD_TRIGGERS]
+# Run after it commits
+_LOAD_AFTER = [f"ANALYZE {table}" for table in TABLES]
+
+
+def _copy_sql(table: str, source: str) -> str:
+    return f"COPY {table} ({', '.join(TABLES[table])}) FROM {source}"
+
+
+def write_copy_files(dataset: Dataset, out_dir: str, log: IO[str] = sys.stderr) -> None:
+    """One <table>.copy file per table plus a load.sql that loads them in one transaction"""
+    os.makedirs(out_dir, exist_ok=True)
+    statements = ["\\set ON_ERROR_STOP on", "BEGIN;"] + [f"{s};" for s in _LOAD_BEFORE]
+    for table in TABLES:
+        started = time.perf_counter()
+        path = os.path.join(out_dir, f"{table}.copy")
+        with open(path, "w", buffering=1024 * 1024) as f:
+            for chunk in copy_lines(dataset.rows(table)):
+                f.write(chunk)
+        statements.append(f"\\copy {table} ({', '.join(TABLES[table])}) FROM '{table}.copy'")
+        print(f"  {table:<14} {os.path.getsize(path) / 1e6:9.1f}MB in {time.perf_counter() - started:.1f}s", file=log)
+    statements += [f"{s};" for s in _LOAD_ENABLE] + ["COMMIT;"] + [f"{s};" for s in _LOAD_AFTER]
+    # \copy paths are relative to psql's working directory, so cd there first
+    statements.insert(1, f"\\cd '{os.path.abspath(out_dir)}'")
+    with open(os.path.join(out_dir, "load.sql"), "w") as f:
+        f.write("\n".join(statements) + "\n")
+
+
+def copy_to_postgres(dataset: Dataset, dsn: str, log: IO[str] = sys.stderr) -> None:
+    """Stream every table into Postgres with COPY FROM STDIN, in one transaction"""
+    try:
+        import psycopg
+    except ImportError:
+        raise SystemExit("--dsn needs psycopg (pip install psycopg); or use --out and psql")
+
+    with psycopg.connect(dsn) as conn:
+        with conn.cursor() as cur:
+            for statement in _LOAD_BEFORE:
+                cur.execute(statement)
+            for table in TABLES:
+                started = time.perf_counter()
+                with cur.copy(_copy_sql(table, "STDIN")) as copy:
+                    for chunk in copy_lines(dataset.rows(table)):
+                        copy.write(chunk)
+                print(f"  {table:<14} {cur.rowcount:>12,} rows in {time.perf_counter() - started:.1f}s", file=log)
+            for statement in _LOAD_ENABLE:
+                cur.execute(statement)
+        conn.commit()
+        conn.autocommit = True
+        for statement in _LOAD_AFTER:
+            conn.execute(statement)
+
+
+# --- In-memory mock backend ---------------------------------------------------
+
+def load_mock(service: Any, dataset: Dataset) -> Dict[str, int]:
+    """
+    Fill a mock-mode SupabaseService's in-memory indexes directly (invite
+    tokens have no mock store and are skipped)
+    Returns: rows loaded per table
+    """
+    loaded = {table: 0 for table in TABLES}
+    for row in dataset.meetups():
+        meetup = dict(zip(TABLES["meetups"], row))
+        if meetup["is_archived"]:
+            service.mock_archived_meetups[meetup["id"]] = meetup
+        else:
+            service.meetup_index.add(meetup)
+        loaded["meetups"] += 1
+
+    for meetup_id, user_id, *_ in dataset.memberships():
+        service.mock_memberships.setdefault(meetup_id, set()).add(user_id)
+        loaded["memberships"] += 1
+
+    for message_id, meetup_id, user_id, kind, text, _, created_at in dataset.messages():
+        service.message_index.add({
+            "id": message_id,
+            "meetup_id": meetup_id,
+            "user_id": user_id,
+            "message": text,
+            "message_type": "announcement" if kind == "announcement" else "text",
+            "timestamp": created_at
+        })
+        loaded["messages"] += 1
+
+    loaded["users"] = dataset.scale.users
+    return loaded
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", choices=SCALES, default="small", help="Preset sizes (default: small)")
+    parser.add_argument("--users", type=int, help="Override the preset's user count")
+    parser.add_argument("--meetups", type=int, help="Override the preset's meetup count")
+    parser.add_argument("--messages", type=int, help="Override the preset's message count")
+    parser.add_argument("--seed", type=int, default=1, help="Same seed, same data (default: 1)")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--out", help="Write COPY files and load.sql to this directory")
+    target.add_argument("--dsn", help="COPY straight into this Postgres database")
+    args = parser.parse_args(argv)
+
+    preset = SCALES[args.scale]
+    scale = Scale(
+        users=args.users if args.users is not None else preset.users,
+        meetups=args.meetups if args.meetups is not None else preset.meetups,
+        messages=args.messages if args.messages is not None else preset.messages,
+    )
+    print(f"Generating {scale.users:,} users, {scale.meetups:,} meetups, ~{scale.messages:,} messages", file=sys.stderr)
+    started = time.perf_counter()
+    dataset = Dataset(scale, seed=args.seed)
+    print(f"  planned memberships in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+    if args.out:
+        write_copy_files(dataset, args.out)
+        print(f"Done in {time.perf_counter() - started:.0f}s; load with: psql \"$DATABASE_URL\" -f {os.path.join(args.out, 'load.sql')}", file=sys.stderr)
+    else:
+        copy_to_postgres(dataset, args.dsn)
+        print(f"Done in {time.perf_counter() - started:.0f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+"""
+Thumbnail and preview generation for uploaded images
+
+When an image upload completes, a job is queued here and the upload request
+returns right away. Workers take jobs off a bounded queue, then hash and
+resize the image in a process pool, so the decoding and resizing never run
+on the event loop and are not limited by the GIL.
+
+Outputs are content-addressed by the SHA-256 of the source file:
+
+    derivatives/<hash[:2]>/<hash>/<variant>.jpg
+
+so uploading the same image twice (the same photo shared in several
+meetups, say) reuses the first set of derivatives instead of rendering it
+again.
+
+Needs the optional Pillow package (pip install Pillow); without it uploads
+still work and images are only served at full resolution.
+"""
+
+import asyncio
+import hashlib
+import importlib.util
+import io
+import multiprocessing
+import os
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, List, NamedTuple, Optional, Tuple
+
+# name -> (longest edge in pixels, JPEG quality)
+VARIANTS: Dict[str, Tuple[int, int]] = {
+    "web": (1280, 80),
+    "thumb": (320, 70),
+}
+
+DERIVATIVE_WORKERS = int(os.getenv("DERIVATIVE_WORKERS", str(min(2, os.cpu_count() or 1))))
+# Beyond this many waiting jobs new uploads are skipped rather than queued
+DERIVATIVE_QUEUE_SIZE = 1000
+_TIMINGS_KEPT = 500
+
+
+def pillow_available() -> bool:
+    return importlib.util.find_spec("PIL") is not None
+
+
+def derivative_path(content_hash: str, variant: str) -> str:
+    return f"derivatives/{content_hash[:2]}/{content_hash}/{variant}.jpg"
+
+
+# --- Run in the worker processes -------------------------------------------
+
+def file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def render_variants(path: str) -> Dict[str, Tuple[bytes, int, int]]:
+    """variant -> (JPEG bytes, width, height), decoding the source only once"""
+    from PIL import Image, ImageOps
+
+    largest = max(edge for edge, _ in VARIANTS.values())
+    with Image.open(path) as source:
+        # Lets the JPEG decoder scale down by up to 8x while decoding
+        source.draft("RGB", (largest, largest))
+        image = ImageOps.exif_transpose(source).convert("RGB")
+
+    results: Dict[str, Tuple[bytes, int, int]] = {}
+    # Each variant is resized from the previous, larger one
+    for name, (edge, quality) in sorted(VARIANTS.items(), key=lambda v: -v[1][0]):
+        image.thumbnail((edge, edge), Image.LANCZOS)
+        out = io.BytesIO()
+        image.save(out, "JPEG", quality=quality, optimize=True, progressive=True)
+        results[name] = (out.getvalue(), image.width, image.height)
+    return results
+
+
+# --- Event loop side -------------------------------------------------------
+
+class DerivativeJob(NamedTuple):
+    file_id: str
+    storage_path: str
+    size_bytes: int
+    enqueued_at: float
+
+
+class Derivative(NamedTuple):
+    variant: str
+    content_hash: str
+    storage_path: str
+    width: int
+    height: int
+    size_bytes: int
+
+
+# Looks up derivatives already made from a content hash
+FindDerivatives = Callable[[str], Awaitable[List[Derivative]]]
+# Records the derivatives of a file
+RecordDerivatives = Callable[[str, List[Derivative]], Awaitable[None]]
+
+
+class DerivativePipeline:
+    """Bounded job queue in front of a process pool, with per-job timings"""
+
+    def __init__(
+        self,
+        storage: Any,
+        find: FindDerivatives,
+        record: RecordDerivatives,
+        workers: int = DERIVATIVE_WORKERS,
+        queue_size: int = DERIVATIVE_QUEUE_SIZE
+    ):
+        self.storage = storage
+        self.find = find
+        self.record = record
+        self.workers = workers
+        self.enabled = pillow_available() and workers > 0
+        self.queue_size = queue_size
+        # Created in start(), inside the running event loop
+        self._queue: Optional["asyncio.Queue[DerivativeJob]"] = None
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._tasks: List["asyncio.Task[None]"] = []
+
+        self.in_flight = 0
+        self.completed = 0
+        self.deduplicated = 0
+        self.failed = 0
+        self.dropped = 0
+        # (wait, hash, render, total) in ms for the most recent jobs
+        self._timings: Deque[Tuple[float, float, float, float]] = deque(maxlen=_TIMINGS_KEPT)
+
+    def start(self) -> None:
+        if not self.enabled or self._tasks:
+            return
+        self._pool = self._new_pool()
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    def _new_pool(self) -> ProcessPoolExecutor:
+        # spawn, not fork: forking a process that runs an event loop and
+        # connection pools copies their state into the workers
+        return ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def submit(self, file_id: str, storage_path: str, size_bytes: int) -> bool:
+        """Queue an uploaded image; False if the pipeline is off or full"""
+        if not self._tasks:
+            return False
+        try:
+            self._queue.put_nowait(DerivativeJob(file_id, storage_path, size_bytes, time.perf_counter()))
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+        return True
+
+    async def drain(self) -> None:
+        """Wait until every queued job has finished"""
+        if self._queue is not None:
+            await self._queue.join()
+
+    async def _work(self) -> None:
+        while True:
+            job = await self._queue.get()
+            self.in_flight += 1
+            try:
+                await self._process(job)
+            except BrokenProcessPool as e:
+                # A worker died (e.g. OOM on a huge image); the pool is unusable from now on
+                self.failed += 1
+                print(f"Error generating derivatives for file {job.file_id}: {e}; restarting the pool")
+                self._pool.shutdown(wait=False)
+                self._pool = self._new_pool()
+            except Exception as e:
+                self.failed += 1
+                print(f"Error generating derivatives for file {job.file_id}: {e}")
+            finally:
+                self.in_flight -= 1
+                self._queue.task_done()
+
+    async def _process(self, job: DerivativeJob) -> None:
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        async with self._local_copy(job) as path:
+            content_hash = await loop.run_in_executor(self._pool, file_digest, path)
+            hashed = time.perf_counter()
+
+            existing = await self.find(content_hash)
+            if {d.variant for d in existing} >= set(VARIANTS):
+                self.deduplicated += 1
+                await self.record(job.file_id, existing)
+                rendered = hashed
+            else:
+                variants = await loop.run_in_executor(self._pool, render_variants, path)
+                rendered = time.perf_counter()
+                derivatives = []
+                for name, (data, width, height) in variants.items():
+                    storage_path = derivative_path(content_hash, name)
+                    await self.storage.put(storage_path, data, "image/jpeg")
+                    derivatives.append(Derivative(name, content_hash, storage_path, width, height, len(data)))
+                await self.record(job.file_id, derivatives)
+
+        done = time.perf_counter()
+        self.completed += 1
+        self._timings.append((
+            (started - job.enqueued_at) * 1000,
+            (hashed - started) * 1000,
+            (rendered - hashed) * 1000,
+            (done - job.enqueued_at) * 1000,
+        ))
+
+    @asynccontextmanager
+    async def _local_copy(self, job: DerivativeJob) -> AsyncIterator[str]:
+        """A path to the original that the worker processes can read"""
+        local_path = getattr(self.storage, "local_path", None)
+        if local_path is not None:
+            yield local_path(job.storage_path)
+            return
+
+        # Remote storage: stream the original into a temp file
+        fd, temp = tempfile.mkstemp(prefix="derivative-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                async for chunk in self.storage.read(job.storage_path, 0, job.size_bytes - 1):
+                    await asyncio.to_thread(f.write, chunk)
+            yield temp
+        finally:
+            os.unlink(temp)
+
+    def stats(self) -> Dict[str, Any]:
+        def summary(column: int) -> Dict[str, Optional[float]]:
+            samples = sorted(t[column] for t in self._timings)
+            if not samples:
+                return {"p50": None, "p99": None}
+            return {
+                "p50": round(samples[len(samples) // 2], 1),
+                "p99": round(samples[min(len(samples) - 1, int(len(samples) * 0.99))], 1),
+            }
+
+        return {
+            "enabled": self.enabled,
+            "workers": self.workers if self.enabled else 0,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "deduplicated": self.deduplicated,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            "timings_ms": {
+                "wait": summary(0),
+                "hash": summary(1),
+                "render": summary(2),
+                "total": summary(3),
+            },
+        }
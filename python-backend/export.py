@@ -0,0 +1,87 @@
+"""
+Streaming export of a meetup's data for its host
+
+Chat logs, attendee lists and soft-ban history are read a page at a time
+with keyset reads and encoded as the rows arrive, so memory use stays the
+same however big the meetup is. Two formats:
+
+    ndjson   one JSON object per line, tagged with its section, so one
+             download can hold every section
+    csv      one section per download, with a header row
+
+Compression is left to CompressionMiddleware, which gzips (or brotlis) the
+stream chunk by chunk when the client sends Accept-Encoding.
+"""
+
+import csv
+import io
+import json
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Tuple
+
+# Rows per keyset read
+EXPORT_PAGE_SIZE = 500
+# Encoded rows are sent in chunks of about this size rather than one write per row
+EXPORT_CHUNK_BYTES = 64 * 1024
+
+EXPORT_SECTIONS: Dict[str, Tuple[str, ...]] = {
+    "messages": ("id", "created_at", "user_id", "user_handle", "type", "text", "parent_id"),
+    "memberships": ("user_id", "user_handle", "role", "soft_banned", "soft_ban_reason", "joined_at"),
+    "soft_ban_events": ("id", "created_at", "target_user_id", "enacted_by", "reason"),
+}
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def _csv_value(value: Any) -> Any:
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return "" if value is None else value
+
+
+async def encode_ndjson(rows: AsyncIterator[Tuple[str, Dict[str, Any]]]) -> AsyncIterator[bytes]:
+    """(section, row) pairs as NDJSON lines of {"section": ..., <section columns>}"""
+    chunk: List[str] = []
+    size = 0
+    async for section, row in rows:
+        line = json.dumps(
+            dict({"section": section}, **{name: row.get(name) for name in EXPORT_SECTIONS[section]}),
+            separators=(",", ":"),
+            ensure_ascii=False,
+            default=_json_default
+        ) + "\n"
+        chunk.append(line)
+        size += len(line)
+        if size >= EXPORT_CHUNK_BYTES:
+            yield "".join(chunk).encode("utf-8")
+            chunk.clear()
+            size = 0
+    if chunk:
+        yield "".join(chunk).encode("utf-8")
+
+
+async def encode_csv(section: str, rows: AsyncIterator[Dict[str, Any]]) -> AsyncIterator[bytes]:
+    """One section's rows as CSV with a header row"""
+    columns = EXPORT_SECTIONS[section]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    async for row in rows:
+        writer.writerow([_csv_value(row.get(name)) for name in columns])
+        if buffer.tell() >= EXPORT_CHUNK_BYTES:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
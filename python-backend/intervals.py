@@ -0,0 +1,153 @@
+"""
+In-memory interval tree for time-window queries
+
+The local counterpart of the GiST index on tstzrange(start_ts, end_ts) in
+sql/schema.sql: finds every meetup whose [start, end] overlaps a window
+without scanning the meetups that don't. Two btrees on start_ts and end_ts
+can only bound one side of an overlap each, so "running at 3pm" reads every
+meetup that started before 3pm and then filters on end_ts; this tree prunes
+on both sides at once.
+
+It is a treap ordered by (start, key), with each node also keeping the
+latest end in its subtree. Inserts and removals are O(log n) expected; an
+overlap query visits O(log n) nodes per result at worst, skipping every
+subtree that ends before the window. Results come out in start order, so
+callers can stop at a page.
+"""
+
+import random
+from typing import Dict, Hashable, Iterator, List, Optional, Tuple
+
+
+class _Node:
+    __slots__ = ("start", "key", "end", "max_end", "priority", "left", "right")
+
+    def __init__(self, start: float, key: Hashable, end: float, priority: float):
+        self.start = start
+        self.key = key
+        self.end = end
+        self.max_end = end
+        self.priority = priority
+        self.left: Optional["_Node"] = None
+        self.right: Optional["_Node"] = None
+
+    def update(self) -> None:
+        max_end = self.end
+        if self.left is not None and self.left.max_end > max_end:
+            max_end = self.left.max_end
+        if self.right is not None and self.right.max_end > max_end:
+            max_end = self.right.max_end
+        self.max_end = max_end
+
+
+class IntervalTree:
+    """Closed intervals [start, end] with unique keys, queried by overlap"""
+
+    def __init__(self, seed: Optional[int] = None):
+        self._root: Optional[_Node] = None
+        self._starts: Dict[Hashable, float] = {}
+        self._random = random.Random(seed)
+
+    def __len__(self) -> int:
+        return len(self._starts)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._starts
+
+    def add(self, key: Hashable, start: float, end: float) -> None:
+        """Insert an interval, replacing any previous one with the same key"""
+        if end < start:
+            raise ValueError("Interval ends before it starts")
+        self.remove(key)
+        self._root = self._insert(self._root, _Node(start, key, end, self._random.random()))
+        self._starts[key] = start
+
+    def remove(self, key: Hashable) -> None:
+        start = self._starts.pop(key, None)
+        if start is not None:
+            self._root = self._delete(self._root, start, key)
+
+    def _insert(self, node: Optional[_Node], new: _Node) -> _Node:
+        if node is None:
+            return new
+        if (new.start, new.key) < (node.start, node.key):
+            node.left = self._insert(node.left, new)
+            if node.left.priority > node.priority:
+                node = self._rotate_right(node)
+        else:
+            node.right = self._insert(node.right, new)
+            if node.right.priority > node.priority:
+                node = self._rotate_left(node)
+        node.update()
+        return node
+
+    def _delete(self, node: Optional[_Node], start: float, key: Hashable) -> Optional[_Node]:
+        if node is None:
+            return None
+        if (start, key) < (node.start, node.key):
+            node.left = self._delete(node.left, start, key)
+        elif (start, key) > (node.start, node.key):
+            node.right = self._delete(node.right, start, key)
+        elif node.left is None:
+            return node.right
+        elif node.right is None:
+            return node.left
+        elif node.left.priority > node.right.priority:
+            node = self._rotate_right(node)
+            node.right = self._delete(node.right, start, key)
+        else:
+            node = self._rotate_left(node)
+            node.left = self._delete(node.left, start, key)
+        node.update()
+        return node
+
+    @staticmethod
+    def _rotate_right(node: _Node) -> _Node:
+        top = node.left
+        node.left = top.right
+        top.right = node
+        node.update()
+        top.update()
+        return top
+
+    @staticmethod
+    def _rotate_left(node: _Node) -> _Node:
+        top = node.right
+        node.right = top.left
+        top.left = node
+        node.update()
+        top.update()
+        return top
+
+    def overlapping(
+        self,
+        start: float,
+        end: float,
+        after: Optional[Tuple[float, Hashable]] = None
+    ) -> Iterator[Tuple[Hashable, float, float]]:
+        """
+        (key, start, end) of every interval overlapping [start, end], by
+        (start, key); after resumes past a previous result's (start, key)
+        """
+        stack: List[_Node] = []
+        node = self._root
+        while stack or node is not None:
+            # Walk left while the left subtree can still hold overlapping intervals
+            while node is not None:
+                if node.max_end < start:
+                    node = None
+                elif after is not None and (node.start, node.key) <= after:
+                    # This node and its left subtree were on earlier pages
+                    node = node.right
+                else:
+                    stack.append(node)
+                    node = node.left
+            if not stack:
+                return
+            node = stack.pop()
+            if node.start > end:
+                # Everything from here on starts after the window
+                return
+            if node.end >= start:
+                yield node.key, node.start, node.end
+            node = node.right
@@ -0,0 +1,200 @@
+"""
+Signed, stateless invite tokens
+
+Legacy invite tokens are 32 random hex characters, so telling a real token
+from a made-up or expired one takes an invite_tokens query. Signed tokens
+carry what accept_invite needs, authenticated with an HMAC:
+
+    s1.<base64url(meetup id | token id | expires_at | HMAC-SHA256/128)>
+
+Forged, corrupted and expired tokens are rejected in-process. The only
+state left is revocation, held in a RevocationSet of revoked token IDs
+that have not expired yet (expired tokens are rejected anyway, so the set
+stays small).
+
+Signing is enabled by INVITE_SIGNING_KEYS, a comma-separated list: new
+tokens are signed with the first key and any of them verifies, so keys
+can be rotated without invalidating outstanding invites. Without keys,
+meetups keep getting legacy tokens. Legacy tokens are accepted either way.
+
+Signed tokens are still stored in invite_tokens, so they can be revoked
+(revoked_at) and purged by the sweeper like any other token.
+"""
+
+import asyncio
+import base64
+import hashlib
+import hmac
+import math
+import os
+import struct
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import AsyncIterator, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+INVITE_SIGNING_KEYS = [key.strip() for key in os.getenv("INVITE_SIGNING_KEYS", "").split(",") if key.strip()]
+SIGNED_PREFIX = "s1."
+# Revocations made by other workers (or the sweeper) are picked up within this long
+REVOCATION_REFRESH_SECONDS = float(os.getenv("INVITE_REVOCATION_REFRESH_SECONDS", "30"))
+REVOCATION_FALSE_POSITIVE_RATE = 0.01
+
+_PAYLOAD = struct.Struct(">16s16sI")
+_MAC_BYTES = 16
+_TOKEN_CHARS = math.ceil((_PAYLOAD.size + _MAC_BYTES) * 4 / 3)
+SIGNED_TOKEN_PATTERN = rf"^{SIGNED_PREFIX.replace('.', '[.]')}[A-Za-z0-9_-]{{{_TOKEN_CHARS}}}$"
+
+
+class InviteClaims(NamedTuple):
+    meetup_id: str
+    token_id: str
+    expires_at: datetime
+
+
+def is_signed_token(token: str) -> bool:
+    return token.startswith(SIGNED_PREFIX)
+
+
+class InviteSigner:
+    """Issues and verifies signed invite tokens"""
+
+    def __init__(self, keys: List[str] = INVITE_SIGNING_KEYS):
+        self._keys = [key.encode() for key in keys]
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self._keys)
+
+    def _mac(self, key: bytes, payload: bytes) -> bytes:
+        return hmac.new(key, payload, hashlib.sha256).digest()[:_MAC_BYTES]
+
+    def sign(self, meetup_id: str, token_id: str, expires_at: datetime) -> str:
+        payload = _PAYLOAD.pack(uuid.UUID(meetup_id).bytes, uuid.UUID(token_id).bytes, int(expires_at.timestamp()))
+        body = base64.urlsafe_b64encode(payload + self._mac(self._keys[0], payload)).rstrip(b"=")
+        return SIGNED_PREFIX + body.decode("ascii")
+
+    def verify(self, token: str, now: Optional[float] = None) -> Optional[InviteClaims]:
+        """The token's claims, or None if it is malformed, forged or expired"""
+        if not self._keys or not is_signed_token(token) or len(token) != len(SIGNED_PREFIX) + _TOKEN_CHARS:
+            return None
+        body = token[len(SIGNED_PREFIX):]
+        try:
+            raw = base64.urlsafe_b64decode(body + "=" * (-len(body) % 4))
+        except ValueError:
+            return None
+        payload, mac = raw[:_PAYLOAD.size], raw[_PAYLOAD.size:]
+        if not any(hmac.compare_digest(mac, self._mac(key, payload)) for key in self._keys):
+            return None
+        meetup_id, token_id, expires_at = _PAYLOAD.unpack(payload)
+        if expires_at <= (time.time() if now is None else now):
+            return None
+        return InviteClaims(
+            str(uuid.UUID(bytes=meetup_id)),
+            str(uuid.UUID(bytes=token_id)),
+            datetime.fromtimestamp(expires_at, timezone.utc)
+        )
+
+
+class BloomFilter:
+    """Set membership with no false negatives and a bounded false positive rate"""
+
+    def __init__(self, capacity: int, false_positive_rate: float = REVOCATION_FALSE_POSITIVE_RATE):
+        capacity = max(capacity, 1)
+        self.size = max(64, math.ceil(-capacity * math.log(false_positive_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key: str) -> List[int]:
+        # Double hashing: k positions from the two halves of one digest
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1, h2 = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, key: str) -> None:
+        for position in self._positions(key):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+# Yields (token id, expires_at as a POSIX timestamp) of revoked tokens that haven't expired
+RevocationLoader = Callable[[], AsyncIterator[Tuple[str, float]]]
+
+
+class RevocationSet:
+    """
+    Revoked, unexpired invite token IDs
+
+    Nearly every token checked is not revoked; the Bloom filter answers
+    those from a few bits, and the exact set is only consulted on a hit
+    to rule out false positives. Both are rebuilt from loader() at most
+    every refresh seconds, in the background once the first load is done,
+    which also drops revocations of tokens that have since expired.
+    Revocations made through add() apply in this worker right away.
+    """
+
+    def __init__(self, loader: RevocationLoader, refresh: float = REVOCATION_REFRESH_SECONDS):
+        self.loader = loader
+        self.refresh = refresh
+        self._expires: Dict[str, float] = {}
+        self._bloom = BloomFilter(0)
+        self._loaded_at: Optional[float] = None
+        self._loading: Optional["asyncio.Task[None]"] = None
+
+        self.checks = 0
+        self.bloom_hits = 0
+        self.revoked_hits = 0
+        self.load_failures = 0
+
+    def add(self, token_id: str, expires_at: float) -> None:
+        self._expires[token_id] = expires_at
+        self._bloom.add(token_id)
+
+    async def _load(self) -> None:
+        try:
+            expires = {token_id: expires_at async for token_id, expires_at in self.loader()}
+        except Exception as e:
+            # Keep serving the last good set; the next check retries
+            self.load_failures += 1
+            print(f"Warning: Could not load revoked invite tokens: {e}")
+            return
+        finally:
+            self._loading = None
+        bloom = BloomFilter(len(expires) * 2)
+        for token_id in expires:
+            bloom.add(token_id)
+        self._expires, self._bloom = expires, bloom
+        self._loaded_at = time.monotonic()
+
+    async def _ensure_fresh(self) -> None:
+        if self._loaded_at is not None and time.monotonic() - self._loaded_at < self.refresh:
+            return
+        if self._loading is None:
+            self._loading = asyncio.create_task(self._load())
+        if self._loaded_at is None:
+            # Until the first load succeeds nothing is known to be unrevoked, so wait for it
+            await asyncio.shield(self._loading)
+            if self._loaded_at is None:
+                raise RuntimeError("Revoked invite tokens are unavailable")
+
+    async def is_revoked(self, token_id: str) -> bool:
+        await self._ensure_fresh()
+        self.checks += 1
+        if token_id not in self._bloom:
+            return False
+        self.bloom_hits += 1
+        revoked = token_id in self._expires
+        self.revoked_hits += revoked
+        return revoked
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "revoked_tokens": len(self._expires),
+            "bloom_bits": self._bloom.size,
+            "checks": self.checks,
+            "bloom_hits": self.bloom_hits,
+            "revoked_hits": self.revoked_hits,
+            "load_failures": self.load_failures,
+            "age_seconds": round(time.monotonic() - self._loaded_at, 1) if self._loaded_at is not None else None,
+        }
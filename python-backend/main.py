@@ -18,25 +18,62 @@ Endpoints:
 The service will fall back to mock responses if Supabase credentials are not provided.
 """
 
-from fastapi import FastAPI, HTTPException, Depends
+# Settings must be in the environment before any of our modules read them at import time
+from dotenv import load_dotenv
+load_dotenv()
+
+# Imported next so its clock starts as close to process start as possible
+from startup import Readiness
+
+from fastapi import FastAPI, HTTPException, Depends, Query, Header, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
 from typing import Optional, List, Dict, Any
 import os
 import uuid
 from datetime import datetime, timedelta
-from dotenv import load_dotenv
 import httpx
 import asyncio
-from validators import CreateMeetupRequest, CreateMeetupResponse, AcceptInviteRequest, AcceptInviteResponse, SoftBanRequest, SoftBanResponse, ErrorResponse, SendMessageRequest, SendMessageResponse, GetMessagesRequest, GetMessagesResponse
+from contextlib import asynccontextmanager
+from validators import ExportRequest, HomeRequest, HomeResponse, CreateMeetupRequest, CreateMeetupResponse, AcceptInviteRequest, AcceptInviteResponse, SoftBanRequest, SoftBanResponse, ErrorResponse, SendMessageRequest, SendMessageResponse, GetMessagesRequest, GetMessagesResponse, SearchMessagesRequest, SearchMessagesResponse, SearchMeetupsRequest, SearchMeetupsResponse, ActiveMeetupsRequest, ActiveMeetupsResponse, MeetupSummary, CreateUploadRequest, UploadStatusResponse, SubmitReportRequest, SubmitReportResponse, HeartbeatRequest, PresenceResponse, OnlineMembersRequest, OnlineMembersResponse
 from services import SupabaseService
+from versions import matching_etag, meetup_etag
+from wire import CompressionMiddleware, list_response, negotiate_format
+from sweeper import Sweeper
+from export import EXPORT_FORMATS, encode_csv, encode_ndjson
+from storage import UploadTooLarge, UploadOffsetMismatch, RangeNotSatisfiable, parse_range
+from profiling import LoopLagMonitor, ProfileMiddleware, ProfilerBusy, SAMPLE_INTERVAL_SECONDS, MAX_SAMPLE_SECONDS, is_admin, render_collapsed, sample_stacks
+import threading
+import mimetypes
+
+# Warm-up steps are registered once the services exist (see below)
+readiness = Readiness()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    readiness.start()
+    loop_monitor.start()
+    if SWEEPER_ENABLED:
+        sweeper.start()
+    supabase_service.derivatives.start()
+    supabase_service.reports.writer.start()
+    supabase_service.tasks.start()
+    yield
+    await sweeper.stop()
+    await supabase_service.derivatives.stop()
+    await supabase_service.reports.writer.stop()
+    await supabase_service.tasks.stop()
+    await loop_monitor.stop()
+    await supabase_service.close()
 
-load_dotenv()
 
 app = FastAPI(
     title="PennApps Meetup API",
     version="1.0.0",
-    description="Mini-service for invite acceptance and soft-ban coordination"
+    description="Mini-service for invite acceptance and soft-ban coordination",
+    lifespan=lifespan
 )
 
 # CORS middleware for React Native app
@@ -44,15 +81,22 @@ app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # For hackathon - allows all origins
     allow_credentials=True,
-    allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
+    allow_methods=["GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"],
     allow_headers=["*"],
 )
 
+# gzip/brotli for larger responses - most clients are on weak cellular connections
+app.add_middleware(CompressionMiddleware)
+
+# Admin-only per-request cProfile (X-Profile header); outermost so it times the whole stack
+app.add_middleware(ProfileMiddleware)
+
 # Configuration
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_SERVICE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
 CLERK_SECRET_KEY = os.getenv("CLERK_SECRET_KEY")
 MOCK_MODE = not (SUPABASE_URL and SUPABASE_SERVICE_KEY)
+SWEEPER_ENABLED = os.getenv("SWEEPER_ENABLED", "true").lower() != "false"
 
 # Pydantic models
 class HealthResponse(BaseModel):
@@ -261,6 +305,46 @@ supabase_service = SupabaseService()
 # Initialize mock data
 init_mock_data()
 
+# Optionally fill mock mode with generated data at scale (see datagen.py)
+MOCK_DATA_SCALE = os.getenv("MOCK_DATA_SCALE")
+if supabase_service.mock_mode and MOCK_DATA_SCALE:
+    import datagen
+    if MOCK_DATA_SCALE not in datagen.SCALES:
+        raise RuntimeError(f"MOCK_DATA_SCALE must be one of {', '.join(datagen.SCALES)}, not {MOCK_DATA_SCALE!r}")
+
+
+async def load_mock_data():
+    """Fill the mock indexes with generated data; on the loop, since they are not thread-safe"""
+    loaded = datagen.load_mock(supabase_service, datagen.Dataset(datagen.SCALES[MOCK_DATA_SCALE]))
+    print(f"Mock: loaded generated data {loaded}")
+
+
+async def warm_routes():
+    """Send one request through the hot read path in-process (routing, validation, encoding, compression)"""
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://warmup") as client:
+        await client.get(
+            "/meetups/search",
+            params={"q": "warmup", "user_id": str(uuid.UUID(int=0))},
+            headers={"Accept-Encoding": "gzip, br"}
+        )
+
+
+if supabase_service.mock_mode and MOCK_DATA_SCALE:
+    # First, so the routes step warms up against the full dataset
+    readiness.add_step("mock_data", load_mock_data)
+readiness.add_step("http_pool", supabase_service.warm_up)
+readiness.add_step("routes", warm_routes)
+
+# Periodic cleanup of ended meetups and stale invite tokens, then compaction of their chat
+sweeper = Sweeper({
+    "expire": supabase_service.sweep_expired,
+    "compact": supabase_service.compact_archived_messages
+})
+
+# Event loop lag, and the stacks that blocked the loop
+loop_monitor = LoopLagMonitor()
+
 @app.get("/", response_model=HealthResponse)
 async def root():
     """Root endpoint with basic info"""
@@ -279,6 +363,51 @@ async def health_check():
         mock_mode=MOCK_MODE
     )
 
+@app.get("/ready")
+async def ready_check():
+    """
+    Readiness endpoint
+    
+    Unlike /health, which only says the process is up, this returns 503 until
+    startup warm-up (connection pool, hot paths) has finished.
+    """
+    report = readiness.report()
+    return JSONResponse(report, status_code=200 if readiness.ready else 503)
+
+@app.get("/home", response_model=HomeResponse)
+async def home(
+    user_id: str = Query(..., description="User ID"),
+    lat: Optional[float] = Query(None, description="Latitude of the user, for nearby meetups"),
+    lng: Optional[float] = Query(None, description="Longitude of the user, for nearby meetups"),
+    radius_m: float = Query(2000, description="Radius for nearby meetups in meters"),
+    limit: int = Query(10, description="Number of meetups per section"),
+    message_limit: int = Query(20, description="Number of recent messages")
+):
+    """
+    Everything the home screen needs in one round trip: the user's meetups,
+    public meetups nearby (when lat/lng are given) and their latest chat
+    Sections that time out are returned as null and listed in missing.
+    """
+    try:
+        request = HomeRequest(
+            user_id=user_id,
+            lat=lat,
+            lng=lng,
+            radius_m=radius_m,
+            limit=limit,
+            message_limit=message_limit
+        )
+        return await supabase_service.home(request)
+        
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        print(f"Error in home: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
 @app.post("/create_meetup", response_model=CreateMeetupResponse)
 async def create_meetup(request: CreateMeetupRequest):
     """
@@ -369,6 +498,39 @@ async def soft_ban(request: SoftBanRequest):
         print(f"Error in soft_ban: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
+@app.post("/report", response_model=SubmitReportResponse)
+async def submit_report(request: SubmitReportRequest):
+    """
+    Report a user, message or file
+    
+    Process:
+    1. Validates that the reporter is a member of the meetup
+    2. Counts the report against its target (repeat reports by the same member are ignored)
+    3. Soft-bans the offender once the report threshold is reached within the window
+    
+    Reports are written to the database in batches shortly afterwards.
+    """
+    try:
+        success, message, auto_soft_banned = await supabase_service.submit_report(request)
+        
+        if not success:
+            raise HTTPException(status_code=403, detail=message)
+        
+        return SubmitReportResponse(
+            success=True,
+            message=message,
+            auto_soft_banned=auto_soft_banned
+        )
+        
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        print(f"Error in submit_report: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
 @app.post("/send_message", response_model=SendMessageResponse)
 async def send_message(request: SendMessageRequest):
     """
@@ -403,12 +565,13 @@ async def send_message(request: SendMessageRequest):
 
 
 @app.post("/get_messages", response_model=GetMessagesResponse)
-async def get_messages(request: GetMessagesRequest):
+async def get_messages(request: GetMessagesRequest, http_request: Request):
     """
     Get messages for a meetup chat
     
     This endpoint retrieves messages from a meetup chat that the user is a member of.
     Messages are returned in reverse chronological order (newest first).
+    Clients may ask for a compact columnar or MessagePack body via Accept.
     
     Process:
     1. Validates that the user is a member of the meetup
@@ -425,11 +588,11 @@ async def get_messages(request: GetMessagesRequest):
         if messages is None:
             messages = []
         
-        return GetMessagesResponse(
+        return list_response(http_request, GetMessagesResponse(
             messages=messages,
             total_count=len(messages),
             has_more=False  # In a real implementation, this would be calculated based on pagination
-        )
+        ), "messages")
         
     except HTTPException:
         raise
@@ -438,6 +601,465 @@ async def get_messages(request: GetMessagesRequest):
         raise HTTPException(status_code=500, detail="Internal server error")
 
 
+@app.get("/get_messages", response_model=GetMessagesResponse)
+async def get_messages_conditional(
+    http_request: Request,
+    meetup_id: str = Query(..., description="Meetup ID"),
+    user_id: str = Query(..., description="User ID"),
+    limit: int = Query(50, description="Number of messages to retrieve"),
+    offset: int = Query(0, description="Number of messages to skip"),
+    if_none_match: Optional[str] = Header(None)
+):
+    """
+    GET variant of /get_messages with conditional request support
+    
+    Responses to members carry a strong ETag derived from the meetup's
+    version stamp. Sending it back in If-None-Match returns 304 Not Modified
+    without reading the messages, until a new message, membership change or
+    ban in the meetup (or at most ETAG_MAX_STALE_SECONDS for writes made
+    elsewhere).
+    """
+    try:
+        request = GetMessagesRequest(meetup_id=meetup_id, user_id=user_id, limit=limit, offset=offset)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    try:
+        # Taken before the messages are read, so a write in between only makes the ETag older
+        stamp = await supabase_service.read_stamp(request.meetup_id, request.user_id, public_ok=False)
+    except Exception as e:
+        print(f"Error in get_messages: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+    
+    etag = None
+    # Non-members get get_messages' 403, never a 304
+    if stamp is not None:
+        media_type = negotiate_format(http_request.headers.get("accept"))
+        etag = meetup_etag(
+            request.meetup_id, stamp, "messages", request.user_id, request.limit, request.offset, media_type
+        )
+        cached = matching_etag(if_none_match, etag)
+        if cached is not None:
+            return Response(status_code=304, headers={"ETag": cached, "Cache-Control": "private, no-cache"})
+    
+    response = await get_messages(request, http_request)
+    if etag is not None:
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+
+@app.post("/search_messages", response_model=SearchMessagesResponse)
+async def search_messages(request: SearchMessagesRequest, http_request: Request):
+    """
+    Full-text search within a meetup chat
+    
+    Returns hits ranked best-first, each with a highlighted snippet. Pass the
+    returned next_cursor back to fetch the following page.
+    
+    Process:
+    1. Validates that the user is a member of the meetup
+    2. Matches all query terms against the meetup's messages
+    3. Returns one page of ranked hits and a cursor for the next page
+    """
+    try:
+        success, message, hits, next_cursor = await supabase_service.search_messages(request)
+        
+        if not success:
+            raise HTTPException(status_code=403, detail=message)
+        
+        return list_response(http_request, SearchMessagesResponse(
+            hits=hits or [],
+            next_cursor=next_cursor
+        ), "hits")
+        
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        print(f"Error in search_messages: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
+@app.get("/meetups/search", response_model=SearchMeetupsResponse)
+async def search_meetups(
+    http_request: Request,
+    user_id: str = Query(..., description="User ID"),
+    q: str = Query(..., description="Search text; the last word may be partially typed"),
+    start: Optional[datetime] = Query(None, description="Only meetups still running at or after this time"),
+    end: Optional[datetime] = Query(None, description="Only meetups starting at or before this time"),
+    lat: Optional[float] = Query(None, description="Latitude of the search center"),
+    lng: Optional[float] = Query(None, description="Longitude of the search center"),
+    radius_m: Optional[float] = Query(None, description="Search radius in meters"),
+    limit: int = Query(20, description="Number of meetups to retrieve")
+):
+    """
+    Search public meetups and meetups the user has joined
+    
+    Matches title and description by trigram similarity, so partially typed
+    and misspelled words still match. Intended to back the SearchBar as the
+    user types. Text matching can be combined with a time window and a radius.
+    """
+    try:
+        request = SearchMeetupsRequest(
+            user_id=user_id, q=q, start=start, end=end,
+            lat=lat, lng=lng, radius_m=radius_m, limit=limit
+        )
+        meetups = await supabase_service.search_meetups(request)
+        return list_response(http_request, SearchMeetupsResponse(meetups=meetups), "meetups")
+        
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        print(f"Error in search_meetups: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
+@app.get("/meetups/active", response_model=ActiveMeetupsResponse)
+async def active_meetups(
+    http_request: Request,
+    user_id: str = Query(..., description="User ID"),
+    at: Optional[datetime] = Query(None, description="Start of the time window (default: now)"),
+    until: Optional[datetime] = Query(None, description="End of the time window (default: same as at)"),
+    limit: int = Query(20, description="Number of meetups to retrieve"),
+    cursor: Optional[str] = Query(None, description="Cursor from a previous page")
+):
+    """
+    Meetups happening now, or at any point of a time window
+    
+    Lists public meetups and meetups the user has joined that are running at
+    `at`, or at any time until `until` when given (e.g. the next two hours
+    for "upcoming"), soonest start first. Pass next_cursor back as cursor
+    for the next page.
+    """
+    try:
+        request = ActiveMeetupsRequest(user_id=user_id, at=at, until=until, limit=limit, cursor=cursor)
+        meetups, next_cursor = await supabase_service.active_meetups(request)
+        return list_response(http_request, ActiveMeetupsResponse(meetups=meetups, next_cursor=next_cursor), "meetups")
+        
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        print(f"Error in active_meetups: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
+@app.get("/meetups/{meetup_id}", response_model=MeetupSummary)
+async def get_meetup(
+    meetup_id: str,
+    response: Response,
+    user_id: str = Query(..., description="User ID"),
+    if_none_match: Optional[str] = Header(None)
+):
+    """
+    Get meetup details
+    
+    Private meetups are only visible to members; non-members of public
+    meetups get the fuzzed location. Supports If-None-Match like GET
+    /get_messages.
+    """
+    try:
+        # The same visibility rule as the full response, so a 304 reveals nothing
+        stamp = await supabase_service.read_stamp(meetup_id, user_id, public_ok=True)
+        if stamp is None:
+            raise HTTPException(status_code=404, detail="Meetup not found")
+        
+        etag = meetup_etag(meetup_id, stamp, "meetup", user_id)
+        cached = matching_etag(if_none_match, etag)
+        if cached is not None:
+            return Response(status_code=304, headers={"ETag": cached, "Cache-Control": "private, no-cache"})
+        
+        success, message, meetup = await supabase_service.get_meetup(meetup_id, user_id)
+        
+        if not success:
+            raise HTTPException(status_code=404, detail=message)
+        
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = "private, no-cache"
+        return meetup
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error in get_meetup: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
+@app.post("/meetups/{meetup_id}/presence", response_model=PresenceResponse)
+async def heartbeat(meetup_id: str, request: HeartbeatRequest):
+    """
+    Presence heartbeat
+    
+    Clients call this every heartbeat_seconds while the meetup is open; the
+    member is shown as online until a few heartbeats in a row are missed.
+    """
+    try:
+        success, message, presence = await supabase_service.heartbeat(meetup_id, request.user_id)
+        
+        if not success:
+            raise HTTPException(status_code=403, detail=message)
+        
+        return presence
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error in heartbeat: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
+@app.delete("/meetups/{meetup_id}/presence", response_model=PresenceResponse)
+async def leave_presence(meetup_id: str, user_id: str = Query(..., description="User ID")):
+    """Go offline right away, e.g. when the app is closed"""
+    try:
+        success, message, presence = await supabase_service.leave(meetup_id, user_id)
+        
+        if not success:
+            raise HTTPException(status_code=403, detail=message)
+        
+        return presence
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error in leave_presence: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
+@app.get("/meetups/{meetup_id}/presence", response_model=OnlineMembersResponse)
+async def get_online_members(
+    meetup_id: str,
+    user_id: str = Query(..., description="User ID"),
+    limit: int = Query(50, description="Number of members to retrieve"),
+    cursor: Optional[str] = Query(None, description="Cursor from a previous page")
+):
+    """
+    Who is online in a meetup
+    
+    Returns the online count and a page of online members in the order they
+    came online. Pass next_cursor back as cursor for the next page.
+    """
+    try:
+        request = OnlineMembersRequest(meetup_id=meetup_id, user_id=user_id, limit=limit, cursor=cursor)
+        success, message, page = await supabase_service.get_online_members(request)
+        
+        if not success:
+            raise HTTPException(status_code=403, detail=message)
+        
+        return page
+    
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        print(f"Error in get_online_members: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
+def _upload_headers(upload: UploadStatusResponse) -> Dict[str, str]:
+    return {"Upload-Offset": str(upload.offset), "Upload-Length": str(upload.length), "Cache-Control": "no-store"}
+
+
+@app.post("/meetups/{meetup_id}/uploads", response_model=UploadStatusResponse, status_code=201)
+async def create_upload(meetup_id: str, request: CreateUploadRequest, response: Response):
+    """
+    Start a resumable file upload
+    
+    The declared length is reserved against the meetup's storage quota right
+    away. Send the bytes with PATCH /uploads/{upload_id}; after a dropped
+    connection, HEAD /uploads/{upload_id} tells where to resume.
+    """
+    try:
+        success, message, upload = await supabase_service.create_upload(meetup_id, request)
+        
+        if not success:
+            raise HTTPException(status_code=403, detail=message)
+        
+        response.headers.update(_upload_headers(upload))
+        response.headers["Location"] = f"/uploads/{upload.upload_id}"
+        return upload
+        
+    except HTTPException:
+        raise
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        print(f"Error in create_upload: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
+@app.head("/uploads/{upload_id}")
+async def upload_status(upload_id: str, user_id: str = Query(..., description="User ID")):
+    """Current offset of a resumable upload, in the Upload-Offset header"""
+    try:
+        success, message, upload = await supabase_service.upload_status(upload_id, user_id)
+        
+        if not success:
+            raise HTTPException(status_code=404, detail=message)
+        
+        return Response(status_code=200, headers=_upload_headers(upload))
+        
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        print(f"Error in upload_status: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
+@app.patch("/uploads/{upload_id}", response_model=UploadStatusResponse)
+async def append_upload(
+    upload_id: str,
+    http_request: Request,
+    response: Response,
+    user_id: str = Query(..., description="User ID"),
+    upload_offset: int = Header(..., description="Offset the body starts at")
+):
+    """
+    Append the request body to a resumable upload
+    
+    The body is streamed straight through to storage. Sending more bytes than
+    the upload declared fails with 413 as soon as the excess arrives; a stale
+    Upload-Offset fails with 409. The response carries file_id once the last
+    byte has arrived.
+    """
+    try:
+        success, message, upload = await supabase_service.append_upload(
+            upload_id, user_id, upload_offset, http_request.stream()
+        )
+        
+        if not success:
+            raise HTTPException(status_code=404, detail=message)
+        
+        response.headers.update(_upload_headers(upload))
+        return upload
+        
+    except HTTPException:
+        raise
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except UploadOffsetMismatch as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        print(f"Error in append_upload: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
+@app.get("/meetups/{meetup_id}/files/{file_id}")
+async def download_file(
+    meetup_id: str,
+    file_id: str,
+    user_id: str = Query(..., description="User ID"),
+    variant: Optional[str] = Query(None, description="thumb or web for a resized JPEG of an image"),
+    range_header: Optional[str] = Header(None, alias="Range")
+):
+    """
+    Download a meetup file
+    
+    The file is streamed from storage in chunks. A single Range (bytes=a-b,
+    bytes=a- or bytes=-n) returns 206 Partial Content, so interrupted
+    downloads can resume. Images get their thumb and web variants shortly
+    after upload; until then those return 404.
+    """
+    try:
+        success, message, file = await supabase_service.get_file(meetup_id, file_id, user_id, variant)
+        
+        if not success:
+            raise HTTPException(status_code=404, detail=message)
+        
+        size = file['size_bytes']
+        byte_range = parse_range(range_header, size)
+        start, end = byte_range or (0, size - 1)
+        headers = {
+            "Accept-Ranges": "bytes",
+            "Content-Length": str(end - start + 1),
+            "Content-Disposition": f'attachment; filename="{file["filename"] or file_id}"',
+            "Cache-Control": "private, max-age=86400"
+        }
+        if byte_range:
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        media_type = mimetypes.guess_type(file['filename'] or '')[0] or "application/octet-stream"
+        return StreamingResponse(
+            supabase_service.storage.read(file['storage_path'], start, end),
+            status_code=206 if byte_range else 200,
+            media_type=media_type,
+            headers=headers
+        )
+        
+    except HTTPException:
+        raise
+    except RangeNotSatisfiable as e:
+        raise HTTPException(status_code=416, detail="Requested range not satisfiable", headers={"Content-Range": str(e)})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        print(f"Error in download_file: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
+@app.get("/meetups/{meetup_id}/export")
+async def export_meetup(
+    meetup_id: str,
+    user_id: str = Query(..., description="User ID of the host"),
+    format: str = Query("ndjson", description="ndjson or csv"),
+    sections: str = Query("messages,memberships,soft_ban_events", description="Comma-separated sections; CSV takes exactly one")
+):
+    """
+    Export a meetup's chat log, attendee list and soft-ban history (host only)
+    
+    The export is streamed as it is read, a page at a time, and gzipped on
+    the fly for clients that send Accept-Encoding: gzip. NDJSON lines carry
+    a "section" field; CSV exports one section per request.
+    """
+    try:
+        request = ExportRequest(
+            meetup_id=meetup_id,
+            user_id=user_id,
+            format=format,
+            sections=[name.strip() for name in sections.split(",") if name.strip()]
+        )
+        success, message = await supabase_service.can_export(request)
+        
+        if not success:
+            raise HTTPException(status_code=404, detail=message)
+        
+        async def body():
+            rows = supabase_service.export_rows(request)
+            if request.format == "csv":
+                encoded = encode_csv(request.sections[0], (row async for _, row in rows))
+            else:
+                encoded = encode_ndjson(rows)
+            try:
+                async for chunk in encoded:
+                    yield chunk
+            except Exception as e:
+                # Headers are already sent, so all we can do is cut the download short
+                print(f"Error in export_meetup while streaming: {e}")
+                raise
+        
+        name = request.sections[0] if request.format == "csv" else "export"
+        return StreamingResponse(
+            body(),
+            media_type=EXPORT_FORMATS[request.format],
+            headers={"Content-Disposition": f'attachment; filename="meetup-{meetup_id}-{name}.{request.format}"'}
+        )
+        
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        print(f"Error in export_meetup: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
 @app.get("/debug/mock-data")
 async def debug_mock_data():
     """Debug endpoint to view mock data (only available in mock mode)"""
@@ -451,6 +1073,49 @@ async def debug_mock_data():
         "soft_bans": mock_soft_bans
     }
 
+def require_admin(x_admin_key: Optional[str] = Header(None)):
+    """Gate for the metrics and profiling endpoints; refuses everyone when no admin key is set"""
+    if not is_admin(x_admin_key):
+        raise HTTPException(status_code=403, detail="Invalid admin key")
+
+@app.get("/debug/metrics", dependencies=[Depends(require_admin)])
+async def debug_metrics():
+    """Counters from background jobs and warm-up"""
+    return {
+        "readiness": readiness.report(),
+        "sweeper": sweeper.stats(),
+        "derivatives": supabase_service.derivatives.stats(),
+        "reports": supabase_service.reports.stats(),
+        "tasks": supabase_service.tasks.stats(),
+        "presence": supabase_service.presence.stats(),
+        "loop": loop_monitor.stats(),
+        "invite_revocations": supabase_service.revocations.stats()
+    }
+
+@app.get("/debug/profile", dependencies=[Depends(require_admin)])
+async def debug_profile(
+    seconds: float = Query(10, gt=0, le=MAX_SAMPLE_SECONDS),
+    interval_ms: float = Query(SAMPLE_INTERVAL_SECONDS * 1000, ge=1, le=1000),
+    all_threads: bool = Query(False)
+):
+    """
+    Sample the event loop's stacks for a while; returns collapsed stacks
+    (flamegraph.pl / speedscope input)
+    """
+    try:
+        # Sampled from a worker thread, so the loop keeps serving requests meanwhile
+        stacks = await asyncio.to_thread(
+            sample_stacks, threading.get_ident(), seconds, interval_ms / 1000, all_threads
+        )
+        return Response(render_collapsed(stacks), media_type="text/plain")
+    except ProfilerBusy:
+        raise HTTPException(status_code=409, detail="A profile is already running")
+
+@app.get("/debug/stalls", dependencies=[Depends(require_admin)])
+async def debug_stalls():
+    """Collapsed stacks the event loop was stuck in, weighted by how long they blocked"""
+    return Response(render_collapsed(loop_monitor.stall_stacks), media_type="text/plain")
+
 if __name__ == "__main__":
     import uvicorn
     print("Starting PennApps Meetup API...")
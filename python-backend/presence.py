@@ -0,0 +1,254 @@
+"""
+Who is online in each meetup, from client heartbeats
+
+Clients send a heartbeat every PRESENCE_HEARTBEAT_SECONDS while a meetup is
+open; a member counts as online until PRESENCE_TTL_SECONDS pass without one.
+Expiry uses a timing wheel: one slot per tick, each holding the members due
+to expire in that tick, so a heartbeat moves a member between two slots and
+expiring a tick touches only the members that actually expire. Both are
+O(1) per member, whatever the number of clients.
+
+The wheel is advanced lazily on every call, so there is no background task.
+Presence lives in each worker, like report counts: with several workers,
+clients should be routed to the same worker per meetup.
+"""
+
+import math
+import os
+import time
+from typing import Callable, Dict, Hashable, List, Optional, Set, Tuple
+
+PRESENCE_TTL_SECONDS = float(os.getenv("PRESENCE_TTL_SECONDS", "45"))
+# What clients are told to use; a few heartbeats can be lost before a member drops off
+PRESENCE_HEARTBEAT_SECONDS = PRESENCE_TTL_SECONDS / 3
+PRESENCE_TICK_SECONDS = 1.0
+
+
+class TimingWheel:
+    """
+    Keys that expire ttl seconds after they were last touched
+
+    Expiry is rounded up to the next tick, so a key may outlive its ttl by
+    up to one tick.
+    """
+
+    def __init__(
+        self,
+        ttl: float,
+        tick: float = PRESENCE_TICK_SECONDS,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.tick = tick
+        self.clock = clock
+        self.ttl_ticks = max(1, math.ceil(ttl / tick))
+        # One more slot than the ttl spans, so a slot never mixes two due ticks
+        self._slots: List[Set[Hashable]] = [set() for _ in range(self.ttl_ticks + 1)]
+        self._slot_of: Dict[Hashable, int] = {}
+        self._current = self._now()
+
+    def __len__(self) -> int:
+        return len(self._slot_of)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._slot_of
+
+    def _now(self) -> int:
+        return int(self.clock() // self.tick)
+
+    def touch(self, key: Hashable) -> None:
+        """Reset key's expiry; call advance() first so no overdue slot is reused"""
+        slot = (self._current + self.ttl_ticks) % len(self._slots)
+        old = self._slot_of.get(key)
+        if old == slot:
+            return
+        if old is not None:
+            self._slots[old].discard(key)
+        self._slots[slot].add(key)
+        self._slot_of[key] = slot
+
+    def discard(self, key: Hashable) -> None:
+        slot = self._slot_of.pop(key, None)
+        if slot is not None:
+            self._slots[slot].discard(key)
+
+    def advance(self) -> List[Hashable]:
+        """Move the wheel up to the current tick; returns the keys that expired"""
+        now = self._now()
+        if now <= self._current:
+            return []
+        expired: List[Hashable] = []
+        # After a long stall every slot is due, but each only needs emptying once
+        for tick in range(self._current + 1, min(now, self._current + len(self._slots)) + 1):
+            slot = self._slots[tick % len(self._slots)]
+            if slot:
+                for key in slot:
+                    del self._slot_of[key]
+                expired.extend(slot)
+                slot.clear()
+        self._current = now
+        return expired
+
+
+class _Member:
+    __slots__ = ("user_id", "arrival", "seen", "prev", "next")
+
+    def __init__(self, user_id: str, arrival: int, seen: float):
+        self.user_id = user_id
+        self.arrival = arrival
+        self.seen = seen
+        self.prev: Optional["_Member"] = None
+        self.next: Optional["_Member"] = None
+
+
+class _Roster:
+    """A meetup's online members as a linked list in arrival order, indexed both ways"""
+
+    __slots__ = ("by_user", "by_arrival", "head", "tail")
+
+    def __init__(self):
+        self.by_user: Dict[str, _Member] = {}
+        self.by_arrival: Dict[int, _Member] = {}
+        self.head: Optional[_Member] = None
+        self.tail: Optional[_Member] = None
+
+    def __len__(self) -> int:
+        return len(self.by_user)
+
+    def append(self, member: _Member) -> None:
+        member.prev = self.tail
+        if self.tail is None:
+            self.head = member
+        else:
+            self.tail.next = member
+        self.tail = member
+        self.by_user[member.user_id] = member
+        self.by_arrival[member.arrival] = member
+
+    def remove(self, user_id: str) -> None:
+        member = self.by_user.pop(user_id, None)
+        if member is None:
+            return
+        del self.by_arrival[member.arrival]
+        if member.prev is None:
+            self.head = member.next
+        else:
+            member.prev.next = member.next
+        if member.next is None:
+            self.tail = member.prev
+        else:
+            member.next.prev = member.prev
+
+    def after(self, arrival: Optional[int]) -> Optional[_Member]:
+        """The first member who arrived after arrival"""
+        if arrival is None:
+            return self.head
+        member = self.by_arrival.get(arrival)
+        if member is not None:
+            return member.next
+        # The cursor's member has gone offline since: walk from the start
+        member = self.head
+        while member is not None and member.arrival <= arrival:
+            member = member.next
+        return member
+
+
+class PresenceTracker:
+    """Online members per meetup, listed in the order they came online"""
+
+    def __init__(
+        self,
+        ttl: float = PRESENCE_TTL_SECONDS,
+        tick: float = PRESENCE_TICK_SECONDS,
+        clock: Callable[[], float] = time.monotonic,
+        wall_clock: Callable[[], float] = time.time
+    ):
+        self.ttl = ttl
+        self.wall_clock = wall_clock
+        self._wheel = TimingWheel(ttl, tick, clock)
+        self._rosters: Dict[str, _Roster] = {}
+        self._arrivals = 0
+
+        self.heartbeats = 0
+        self.expired = 0
+        self.left = 0
+
+    def _expire(self) -> None:
+        for meetup_id, user_id in self._wheel.advance():
+            self._remove(meetup_id, user_id)
+            self.expired += 1
+
+    def _remove(self, meetup_id: str, user_id: str) -> None:
+        roster = self._rosters.get(meetup_id)
+        if roster is not None:
+            roster.remove(user_id)
+            if not roster:
+                del self._rosters[meetup_id]
+
+    def heartbeat(self, meetup_id: str, user_id: str) -> int:
+        """Mark user online in meetup; returns the meetup's online count"""
+        self._expire()
+        self.heartbeats += 1
+        roster = self._rosters.get(meetup_id)
+        if roster is None:
+            roster = self._rosters[meetup_id] = _Roster()
+        member = roster.by_user.get(user_id)
+        if member is None:
+            self._arrivals += 1
+            roster.append(_Member(user_id, self._arrivals, self.wall_clock()))
+        else:
+            member.seen = self.wall_clock()
+        self._wheel.touch((meetup_id, user_id))
+        return len(roster)
+
+    def leave(self, meetup_id: str, user_id: str) -> int:
+        """Mark user offline right away (app closed); returns the meetup's online count"""
+        self._expire()
+        if (meetup_id, user_id) in self._wheel:
+            self._wheel.discard((meetup_id, user_id))
+            self._remove(meetup_id, user_id)
+            self.left += 1
+        return self.count(meetup_id)
+
+    def count(self, meetup_id: str) -> int:
+        self._expire()
+        return len(self._rosters.get(meetup_id, ()))
+
+    def is_online(self, meetup_id: str, user_id: str) -> bool:
+        self._expire()
+        return (meetup_id, user_id) in self._wheel
+
+    def online(
+        self,
+        meetup_id: str,
+        limit: int,
+        after: Optional[int] = None
+    ) -> Tuple[List[Tuple[str, float]], Optional[int]]:
+        """
+        A page of (user_id, last heartbeat) in arrival order, and the arrival
+        number to pass as after for the next page (None on the last page)
+
+        Members who go offline and come back are listed again at the end, so
+        paging through a busy meetup never repeats anyone.
+        """
+        self._expire()
+        roster = self._rosters.get(meetup_id)
+        if roster is None:
+            return [], None
+        page: List[Tuple[str, float]] = []
+        member = roster.after(after)
+        while member is not None and len(page) < limit:
+            page.append((member.user_id, member.seen))
+            last = member
+            member = member.next
+        return page, (last.arrival if member is not None else None)
+
+    def stats(self) -> Dict[str, object]:
+        self._expire()
+        return {
+            "ttl_seconds": self.ttl,
+            "online": len(self._wheel),
+            "meetups": len(self._rosters),
+            "heartbeats": self.heartbeats,
+            "expired": self.expired,
+            "left": self.left,
+        }
@@ -0,0 +1,262 @@
+"""
+On-demand profiling for live workers
+
+Three tools, for finding where a worker's time goes when latency spikes:
+
+- Per-request cProfile: send X-Profile: cumulative (or tottime, calls)
+  with a valid X-Admin-Key and the response body is replaced by the
+  request's pstats report. cProfile sees the whole thread, so coroutines of
+  other requests that run while this one awaits are included too.
+- Sampling profiler: samples the event loop thread's stack every few
+  milliseconds for N seconds and returns collapsed stacks, one
+  "frame;frame;frame count" line per stack, which flamegraph.pl and
+  speedscope read directly. Cheap enough to run on a loaded worker.
+- Event loop lag: a monitor task measures how late the loop wakes it up,
+  and a watchdog thread records the loop thread's stack whenever the loop
+  is stuck for LOOP_STALL_MS, so blocking calls (synchronous I/O, print to
+  a slow pipe, CPU-heavy code) show up with the line that blocked.
+
+Profiling endpoints (and /debug/metrics) need PROFILING_ADMIN_KEY to be set;
+without it every request to them is refused.
+"""
+
+import asyncio
+import cProfile
+import hmac
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter, deque
+from types import FrameType
+from typing import Any, Deque, Dict, List, Optional
+
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse, PlainTextResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+PROFILE_SORT_KEYS = ("cumulative", "tottime", "calls")
+PROFILE_REPORT_LINES = 60
+SAMPLE_INTERVAL_SECONDS = 0.005
+MAX_SAMPLE_SECONDS = 60.0
+LOOP_LAG_INTERVAL_SECONDS = 0.1
+LOOP_STALL_SECONDS = float(os.getenv("LOOP_STALL_MS", "100")) / 1000
+# Distinct stacks kept per profile; the rest are counted under one line
+MAX_STACKS = 5_000
+_MAX_DEPTH = 128
+
+
+class ProfilerBusy(Exception):
+    """Another profile is already running in this worker"""
+
+
+def admin_key() -> Optional[str]:
+    """PROFILING_ADMIN_KEY, read per request so the environment is always current"""
+    return os.getenv("PROFILING_ADMIN_KEY") or None
+
+
+def is_admin(key: Optional[str]) -> bool:
+    """Fails closed: with no admin key configured nobody is an admin"""
+    expected = admin_key()
+    return expected is not None and key is not None and hmac.compare_digest(key.encode(), expected.encode())
+
+
+def collapse(frame: Optional[FrameType]) -> str:
+    """A stack as root-first "file:function" frames joined by semicolons"""
+    names: List[str] = []
+    while frame is not None and len(names) < _MAX_DEPTH:
+        code = frame.f_code
+        names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+def _count(stacks: Counter, stack: str, weight: int = 1) -> None:
+    if stack in stacks or len(stacks) < MAX_STACKS:
+        stacks[stack] += weight
+    else:
+        stacks["[other stacks]"] += weight
+
+
+def render_collapsed(stacks: Counter) -> str:
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+# Only one cProfile or sampling run per worker at a time
+_profile_lock = threading.Lock()
+
+
+def sample_stacks(
+    thread_id: int,
+    seconds: float,
+    interval: float = SAMPLE_INTERVAL_SECONDS,
+    all_threads: bool = False
+) -> Counter:
+    """
+    Sample thread_id's stack (or every thread's) for seconds; blocking, so
+    run it off the event loop
+    Returns: collapsed stack -> samples
+    """
+    if not _profile_lock.acquire(blocking=False):
+        raise ProfilerBusy()
+    try:
+        stacks: Counter = Counter()
+        me = threading.get_ident()
+        names = {t.ident: t.name for t in threading.enumerate()}
+        deadline = time.monotonic() + min(seconds, MAX_SAMPLE_SECONDS)
+        while time.monotonic() < deadline:
+            frames = sys._current_frames()
+            if all_threads:
+                for ident, frame in frames.items():
+                    if ident != me:
+                        _count(stacks, f"{names.get(ident, ident)};{collapse(frame)}")
+            elif thread_id in frames:
+                _count(stacks, collapse(frames[thread_id]))
+            time.sleep(interval)
+        return stacks
+    finally:
+        _profile_lock.release()
+
+
+class ProfileMiddleware:
+    """Run a request under cProfile when an admin asks for it with X-Profile"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        sort = headers.get("x-profile")
+        if sort is None or not is_admin(headers.get("x-admin-key")):
+            await self.app(scope, receive, send)
+            return
+        if sort not in PROFILE_SORT_KEYS:
+            sort = "cumulative"
+        if not _profile_lock.acquire(blocking=False):
+            await JSONResponse({"detail": "A profile is already running"}, status_code=409)(scope, receive, send)
+            return
+
+        status = 500
+
+        async def capture(message: Message) -> None:
+            nonlocal status
+            # The report replaces the response, so only its status is kept
+            if message["type"] == "http.response.start":
+                status = message["status"]
+
+        profile = cProfile.Profile()
+        t0 = time.perf_counter()
+        try:
+            profile.enable()
+            try:
+                await self.app(scope, receive, capture)
+            finally:
+                profile.disable()
+        finally:
+            _profile_lock.release()
+        elapsed_ms = (time.perf_counter() - t0) * 1000
+
+        report = io.StringIO()
+        pstats.Stats(profile, stream=report).sort_stats(sort).print_stats(PROFILE_REPORT_LINES)
+        response = PlainTextResponse(
+            report.getvalue(),
+            headers={"X-Profiled-Status": str(status), "X-Profiled-Ms": f"{elapsed_ms:.1f}"}
+        )
+        await response(scope, receive, send)
+
+
+class LoopLagMonitor:
+    """
+    How late the event loop runs a timer, plus the stacks that kept it busy
+
+    A task sleeps for interval and records how much later than that it woke
+    up. Separately, a watchdog thread checks that the task keeps waking up;
+    while it is overdue by stall seconds or more the loop thread is stuck,
+    and the thread's current stack is recorded every half stall, so stacks
+    are weighted by how long they blocked.
+    """
+
+    def __init__(
+        self,
+        interval: float = LOOP_LAG_INTERVAL_SECONDS,
+        stall: float = LOOP_STALL_SECONDS,
+        window: int = 600
+    ):
+        self.interval = interval
+        self.stall = stall
+        self._lags_ms: Deque[float] = deque(maxlen=window)
+        self._task: Optional["asyncio.Task[None]"] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        self._loop_thread: Optional[int] = None
+        self._beat = time.monotonic()
+        self.stall_stacks: Counter = Counter()
+
+        self.stalls = 0
+        self.max_lag_ms = 0.0
+
+    def start(self) -> None:
+        """Call from the running event loop"""
+        if self._task is None:
+            self._loop_thread = threading.get_ident()
+            self._beat = time.monotonic()
+            self._stopping.clear()
+            self._task = asyncio.create_task(self._run())
+            self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+            self._watchdog.start()
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self._stopping.set()
+        await asyncio.to_thread(self._watchdog.join, self.stall)
+        self._watchdog = None
+
+    async def _run(self) -> None:
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self._beat = now
+            lag_ms = max(0.0, now - expected) * 1000
+            self._lags_ms.append(lag_ms)
+            if lag_ms > self.max_lag_ms:
+                self.max_lag_ms = lag_ms
+            if lag_ms >= self.stall * 1000:
+                self.stalls += 1
+
+    def _watch(self) -> None:
+        while not self._stopping.wait(self.stall / 2):
+            beat = self._beat
+            if time.monotonic() - beat - self.interval < self.stall:
+                continue
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is not None:
+                _count(self.stall_stacks, collapse(frame))
+
+    def stats(self) -> Dict[str, Any]:
+        lags = sorted(self._lags_ms)
+
+        def percentile(p: float) -> Optional[float]:
+            return round(lags[min(len(lags) - 1, int(len(lags) * p))], 2) if lags else None
+
+        return {
+            "interval_ms": self.interval * 1000,
+            "stall_threshold_ms": self.stall * 1000,
+            "p50_lag_ms": percentile(0.5),
+            "p99_lag_ms": percentile(0.99),
+            "max_lag_ms": round(self.max_lag_ms, 2),
+            "stalls": self.stalls,
+            "stall_samples": sum(self.stall_stacks.values()),
+        }
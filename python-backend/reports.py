@@ -0,0 +1,303 @@
+"""
+Report ingestion and automatic moderation
+
+Reports are counted in memory and written to the database in batches, so a
+raid that produces thousands of reports a minute costs a handful of inserts
+instead of one round trip each:
+
+- SlidingWindowCounter counts reports per (meetup, target) over the last
+  REPORTS_WINDOW_MINUTES in REPORT_BUCKETS time buckets. Adding a report is
+  O(1) and the number of tracked targets is capped (least recently reported
+  targets are forgotten first).
+- Repeat reports of the same target by the same reporter within the window
+  are dropped, so one user cannot push someone over the threshold alone.
+- BatchInserter buffers report rows and inserts them in one request once
+  REPORT_BATCH_SIZE rows are pending or REPORT_FLUSH_SECONDS have passed.
+  A batch the database rejects is split in half until the offending rows
+  are found; those are dropped and the rest are written.
+
+Crossing REPORTS_THRESHOLD soft-bans the reported user (or the author of the
+reported message or file) once per window. Counts and the repeat filter live
+in each worker, so with several workers the threshold applies per worker and
+only reports that worker counted are stored.
+"""
+
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional
+
+# Same defaults as the app's SOFT_BAN config (lib/config.ts)
+REPORTS_THRESHOLD = int(os.getenv("REPORTS_THRESHOLD", "3"))
+REPORTS_WINDOW_SECONDS = float(os.getenv("REPORTS_WINDOW_MINUTES", "10")) * 60
+REPORT_BUCKETS = 10
+MAX_TRACKED_TARGETS = 100_000
+
+REPORT_BATCH_SIZE = 200
+REPORT_FLUSH_SECONDS = 0.5
+# Rows kept while the database is unreachable; the oldest are dropped beyond this
+MAX_PENDING_REPORTS = 20_000
+
+
+class RowsRejected(Exception):
+    """The database refused the rows themselves; retrying the same batch cannot succeed"""
+
+
+class _Window:
+    __slots__ = ("counts", "epoch", "total")
+
+    def __init__(self, buckets: int, epoch: int):
+        self.counts = [0] * buckets
+        self.epoch = epoch
+        self.total = 0
+
+
+class SlidingWindowCounter:
+    """
+    Approximate sliding-window counts per key
+
+    The window is split into fixed buckets; counts older than the window
+    drop out one bucket at a time, so a count may include up to one bucket
+    width of extra history.
+    """
+
+    def __init__(
+        self,
+        window_seconds: float = REPORTS_WINDOW_SECONDS,
+        buckets: int = REPORT_BUCKETS,
+        max_keys: int = MAX_TRACKED_TARGETS,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.bucket_seconds = window_seconds / buckets
+        self.buckets = buckets
+        self.max_keys = max_keys
+        self.clock = clock
+        self._windows: "OrderedDict[Hashable, _Window]" = OrderedDict()
+        self.evicted = 0
+
+    def __len__(self) -> int:
+        return len(self._windows)
+
+    def _advance(self, window: _Window, epoch: int) -> None:
+        if epoch - window.epoch >= self.buckets:
+            window.counts = [0] * self.buckets
+            window.total = 0
+        else:
+            # At most `buckets` steps, however long the key was idle
+            for e in range(window.epoch + 1, epoch + 1):
+                window.total -= window.counts[e % self.buckets]
+                window.counts[e % self.buckets] = 0
+        window.epoch = max(window.epoch, epoch)
+
+    def add(self, key: Hashable) -> int:
+        """Count one event for key; returns the key's count in the window"""
+        epoch = int(self.clock() // self.bucket_seconds)
+        window = self._windows.get(key)
+        if window is None:
+            window = self._windows[key] = _Window(self.buckets, epoch)
+            if len(self._windows) > self.max_keys:
+                self._windows.popitem(last=False)
+                self.evicted += 1
+        else:
+            self._windows.move_to_end(key)
+            self._advance(window, epoch)
+        window.counts[epoch % self.buckets] += 1
+        window.total += 1
+        return window.total
+
+    def count(self, key: Hashable) -> int:
+        window = self._windows.get(key)
+        if window is None:
+            return 0
+        self._advance(window, int(self.clock() // self.bucket_seconds))
+        return window.total
+
+
+class ExpiringSet:
+    """Bounded set whose members expire after ttl seconds; O(1) add and lookup"""
+
+    def __init__(self, ttl: float, max_size: int, clock: Callable[[], float] = time.monotonic):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.clock = clock
+        self._expires: "OrderedDict[Hashable, float]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._expires)
+
+    def __contains__(self, key: Hashable) -> bool:
+        expires = self._expires.get(key)
+        if expires is None:
+            return False
+        if expires <= self.clock():
+            del self._expires[key]
+            return False
+        return True
+
+    def add(self, key: Hashable) -> None:
+        self._expires[key] = self.clock() + self.ttl
+        self._expires.move_to_end(key)
+        if len(self._expires) > self.max_size:
+            self._expires.popitem(last=False)
+
+    def discard(self, key: Hashable) -> None:
+        self._expires.pop(key, None)
+
+
+class BatchInserter:
+    """Buffers rows and writes them in batches from a background task"""
+
+    def __init__(
+        self,
+        insert: Callable[[List[Dict[str, Any]]], Awaitable[None]],
+        batch_size: int = REPORT_BATCH_SIZE,
+        flush_seconds: float = REPORT_FLUSH_SECONDS,
+        max_pending: int = MAX_PENDING_REPORTS
+    ):
+        self.insert = insert
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.max_pending = max_pending
+        self._pending: List[Dict[str, Any]] = []
+        # Created in start(), inside the running event loop
+        self._wake: Optional[asyncio.Event] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._task: Optional["asyncio.Task[None]"] = None
+
+        self.inserted = 0
+        self.batches = 0
+        self.failures = 0
+        self.dropped = 0
+        self.rejected = 0
+
+    def start(self) -> None:
+        if self._task is None:
+            self._wake = asyncio.Event()
+            self._lock = asyncio.Lock()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the background task and write whatever is still buffered"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def add(self, row: Dict[str, Any]) -> None:
+        self._pending.append(row)
+        if self._task is None:
+            # Not started (e.g. scripts): write through
+            await self.flush()
+        elif len(self._pending) >= self.batch_size:
+            self._wake.set()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+
+    async def flush(self) -> None:
+        if self._lock is None:
+            await self._flush()
+            return
+        async with self._lock:
+            await self._flush()
+
+    async def _flush(self) -> None:
+        while self._pending:
+            # Chunks still to write, next one last; a rejected chunk is replaced by its halves
+            chunks = [self._pending[:self.batch_size]]
+            del self._pending[:self.batch_size]
+            while chunks:
+                rows = chunks.pop()
+                try:
+                    await self.insert(rows)
+                except RowsRejected as e:
+                    if len(rows) == 1:
+                        self.rejected += 1
+                        print(f"Dropping a buffered row the database rejected: {e}")
+                    else:
+                        middle = len(rows) // 2
+                        chunks += [rows[middle:], rows[:middle]]
+                    continue
+                except Exception as e:
+                    self.failures += 1
+                    print(f"Error inserting {len(rows)} buffered rows: {e}")
+                    # Keep the unwritten rows for the next flush, within bounds
+                    self._pending[:0] = rows + [row for chunk in reversed(chunks) for row in chunk]
+                    overflow = len(self._pending) - self.max_pending
+                    if overflow > 0:
+                        del self._pending[:overflow]
+                        self.dropped += overflow
+                    return
+                self.inserted += len(rows)
+                self.batches += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending": len(self._pending),
+            "inserted": self.inserted,
+            "batches": self.batches,
+            "failures": self.failures,
+            "dropped": self.dropped,
+            "rejected": self.rejected,
+        }
+
+
+class ReportModerator:
+    """Counts incoming reports and decides when a target gets auto soft-banned"""
+
+    def __init__(
+        self,
+        insert: Callable[[List[Dict[str, Any]]], Awaitable[None]],
+        threshold: int = REPORTS_THRESHOLD,
+        window_seconds: float = REPORTS_WINDOW_SECONDS
+    ):
+        self.threshold = threshold
+        self.window_seconds = window_seconds
+        self.counts = SlidingWindowCounter(window_seconds)
+        self.writer = BatchInserter(insert)
+        self._repeats = ExpiringSet(window_seconds, MAX_TRACKED_TARGETS)
+        self._actioned = ExpiringSet(window_seconds, MAX_TRACKED_TARGETS)
+
+        self.received = 0
+        self.repeats = 0
+        self.triggered = 0
+
+    async def submit(self, row: Dict[str, Any]) -> bool:
+        """Buffer a report row; True if it just pushed its target over the threshold"""
+        self.received += 1
+        target = (row["meetup_id"], row["target_type"], row["target_id"])
+        repeat = target + (row["reporter_id"],)
+        if repeat in self._repeats:
+            self.repeats += 1
+            return False
+        self._repeats.add(repeat)
+
+        await self.writer.add(row)
+        if self.counts.add(target) < self.threshold or target in self._actioned:
+            return False
+        self._actioned.add(target)
+        self.triggered += 1
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "threshold": self.threshold,
+            "window_seconds": self.window_seconds,
+            "received": self.received,
+            "repeats_dropped": self.repeats,
+            "thresholds_crossed": self.triggered,
+            "tracked_targets": len(self.counts),
+            "evicted_targets": self.counts.evicted,
+            "writer": self.writer.stats(),
+        }
@@ -0,0 +1,460 @@
+"""
+In-memory search indexes for chat messages and meetups
+
+Used when Supabase is not configured. With Supabase, chat search is served by
+the search_messages() database function over the messages.search_vector GIN
+index, and meetup search by search_meetups() over a pg_trgm index (see
+sql/schema.sql).
+"""
+
+import base64
+import bisect
+import heapq
+import json
+import math
+import re
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Optional, Dict, Any, List, Tuple, Set, Callable
+
+from intervals import IntervalTree
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Kept deliberately small - mirrors the most common entries of Postgres' english dictionary
+STOPWORDS = frozenset([
+    "a", "an", "and", "are", "as", "at", "be", "but", "by", "for", "if", "in",
+    "into", "is", "it", "no", "not", "of", "on", "or", "so", "such", "that",
+    "the", "their", "then", "there", "these", "they", "this", "to", "was",
+    "will", "with", "i", "you", "we", "me", "my",
+])
+
+# Same markers Postgres' ts_headline uses by default
+HIGHLIGHT_START = "<b>"
+HIGHLIGHT_STOP = "</b>"
+
+EARTH_RADIUS_M = 6371000.0
+
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-case word tokens with stopwords removed"""
+    return [t for t in TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+
+
+def encode_cursor(rank: float, key: Any) -> str:
+    """Encode a (rank, tiebreak key) position as an opaque cursor"""
+    raw = json.dumps([rank, key], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[float, Any]:
+    """Decode a cursor produced by encode_cursor; raises ValueError if malformed"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        rank, key = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return float(rank), key
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def highlight(text: str, terms: List[str]) -> str:
+    """Wrap every occurrence of the query terms in highlight markers"""
+    if not terms:
+        return text
+    pattern = re.compile(
+        r"\b(" + "|".join(re.escape(t) for t in sorted(set(terms), key=len, reverse=True)) + r")\b",
+        re.IGNORECASE
+    )
+    return pattern.sub(lambda m: f"{HIGHLIGHT_START}{m.group(0)}{HIGHLIGHT_STOP}", text)
+
+
+class _MeetupIndex:
+    """Postings for the messages of a single meetup"""
+
+    __slots__ = ("docs", "norms", "postings", "impacts")
+
+    def __init__(self):
+        self.docs: List[Dict[str, Any]] = []
+        # Per-document length normalisation, 1 / (1 + ln(1 + token count))
+        self.norms: List[float] = []
+        # term -> {doc number: term frequency}
+        self.postings: Dict[str, Dict[int, int]] = {}
+        # term -> {single-term rank: ascending doc numbers}, so one-word queries
+        # (the common case while typing) read hits best-first without scoring
+        self.impacts: Dict[str, Dict[float, List[int]]] = {}
+
+
+class MessageSearchIndex:
+    """
+    Incremental inverted index of chat messages, partitioned by meetup
+
+    Messages are appended as they are sent, so indexing costs O(tokens) per
+    message and never requires a rebuild. Queries match all terms (like
+    websearch_to_tsquery) and are ranked by a corpus-independent tf score, so
+    ranks - and therefore cursors - stay stable while new messages arrive.
+    """
+
+    def __init__(self):
+        self._meetups: Dict[str, _MeetupIndex] = {}
+
+    def add(self, message: Dict[str, Any]) -> None:
+        """Index a message dict with at least meetup_id and message keys"""
+        index = self._meetups.get(message["meetup_id"])
+        if index is None:
+            index = self._meetups[message["meetup_id"]] = _MeetupIndex()
+
+        doc_no = len(index.docs)
+        tokens = tokenize(message["message"])
+        index.docs.append(message)
+        norm = 1.0 / (1.0 + math.log1p(len(tokens)))
+        index.norms.append(norm)
+
+        counts: Dict[str, int] = {}
+        for token in tokens:
+            counts[token] = counts.get(token, 0) + 1
+        for token, tf in counts.items():
+            postings = index.postings.get(token)
+            if postings is None:
+                postings = index.postings[token] = {}
+            postings[doc_no] = tf
+            buckets = index.impacts.get(token)
+            if buckets is None:
+                buckets = index.impacts[token] = {}
+            rank = round(math.log1p(tf) * norm, 6)
+            bucket = buckets.get(rank)
+            if bucket is None:
+                bucket = buckets[rank] = []
+            bucket.append(doc_no)
+
+    def drop_meetup(self, meetup_id: str) -> None:
+        """Forget every message of a meetup"""
+        self._meetups.pop(meetup_id, None)
+
+    def messages(self, meetup_id: str) -> List[Dict[str, Any]]:
+        """A meetup's indexed messages in the order they were added"""
+        index = self._meetups.get(meetup_id)
+        return list(index.docs) if index else []
+
+    def messages_from(self, meetup_id: str, start: int, limit: int) -> List[Dict[str, Any]]:
+        """Up to limit of a meetup's messages from position start on, in the order they were added"""
+        index = self._meetups.get(meetup_id)
+        return index.docs[start:start + limit] if index else []
+
+    def message_count(self, meetup_id: str) -> int:
+        index = self._meetups.get(meetup_id)
+        return len(index.docs) if index else 0
+
+    def search(
+        self,
+        meetup_id: str,
+        query: str,
+        limit: int = 20,
+        cursor: Optional[str] = None
+    ) -> Tuple[List[Tuple[Dict[str, Any], float, str]], Optional[str]]:
+        """
+        Search one meetup's messages
+        Returns: ([(message, rank, highlighted_text)], next_cursor)
+        """
+        index = self._meetups.get(meetup_id)
+        terms = list(dict.fromkeys(tokenize(query)))
+        if index is None or not terms:
+            return [], None
+
+        postings = [index.postings.get(term) for term in terms]
+        if any(p is None for p in postings):
+            return [], None
+        postings.sort(key=len)
+
+        after: Optional[Tuple[float, int]] = None
+        if cursor:
+            after_rank, after_doc = decode_cursor(cursor)
+            if not isinstance(after_doc, int):
+                raise ValueError("Invalid cursor")
+            after = (-after_rank, -after_doc)
+
+        if len(postings) == 1:
+            page = self._single_term_page(index.impacts[terms[0]], limit + 1, after)
+        else:
+            # Sort key is (-rank, -doc_no): best rank first, newest first on ties
+            norms = index.norms
+            first, rest = postings[0], postings[1:]
+            keys = (
+                (-round(sum(math.log1p(p[d]) for p in postings) * norms[d], 6), -d)
+                for d in first if all(d in p for p in rest)
+            )
+            if after is not None:
+                keys = (key for key in keys if key > after)
+            page = heapq.nsmallest(limit + 1, keys)
+
+        hits = [
+            (index.docs[-neg_doc], -neg_rank, highlight(index.docs[-neg_doc]["message"], terms))
+            for neg_rank, neg_doc in page[:limit]
+        ]
+
+        next_cursor = None
+        if len(page) > limit:
+            neg_rank, neg_doc = page[limit - 1]
+            next_cursor = encode_cursor(-neg_rank, -neg_doc)
+        return hits, next_cursor
+
+    @staticmethod
+    def _single_term_page(
+        buckets: Dict[float, List[int]],
+        count: int,
+        after: Optional[Tuple[float, int]]
+    ) -> List[Tuple[float, int]]:
+        """Walk impact buckets best-first, returning up to count (-rank, -doc_no) keys after the cursor"""
+        page: List[Tuple[float, int]] = []
+        for rank in sorted(buckets, reverse=True):
+            docs = buckets[rank]
+            end = len(docs)
+            if after is not None:
+                if -rank < after[0]:
+                    continue
+                if -rank == after[0]:
+                    end = bisect.bisect_left(docs, -after[1])
+            for i in range(end - 1, -1, -1):
+                page.append((-rank, -docs[i]))
+                if len(page) == count:
+                    return page
+        return page
+
+
+def _as_utc(value: datetime) -> datetime:
+    """Treat naive datetimes as UTC so mixed inputs stay comparable"""
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+
+def haversine_m(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """Great-circle distance in meters"""
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp, dl = p2 - p1, math.radians(lng2 - lng1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+def fuzzed_coords(lat: float, lng: float, meetup_id: str) -> Tuple[float, float]:
+    """Python twin of generate_fuzzed_coords() in sql/schema.sql"""
+    seed = int(meetup_id[:8], 16)
+    if seed >= 2 ** 31:
+        seed -= 2 ** 32
+    # Postgres % truncates toward zero
+    offset_degrees = (75 + math.fmod(seed, 25)) / 111000.0
+    angle = math.radians(math.fmod(seed, 360))
+    return lat + offset_degrees * math.cos(angle), lng + offset_degrees * math.sin(angle)
+
+
+def trigrams(word: str, prefix: bool = False) -> Set[str]:
+    """
+    pg_trgm-style trigrams of one word, padded with two leading spaces and one
+    trailing space. With prefix=True the trailing-space trigram is dropped so a
+    partially typed word still matches the full word.
+    """
+    padded = f"  {word}" if prefix else f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class MeetupSearchIndex:
+    """
+    Trigram index over meetup titles and descriptions
+
+    Matching is two-level: each query word is compared by trigram overlap
+    against the (small) vocabulary of indexed words, like pg_trgm's
+    word_similarity, which tolerates typos and lets a half-typed last word
+    match. Matching words then map to meetups through word postings, and a
+    meetup must match every query word. Results are cached per normalised
+    query in a small LRU so as-you-type lookups and backspacing skip the
+    scan; any change to the index invalidates the cache.
+
+    Start and end times also go into an interval tree, which answers "what
+    is on during this window" without a text query.
+    """
+
+    def __init__(self, threshold: float = 0.5, cache_size: int = 1024):
+        self.threshold = threshold
+        self.cache_size = cache_size
+        self._meetups: Dict[str, Dict[str, Any]] = {}
+        self._doc_words: Dict[str, Set[str]] = {}
+        # word -> meetup ids containing it
+        self._word_postings: Dict[str, Set[str]] = {}
+        # trigram -> vocabulary words containing it
+        self._gram_words: Dict[str, Set[str]] = {}
+        # meetup id -> start_ts as a POSIX timestamp, for cheap tie-breaking
+        self._start_keys: Dict[str, float] = {}
+        self._times = IntervalTree()
+        self._cache: "OrderedDict[str, List[Tuple[float, List[str]]]]" = OrderedDict()
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def __len__(self) -> int:
+        return len(self._meetups)
+
+    def get(self, meetup_id: str) -> Optional[Dict[str, Any]]:
+        return self._meetups.get(meetup_id)
+
+    def ended_before(self, moment: datetime, limit: int) -> List[str]:
+        """IDs of up to limit indexed meetups whose end_ts is before moment"""
+        moment = _as_utc(moment)
+        return [m["id"] for m in self._meetups.values() if m["end_ts"] < moment][:limit]
+
+    def add(self, meetup: Dict[str, Any]) -> None:
+        """Index (or re-index) a meetup dict"""
+        meetup_id = meetup["id"]
+        self.remove(meetup_id)
+        meetup = dict(meetup, start_ts=_as_utc(meetup["start_ts"]), end_ts=_as_utc(meetup["end_ts"]))
+        words = set(TOKEN_RE.findall(f"{meetup['title']} {meetup.get('description') or ''}".lower()))
+        self._meetups[meetup_id] = meetup
+        self._start_keys[meetup_id] = meetup["start_ts"].timestamp()
+        self._times.add(meetup_id, meetup["start_ts"].timestamp(), meetup["end_ts"].timestamp())
+        self._doc_words[meetup_id] = words
+        for word in words:
+            postings = self._word_postings.get(word)
+            if postings is None:
+                postings = self._word_postings[word] = set()
+                for gram in trigrams(word):
+                    self._gram_words.setdefault(gram, set()).add(word)
+            postings.add(meetup_id)
+        self._cache.clear()
+
+    def remove(self, meetup_id: str) -> None:
+        """Drop a meetup from the index"""
+        if self._meetups.pop(meetup_id, None) is None:
+            return
+        del self._start_keys[meetup_id]
+        self._times.remove(meetup_id)
+        for word in self._doc_words.pop(meetup_id):
+            postings = self._word_postings[word]
+            postings.discard(meetup_id)
+            if not postings:
+                del self._word_postings[word]
+                for gram in trigrams(word):
+                    words = self._gram_words[gram]
+                    words.discard(word)
+                    if not words:
+                        del self._gram_words[gram]
+        self._cache.clear()
+
+    def overlapping(
+        self,
+        window_start: datetime,
+        window_end: datetime,
+        visible: Callable[[Dict[str, Any]], bool],
+        limit: int = 20,
+        after: Optional[Tuple[float, str]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Visible meetups running at any point of [window_start, window_end],
+        soonest start first; after is the (start timestamp, id) of the last
+        meetup on the previous page
+        """
+        results = []
+        matches = self._times.overlapping(_as_utc(window_start).timestamp(), _as_utc(window_end).timestamp(), after)
+        for meetup_id, _, _ in matches:
+            meetup = self._meetups[meetup_id]
+            if visible(meetup):
+                results.append(meetup)
+                if len(results) == limit:
+                    break
+        return results
+
+    def _word_matches(self, word: str, prefix: bool) -> List[Tuple[float, Set[str]]]:
+        """Meetups matching one query word as disjoint (similarity, meetup ids) levels, best first"""
+        query_grams = trigrams(word, prefix=prefix)
+        counts: Dict[str, int] = {}
+        for gram in query_grams:
+            for candidate in self._gram_words.get(gram, ()):
+                counts[candidate] = counts.get(candidate, 0) + 1
+
+        # Group vocabulary words by similarity so postings are merged with set operations
+        by_score: Dict[float, List[str]] = {}
+        for candidate, n in counts.items():
+            score = round(n / len(query_grams), 4)
+            if score >= self.threshold:
+                by_score.setdefault(score, []).append(candidate)
+
+        levels: List[Tuple[float, Set[str]]] = []
+        seen: Set[str] = set()
+        for score in sorted(by_score, reverse=True):
+            matched = set().union(*(self._word_postings[w] for w in by_score[score]))
+            matched.difference_update(seen)
+            if matched:
+                levels.append((score, matched))
+                seen.update(matched)
+        return levels
+
+    def _text_matches(self, query: str) -> List[Tuple[float, List[str]]]:
+        """Meetups matching every query word as (score, ids by start time) groups, best first"""
+        words = TOKEN_RE.findall(query.lower())
+        key = " ".join(words)
+        cached = self._cache.get(key)
+        if cached is not None:
+            self._cache.move_to_end(key)
+            self.cache_hits += 1
+            return cached
+        self.cache_misses += 1
+
+        # Combine per-word levels by summed similarity, intersecting id sets as we go
+        totals: Dict[float, Set[str]] = {}
+        for i, word in enumerate(words):
+            levels = self._word_matches(word, prefix=(i == len(words) - 1))
+            if i == 0:
+                totals = {score: ids for score, ids in levels}
+                continue
+            combined: Dict[float, Set[str]] = {}
+            for total, ids in totals.items():
+                for score, level_ids in levels:
+                    hit = ids & level_ids
+                    if hit:
+                        combined.setdefault(round(total + score, 4), set()).update(hit)
+            totals = combined
+
+        # Best score first, then soonest start
+        starts = self._start_keys
+        matches = [
+            (round(total / len(words), 4), sorted(totals[total], key=starts.__getitem__))
+            for total in sorted(totals, reverse=True)
+        ]
+
+        self._cache[key] = matches
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return matches
+
+    def search(
+        self,
+        query: str,
+        visible: Callable[[Dict[str, Any]], bool],
+        window_start: Optional[datetime] = None,
+        window_end: Optional[datetime] = None,
+        near: Optional[Tuple[float, float, float]] = None,
+        limit: int = 20,
+        location: Optional[Callable[[Dict[str, Any]], Tuple[float, float]]] = None
+    ) -> List[Tuple[Dict[str, Any], float]]:
+        """
+        Text search combined with filters
+        near is (lat, lng, radius_m), measured to location(meetup) (the exact
+        location by default); the time window keeps meetups overlapping it.
+        Returns: [(meetup, score)]
+        """
+        window_start = _as_utc(window_start) if window_start else None
+        window_end = _as_utc(window_end) if window_end else None
+
+        results = []
+        for score, meetup_ids in self._text_matches(query):
+            for meetup_id in meetup_ids:
+                meetup = self._meetups[meetup_id]
+                if window_start and meetup["end_ts"] < window_start:
+                    continue
+                if window_end and meetup["start_ts"] > window_end:
+                    continue
+                if not visible(meetup):
+                    continue
+                if near:
+                    lat, lng = location(meetup) if location else (meetup["lat"], meetup["lng"])
+                    if haversine_m(near[0], near[1], lat, lng) > near[2]:
+                        continue
+                results.append((meetup, score))
+                if len(results) == limit:
+                    return results
+        return results
@@ -2,12 +2,33 @@
 Service layer for database operations
 """
 
+import asyncio
+import heapq
 import os
+import tempfile
 import uuid
-from datetime import datetime, timedelta
-from typing import Optional, Dict, Any, Tuple, List
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Dict, Any, Tuple, List, Set, AsyncIterator, Sequence
 import httpx
-from validators import CreateMeetupRequest, AcceptInviteRequest, SoftBanRequest, SendMessageRequest, GetMessagesRequest, MessageResponse
+from validators import ExportRequest, HomeRequest, HomeResponse, CreateMeetupRequest, AcceptInviteRequest, SoftBanRequest, SendMessageRequest, GetMessagesRequest, MessageResponse, SearchMessagesRequest, MessageSearchHit, SearchMeetupsRequest, MeetupSummary, ActiveMeetupsRequest, CreateUploadRequest, UploadStatusResponse, SubmitReportRequest, PresenceResponse, OnlineMember, OnlineMembersRequest, OnlineMembersResponse
+from search import MessageSearchIndex, MeetupSearchIndex, encode_cursor, decode_cursor, fuzzed_coords, haversine_m
+from versions import MeetupVersions
+from archive import MessageArchive, BlockRef, BLOCK_MESSAGES
+from derivatives import DerivativePipeline, Derivative, VARIANTS
+from reports import ReportModerator, ExpiringSet, RowsRejected, MAX_TRACKED_TARGETS
+from presence import PresenceTracker, PRESENCE_HEARTBEAT_SECONDS
+from tasks import TaskQueue
+from invites import InviteSigner, RevocationSet, is_signed_token
+from export import EXPORT_PAGE_SIZE
+from storage import LocalStorage, SupabaseStorage, UploadTooLarge, UploadOffsetMismatch, limit_stream, MAX_FILE_BYTES, MAX_MEETUP_BYTES, MAX_FILES_PER_MEETUP, UPLOAD_TTL
+
+# Time budget per home screen section; a slow section is left out instead of holding up the others
+HOME_SECTION_TIMEOUTS = {'joined': 0.8, 'nearby': 0.8, 'recent_messages': 1.0}
+# How far ahead the home screen looks for nearby meetups
+HOME_NEARBY_WINDOW = timedelta(hours=12)
+# sweep_expired()'s default p_token_retention, for the mock sweeper
+TOKEN_RETENTION = timedelta(days=7)
 
 
 class SupabaseService:
@@ -21,9 +42,100 @@ class SupabaseService:
         # Allow mock mode if Supabase is not configured
         self.mock_mode = not (self.supabase_url and self.supabase_key)
         
+        # Search indexes for mock mode (the database keeps its own tsvector/trigram indexes)
+        self.message_index = MessageSearchIndex()
+        self.meetup_index = MeetupSearchIndex()
+        self.mock_memberships: Dict[str, Set[str]] = {}
+        # Mock meetups leave the search index once the sweeper archives them
+        self.mock_archived_meetups: Dict[str, Dict[str, Any]] = {}
+        
+        # Version stamps for ETags, bumped on every write that changes a meetup read
+        self.versions = MeetupVersions()
+        
+        # Meetup files: Supabase Storage, or a local directory in mock mode / when configured
+        storage_dir = os.getenv('FILE_STORAGE_DIR')
+        if not storage_dir and self.mock_mode:
+            storage_dir = tempfile.mkdtemp(prefix='pennapps-files-')
+        if storage_dir:
+            self.storage = LocalStorage(storage_dir)
+        else:
+            self.storage = SupabaseStorage(self.supabase_url, self.supabase_service_key or self.supabase_key, self._client)
+        self.mock_uploads: Dict[str, Dict[str, Any]] = {}
+        
+        # Cold storage for the chat of archived meetups, in the same storage as
+        # the files; disabled unless configured (always on in mock mode)
+        archive_enabled = os.getenv('MESSAGE_ARCHIVE_ENABLED', 'true' if self.mock_mode else 'false').lower() == 'true'
+        self.archive: Optional[MessageArchive] = MessageArchive(self.storage) if archive_enabled else None
+        self.mock_archive_blocks: Dict[str, List[BlockRef]] = {}
+        self.mock_files: Dict[str, Dict[str, Any]] = {}
+        
+        # Thumbnails and previews of uploaded images, made off the event loop
+        self.derivatives = DerivativePipeline(self.storage, self.find_derivatives, self.record_derivatives)
+        self.mock_derivatives: Dict[str, List[Derivative]] = {}
+        
+        # Follow-up writes (audit rows) that requests don't wait for
+        self.tasks = TaskQueue()
+        self.tasks.register('soft_ban_event', self._record_soft_ban_event)
+        
+        # In-memory report counts, with batched inserts of the report rows
+        self.reports = ReportModerator(self._insert_reports)
+        self.mock_reports: List[Dict[str, Any]] = []
+        self.mock_soft_ban_events: Dict[str, List[Dict[str, Any]]] = {}
+        
+        # Recently confirmed memberships, so report floods and heartbeats don't re-check them
+        self.members = ExpiringSet(300, MAX_TRACKED_TARGETS)
+        # Meetups known to be public, so conditional GETs of them skip the visibility query
+        self.public_meetups = ExpiringSet(300, MAX_TRACKED_TARGETS)
+        
+        # Who is online in each meetup, from client heartbeats
+        self.presence = PresenceTracker()
+        
+        # Signed invite tokens are checked in-process; only revocation needs state
+        self.invites = InviteSigner()
+        self.revocations = RevocationSet(self._load_revoked_tokens)
+        self.mock_invite_tokens: Dict[str, Dict[str, Any]] = {}
+        
+        # One pooled client per process so requests reuse warm keep-alive connections
+        self._http: Optional[httpx.AsyncClient] = None
+        
         if self.mock_mode:
             print("Running in mock mode - Supabase not configured")
     
+    @asynccontextmanager
+    async def _client(self) -> AsyncIterator[httpx.AsyncClient]:
+        """Shared HTTP client; unlike a per-call client it is not closed on exit"""
+        if self._http is None:
+            self._http = httpx.AsyncClient(
+                timeout=httpx.Timeout(10.0, connect=5.0),
+                limits=httpx.Limits(max_connections=100, max_keepalive_connections=20)
+            )
+        yield self._http
+    
+    async def warm_up(self) -> None:
+        """
+        Open keep-alive connections to Supabase before the first user request
+        The probes read the hottest tables so PostgREST's schema cache is loaded too.
+        """
+        if self.mock_mode:
+            return
+        
+        async with self._client() as client:
+            probes = [
+                client.get(
+                    f"{self.supabase_url}/rest/v1/{table}",
+                    headers=self._get_headers(),
+                    params={'select': '*', 'limit': 1}
+                )
+                for table in ['memberships', 'messages', 'meetups', 'invite_tokens']
+            ]
+            for response in await asyncio.gather(*probes):
+                response.raise_for_status()
+    
+    async def close(self) -> None:
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+    
     def _get_headers(self, use_service_key: bool = False) -> Dict[str, str]:
         """Get headers for Supabase requests"""
         key = self.supabase_service_key if use_service_key else self.supabase_key
@@ -43,22 +155,32 @@ class SupabaseService:
             # Mock mode
             return await self._mock_create_meetup(request, user_id)
         
-        async with httpx.AsyncClient() as client:
+        params = {
+            'p_host_id': user_id,
+            'p_title': request.title,
+            'p_desc': request.desc,
+            'p_start_ts': request.start_ts.isoformat(),
+            'p_end_ts': request.end_ts.isoformat(),
+            'p_lat': request.lat,
+            'p_lng': request.lng,
+            'p_visibility': request.visibility,
+            'p_token_ttl_hours': request.token_ttl_hours
+        }
+        if self.invites.enabled:
+            # A signed token embeds the meetup's ID, so both IDs are chosen here instead of in the database
+            meetup_id, token_id = str(uuid.uuid4()), str(uuid.uuid4())
+            params.update({
+                'p_meetup_id': meetup_id,
+                'p_token_id': token_id,
+                'p_token': self.invites.sign(meetup_id, token_id, self._invite_expiry(request))
+            })
+        
+        async with self._client() as client:
             # Call the create_meetup function
             response = await client.post(
                 f"{self.supabase_url}/rest/v1/rpc/create_meetup",
                 headers=self._get_headers(use_service_key=True),
-                json={
-                    'p_host_id': user_id,
-                    'p_title': request.title,
-                    'p_desc': request.desc,
-                    'p_start_ts': request.start_ts.isoformat(),
-                    'p_end_ts': request.end_ts.isoformat(),
-                    'p_lat': request.lat,
-                    'p_lng': request.lng,
-                    'p_visibility': request.visibility,
-                    'p_token_ttl_hours': request.token_ttl_hours
-                }
+                json=params
             )
             
             if response.status_code != 200:
@@ -70,6 +192,45 @@ class SupabaseService:
             
             return result[0]['meetup_id'], result[0]['token'], result[0]['deep_link']
     
+    @staticmethod
+    def _invite_expiry(request: CreateMeetupRequest) -> datetime:
+        """When a new meetup's invite expires, as create_meetup() in the database computes it"""
+        if request.token_ttl_hours is not None:
+            return datetime.now(timezone.utc) + timedelta(hours=request.token_ttl_hours)
+        end_ts = request.end_ts
+        # Public meetups are clamped to six hours
+        if request.visibility == 'public' and end_ts - request.start_ts > timedelta(hours=6):
+            end_ts = request.start_ts + timedelta(hours=6)
+        return end_ts
+    
+    async def _signed_invite_meetup(self, token: str) -> Optional[str]:
+        """The meetup a signed token invites to, or None if it is invalid, expired or revoked"""
+        claims = self.invites.verify(token)
+        if claims is None or await self.revocations.is_revoked(claims.token_id):
+            return None
+        return claims.meetup_id
+    
+    async def _load_revoked_tokens(self) -> AsyncIterator[Tuple[str, float]]:
+        """(token id, expiry timestamp) of revoked invite tokens that haven't expired yet"""
+        if self.mock_mode:
+            now = datetime.now(timezone.utc)
+            for token in list(self.mock_invite_tokens.values()):
+                if token['revoked_at'] is not None and token['expires_at'] > now:
+                    yield token['id'], token['expires_at'].timestamp()
+            return
+        
+        rows = self._keyset_rows(
+            'invite_tokens',
+            {
+                'select': 'id,expires_at',
+                'revoked_at': 'not.is.null',
+                'expires_at': f'gt.{datetime.now(timezone.utc).isoformat()}'
+            },
+            ('id',)
+        )
+        async for row in rows:
+            yield row['id'], datetime.fromisoformat(row['expires_at'].replace('Z', '+00:00')).timestamp()
+    
     async def accept_invite(self, request: AcceptInviteRequest) -> Tuple[bool, str, Optional[str]]:
         """
         Accept an invite token
@@ -79,27 +240,55 @@ class SupabaseService:
             # Mock mode
             return await self._mock_accept_invite(request)
         
-        async with httpx.AsyncClient() as client:
-            # First, validate the token
-            token_response = await client.get(
-                f"{self.supabase_url}/rest/v1/invite_tokens",
-                headers=self._get_headers(),
+        meetup_id = None
+        if is_signed_token(request.token):
+            # Signature and expiry are checked in-process, revocation against the in-memory set
+            meetup_id = await self._signed_invite_meetup(request.token)
+            if meetup_id is None:
+                return False, "Invalid or expired token", None
+        
+        async with self._client() as client:
+            if meetup_id is None:
+                # Legacy token: validate it against the database
+                token_response = await client.get(
+                    f"{self.supabase_url}/rest/v1/invite_tokens",
+                    headers=self._get_headers(),
+                    params={
+                        'token': f'eq.{request.token}',
+                        'expires_at': f'gt.{datetime.now().isoformat()}',
+                        'revoked_at': 'is.null'
+                    }
+                )
+                
+                if token_response.status_code != 200:
+                    raise Exception(f"Database error: {token_response.text}")
+                
+                tokens = token_response.json()
+                if not tokens:
+                    return False, "Invalid or expired token", None
+                
+                token_data = tokens[0]
+                meetup_id = token_data['meetup_id']
+            
+            # The sweeper revokes an archived meetup's tokens only on its next run, and
+            # signed tokens are never looked up, so check the meetup itself
+            meetup_response = await client.get(
+                f"{self.supabase_url}/rest/v1/meetups",
+                headers=self._get_headers(use_service_key=True),
                 params={
-                    'token': f'eq.{request.token}',
-                    'expires_at': f'gt.{datetime.now().isoformat()}',
-                    'revoked_at': 'is.null'
+                    'id': f'eq.{meetup_id}',
+                    'select': 'id',
+                    'is_archived': 'eq.false',
+                    'ended_at': 'is.null',
+                    'end_ts': f'gt.{datetime.now(timezone.utc).isoformat()}'
                 }
             )
             
-            if token_response.status_code != 200:
-                raise Exception(f"Database error: {token_response.text}")
-            
-            tokens = token_response.json()
-            if not tokens:
-                return False, "Invalid or expired token", None
+            if meetup_response.status_code != 200:
+                raise Exception(f"Database error: {meetup_response.text}")
             
-            token_data = tokens[0]
-            meetup_id = token_data['meetup_id']
+            if not meetup_response.json():
+                return False, "This meetup has ended", None
             
             # Check if user is already a member
             membership_response = await client.get(
@@ -132,6 +321,7 @@ class SupabaseService:
             if membership_response.status_code not in [200, 201]:
                 raise Exception(f"Database error: {membership_response.text}")
             
+            self.versions.bump(meetup_id)
             return True, "Successfully joined meetup", meetup_id
     
     async def soft_ban_user(self, request: SoftBanRequest) -> Tuple[bool, str]:
@@ -143,7 +333,7 @@ class SupabaseService:
             # Mock mode
             return await self._mock_soft_ban(request)
         
-        async with httpx.AsyncClient() as client:
+        async with self._client() as client:
             # Check if meetup exists
             meetup_response = await client.get(
                 f"{self.supabase_url}/rest/v1/meetups",
@@ -175,30 +365,48 @@ class SupabaseService:
             if update_response.status_code not in [200, 204]:
                 raise Exception(f"Database error: {update_response.text}")
             
-            # Record the soft-ban event
-            event_response = await client.post(
-                f"{self.supabase_url}/rest/v1/soft_ban_events",
-                headers=self._get_headers(use_service_key=True),
-                json={
-                    'meetup_id': request.meetup_id,
-                    'target_user_id': request.target_user_id,
-                    'enacted_by': request.enacted_by,
-                    'reason': request.reason
-                }
-            )
-            
-            if event_response.status_code not in [200, 201]:
-                # Non-critical error, log but don't fail
-                print(f"Warning: Could not record soft-ban event: {event_response.text}")
-            
-            return True, "User soft-banned successfully"
+            self.versions.bump(request.meetup_id)
+        
+        # Banned members may not report; other workers' caches expire within five minutes
+        self.members.discard((request.meetup_id, request.target_user_id))
+        
+        # Record the soft-ban event after responding; it is only an audit trail
+        await self._defer('soft_ban_event', self._soft_ban_event(request))
+        return True, "User soft-banned successfully"
     
     async def _mock_create_meetup(self, request: CreateMeetupRequest, user_id: str) -> Tuple[str, str, str]:
         """Mock implementation for create meetup"""
         meetup_id = str(uuid.uuid4())
         token = "mock" + "".join([str(i % 10) for i in range(32)])
+        if self.invites.enabled:
+            token_id = str(uuid.uuid4())
+            expires_at = self._invite_expiry(request)
+            token = self.invites.sign(meetup_id, token_id, expires_at)
+            self.mock_invite_tokens[token_id] = {
+                'id': token_id,
+                'meetup_id': meetup_id,
+                'expires_at': expires_at,
+                'revoked_at': None
+            }
         deep_link = f"pennapps://join/{token}"
         
+        # Public meetups carry a fuzzed location for non-members, as create_meetup() does
+        public_lat, public_lng = fuzzed_coords(request.lat, request.lng, meetup_id) if request.visibility == 'public' else (None, None)
+        self.meetup_index.add({
+            'id': meetup_id,
+            'title': request.title,
+            'description': request.desc,
+            'start_ts': request.start_ts,
+            'end_ts': request.end_ts,
+            'lat': request.lat,
+            'lng': request.lng,
+            'public_lat': public_lat,
+            'public_lng': public_lng,
+            'visibility': request.visibility,
+            'host_id': user_id
+        })
+        self.mock_memberships.setdefault(meetup_id, set()).add(user_id)
+        
         print(f"Mock: Created meetup {meetup_id} for user {user_id}")
         print(f"Mock: Token {token}, Deep link {deep_link}")
         
@@ -206,8 +414,21 @@ class SupabaseService:
     
     async def _mock_accept_invite(self, request: AcceptInviteRequest) -> Tuple[bool, str, Optional[str]]:
         """Mock implementation for accept invite"""
+        if is_signed_token(request.token):
+            meetup_id = await self._signed_invite_meetup(request.token)
+            if meetup_id is None:
+                return False, "Invalid or expired token", None
+            meetup = self.meetup_index.get(meetup_id)
+            if meetup is None or meetup['end_ts'] <= datetime.now(timezone.utc):
+                return False, "This meetup has ended", None
+            self.mock_memberships.setdefault(meetup_id, set()).add(request.user_id)
+            self.versions.bump(meetup_id)
+            print(f"Mock: User {request.user_id} joined meetup {meetup_id}")
+            return True, "Successfully joined meetup", meetup_id
         if request.token.startswith("mock") or request.token == "demo123abc":
             meetup_id = "mock-meetup-123"
+            self.mock_memberships.setdefault(meetup_id, set()).add(request.user_id)
+            self.versions.bump(meetup_id)
             print(f"Mock: User {request.user_id} joined meetup {meetup_id}")
             return True, "Successfully joined meetup", meetup_id
         else:
@@ -215,9 +436,49 @@ class SupabaseService:
     
     async def _mock_soft_ban(self, request: SoftBanRequest) -> Tuple[bool, str]:
         """Mock implementation for soft ban"""
+        self.versions.bump(request.meetup_id)
         print(f"Mock: Soft-banned user {request.target_user_id} in meetup {request.meetup_id}")
+        await self._defer('soft_ban_event', self._soft_ban_event(request))
         return True, "User soft-banned successfully"
     
+    def _soft_ban_event(self, request: SoftBanRequest) -> Dict[str, Any]:
+        # The ID is chosen here so a retried or replayed insert cannot duplicate the row
+        return {
+            'id': str(uuid.uuid4()),
+            'meetup_id': request.meetup_id,
+            'target_user_id': request.target_user_id,
+            'enacted_by': request.enacted_by,
+            'reason': request.reason,
+            'created_at': datetime.now(timezone.utc).isoformat()
+        }
+    
+    async def _defer(self, task: str, payload: Dict[str, Any]) -> None:
+        """Queue follow-up work, or do it now if the task queue is not running or full"""
+        if not self.tasks.enqueue(task, payload):
+            try:
+                await self.tasks.run_now(task, payload)
+            except Exception as e:
+                # Non-critical, log but don't fail
+                print(f"Warning: Could not run {task}: {e}")
+    
+    async def _record_soft_ban_event(self, event: Dict[str, Any]) -> None:
+        if self.mock_mode:
+            events = self.mock_soft_ban_events.setdefault(event['meetup_id'], [])
+            if all(e['id'] != event['id'] for e in events):
+                events.append(event)
+            print(f"Mock: Recorded soft-ban event {event['id']}")
+            return
+        
+        async with self._client() as client:
+            response = await client.post(
+                f"{self.supabase_url}/rest/v1/soft_ban_events",
+                headers=dict(self._get_headers(use_service_key=True), Prefer='resolution=ignore-duplicates,return=minimal'),
+                json=event
+            )
+            
+            if response.status_code not in [200, 201]:
+                raise Exception(f"Database error: {response.text}")
+    
     async def send_message(self, request: SendMessageRequest) -> Tuple[bool, str, Optional[str]]:
         """
         Send a message to a meetup
@@ -226,7 +487,7 @@ class SupabaseService:
         if self.mock_mode:
             return await self._mock_send_message(request)
         
-        async with httpx.AsyncClient() as client:
+        async with self._client() as client:
             # Check if user is a member of the meetup
             membership_response = await client.get(
                 f"{self.supabase_url}/rest/v1/memberships",
@@ -263,6 +524,7 @@ class SupabaseService:
             message_data = message_response.json()
             message_id = message_data[0]['id'] if message_data else str(uuid.uuid4())
             
+            self.versions.bump(request.meetup_id)
             return True, "Message sent successfully", message_id
     
     async def get_messages(self, request: GetMessagesRequest) -> Tuple[bool, str, Optional[List[MessageResponse]]]:
@@ -273,14 +535,15 @@ class SupabaseService:
         if self.mock_mode:
             return await self._mock_get_messages(request)
         
-        async with httpx.AsyncClient() as client:
+        async with self._client() as client:
             # Check if user is a member of the meetup
             membership_response = await client.get(
                 f"{self.supabase_url}/rest/v1/memberships",
                 headers=self._get_headers(),
                 params={
                     'meetup_id': f'eq.{request.meetup_id}',
-                    'user_id': f'eq.{request.user_id}'
+                    'user_id': f'eq.{request.user_id}',
+                    'select': '*,meetups(is_archived)'
                 }
             )
             
@@ -291,6 +554,12 @@ class SupabaseService:
             if not memberships:
                 return False, "You are not a member of this meetup", None
             
+            # Only archived meetups can have chat in cold storage
+            if self.archive is not None and (memberships[0].get('meetups') or {}).get('is_archived'):
+                blocks, sealed = await self._archive_state(request.meetup_id)
+                if blocks:
+                    return True, "Messages retrieved successfully", await self._archived_messages(request, blocks, sealed)
+            
             # Get messages with user names
             messages_response = await client.get(
                 f"{self.supabase_url}/rest/v1/messages",
@@ -339,11 +608,25 @@ class SupabaseService:
     async def _mock_send_message(self, request: SendMessageRequest) -> Tuple[bool, str, Optional[str]]:
         """Mock implementation for sending a message"""
         message_id = str(uuid.uuid4())
+        self.message_index.add({
+            'id': message_id,
+            'meetup_id': request.meetup_id,
+            'user_id': request.user_id,
+            'message': request.message,
+            'message_type': request.message_type,
+            'timestamp': datetime.now()
+        })
+        self.versions.bump(request.meetup_id)
         print(f"Mock: User {request.user_id} sent message to meetup {request.meetup_id}: {request.message}")
         return True, "Message sent successfully", message_id
     
     async def _mock_get_messages(self, request: GetMessagesRequest) -> Tuple[bool, str, Optional[List[MessageResponse]]]:
         """Mock implementation for getting messages"""
+        if self.archive is not None:
+            blocks, sealed = await self._archive_state(request.meetup_id)
+            if sealed:
+                return True, "Messages retrieved successfully", await self._archived_messages(request, blocks, sealed)
+        
         # Generate some mock messages
         mock_messages = [
             MessageResponse(
@@ -380,3 +663,1556 @@ class SupabaseService:
         
         print(f"Mock: Retrieved {len(mock_messages)} messages for meetup {request.meetup_id}")
         return True, "Messages retrieved successfully", mock_messages
+    
+    async def _archive_state(self, meetup_id: str) -> Tuple[List[BlockRef], bool]:
+        """
+        A meetup's cold storage blocks, oldest first, and whether all of its
+        chat is in them (sealed)
+        """
+        if self.mock_mode:
+            meetup = self.mock_archived_meetups.get(meetup_id) or {}
+            return list(self.mock_archive_blocks.get(meetup_id, ())), meetup.get('messages_archived_at') is not None
+        
+        async with self._client() as client:
+            response = await client.get(
+                f"{self.supabase_url}/rest/v1/meetups",
+                headers=self._get_headers(use_service_key=True),
+                params={
+                    'id': f'eq.{meetup_id}',
+                    'select': 'messages_archived_at,message_archive_blocks(storage_path,byte_length,message_count,last_created_at,last_message_id)',
+                    'message_archive_blocks.order': 'seq.asc'
+                }
+            )
+            
+            if response.status_code != 200:
+                raise Exception(f"Database error: {response.text}")
+            
+            rows = response.json()
+            if not rows:
+                return [], False
+            
+            blocks = [
+                BlockRef(
+                    block['storage_path'],
+                    block['byte_length'],
+                    block['message_count'],
+                    block['last_created_at'],
+                    block['last_message_id']
+                )
+                for block in rows[0].get('message_archive_blocks') or []
+            ]
+            return blocks, rows[0]['messages_archived_at'] is not None
+    
+    async def _archived_messages(self, request: GetMessagesRequest, blocks: List[BlockRef], sealed: bool) -> List[MessageResponse]:
+        """
+        A page of get_messages for a meetup whose chat is in cold storage
+        Until the archive is sealed, messages newer than its last block are still
+        in the hot table; they head the page and the archive continues it.
+        """
+        messages: List[MessageResponse] = []
+        hot_count = 0
+        if blocks and not sealed:
+            async with self._client() as client:
+                response = await client.get(
+                    f"{self.supabase_url}/rest/v1/messages",
+                    headers=dict(self._get_headers(), Prefer='count=exact'),
+                    params={
+                        'meetup_id': f'eq.{request.meetup_id}',
+                        'select': 'id,meetup_id,user_id,created_at,text,type,users(handle)',
+                        'or': self._after_archived(blocks[-1]),
+                        'order': 'created_at.desc,id.desc',
+                        'limit': request.limit,
+                        'offset': request.offset
+                    }
+                )
+            
+            # 416: the offset is past the hot rows; Content-Range still counts them
+            if response.status_code not in [200, 206, 416]:
+                raise Exception(f"Database error: {response.text}")
+            
+            hot_count = int(response.headers.get('content-range', '*/0').rsplit('/', 1)[1])
+            rows = response.json() if response.status_code != 416 else []
+            messages = [
+                MessageResponse(
+                    id=row['id'],
+                    meetup_id=row['meetup_id'],
+                    user_id=row['user_id'],
+                    user_name=(row.get('users') or {}).get('handle') or 'Unknown User',
+                    message=row['text'],
+                    message_type=row['type'],
+                    timestamp=datetime.fromisoformat(row['created_at'].replace('Z', '+00:00')),
+                    is_own_message=row['user_id'] == request.user_id
+                )
+                for row in rows
+            ]
+            if len(messages) >= request.limit:
+                return messages
+        
+        page = await self.archive.read_page(blocks, request.limit - len(messages), max(0, request.offset - hot_count))
+        return messages + [
+            MessageResponse(
+                id=msg['id'],
+                meetup_id=msg['meetup_id'],
+                user_id=msg['user_id'],
+                user_name=msg['user_name'],
+                message=msg['message'],
+                message_type=msg['message_type'],
+                timestamp=datetime.fromisoformat(msg['timestamp'].replace('Z', '+00:00')),
+                is_own_message=msg['user_id'] == request.user_id
+            )
+            for msg in page
+        ]
+    
+    @staticmethod
+    def _after_archived(block: BlockRef) -> str:
+        """PostgREST or= filter for messages after a block's newest one in (created_at, id) order"""
+        return f'(created_at.gt."{block.last_created_at}",and(created_at.eq."{block.last_created_at}",id.gt.{block.last_id}))'
+    
+    async def search_messages(self, request: SearchMessagesRequest) -> Tuple[bool, str, Optional[List[MessageSearchHit]], Optional[str]]:
+        """
+        Full-text search within a meetup chat
+        Returns: (success, message, hits, next_cursor)
+        """
+        if self.mock_mode:
+            return await self._mock_search_messages(request)
+        
+        after_rank, after_id = decode_cursor(request.cursor) if request.cursor else (None, None)
+        
+        async with self._client() as client:
+            # Check if user is a member of the meetup
+            membership_response = await client.get(
+                f"{self.supabase_url}/rest/v1/memberships",
+                headers=self._get_headers(),
+                params={
+                    'meetup_id': f'eq.{request.meetup_id}',
+                    'user_id': f'eq.{request.user_id}'
+                }
+            )
+            
+            if membership_response.status_code != 200:
+                raise Exception(f"Database error: {membership_response.text}")
+            
+            if not membership_response.json():
+                return False, "You are not a member of this meetup", None, None
+            
+            # Ranked, highlighted hits come straight from the GIN-indexed search function
+            search_response = await client.post(
+                f"{self.supabase_url}/rest/v1/rpc/search_messages",
+                headers=self._get_headers(use_service_key=True),
+                json={
+                    'p_meetup_id': request.meetup_id,
+                    'p_query': request.query,
+                    'p_limit': request.limit + 1,
+                    'p_after_rank': after_rank,
+                    'p_after_id': after_id
+                }
+            )
+            
+            if search_response.status_code != 200:
+                raise Exception(f"Database error: {search_response.text}")
+            
+            rows = search_response.json()
+            hits = [
+                MessageSearchHit(
+                    message=MessageResponse(
+                        id=row['id'],
+                        meetup_id=row['meetup_id'],
+                        user_id=row['user_id'],
+                        user_name=row.get('user_name') or 'Unknown User',
+                        message=row['text'],
+                        message_type=row['type'],
+                        timestamp=datetime.fromisoformat(row['created_at'].replace('Z', '+00:00')),
+                        is_own_message=row['user_id'] == request.user_id
+                    ),
+                    rank=row['rank'],
+                    highlight=row['headline']
+                )
+                for row in rows[:request.limit]
+            ]
+            
+            next_cursor = None
+            if len(rows) > request.limit:
+                last = rows[request.limit - 1]
+                next_cursor = encode_cursor(last['rank'], last['id'])
+            
+            return True, "Search completed successfully", hits, next_cursor
+    
+    async def _mock_search_messages(self, request: SearchMessagesRequest) -> Tuple[bool, str, Optional[List[MessageSearchHit]], Optional[str]]:
+        """Mock implementation for chat search, served from the in-memory index"""
+        results, next_cursor = self.message_index.search(
+            request.meetup_id, request.query, limit=request.limit, cursor=request.cursor
+        )
+        hits = [
+            MessageSearchHit(
+                message=MessageResponse(
+                    id=msg['id'],
+                    meetup_id=msg['meetup_id'],
+                    user_id=msg['user_id'],
+                    user_name="You" if msg['user_id'] == request.user_id else msg['user_id'],
+                    message=msg['message'],
+                    message_type=msg['message_type'],
+                    timestamp=msg['timestamp'],
+                    is_own_message=msg['user_id'] == request.user_id
+                ),
+                rank=rank,
+                highlight=text
+            )
+            for msg, rank, text in results
+        ]
+        return True, "Search completed successfully", hits, next_cursor
+    
+    async def search_meetups(self, request: SearchMeetupsRequest) -> List[MeetupSummary]:
+        """
+        Typo-tolerant search over public meetups and meetups the user has joined
+        Returns: meetups, best match first
+        """
+        if self.mock_mode:
+            return await self._mock_search_meetups(request)
+        
+        async with self._client() as client:
+            response = await client.post(
+                f"{self.supabase_url}/rest/v1/rpc/search_meetups",
+                headers=self._get_headers(use_service_key=True),
+                json={
+                    'p_user_id': request.user_id,
+                    'p_query': request.q,
+                    'p_window_start': request.start.isoformat() if request.start else None,
+                    'p_window_end': request.end.isoformat() if request.end else None,
+                    'p_lat': request.lat,
+                    'p_lng': request.lng,
+                    'p_radius_m': request.radius_m,
+                    'p_limit': request.limit
+                }
+            )
+            
+            if response.status_code != 200:
+                raise Exception(f"Database error: {response.text}")
+            
+            return [MeetupSummary(**row) for row in response.json()]
+    
+    async def _mock_search_meetups(self, request: SearchMeetupsRequest) -> List[MeetupSummary]:
+        """Mock implementation for meetup search, served from the in-memory trigram index"""
+        def visible(meetup: Dict[str, Any]) -> bool:
+            return meetup['visibility'] == 'public' or request.user_id in self.mock_memberships.get(meetup['id'], ())
+        
+        near = (request.lat, request.lng, request.radius_m) if request.radius_m is not None else None
+        results = self.meetup_index.search(
+            request.q,
+            visible,
+            window_start=request.start,
+            window_end=request.end,
+            near=near,
+            limit=request.limit,
+            # Non-members are matched and shown on the fuzzed location, as in search_meetups()
+            location=lambda meetup: self._mock_location(meetup, request.user_id)
+        )
+        return [
+            MeetupSummary(
+                id=meetup['id'],
+                title=meetup['title'],
+                description=meetup.get('description'),
+                start_ts=meetup['start_ts'],
+                end_ts=meetup['end_ts'],
+                lat=lat,
+                lng=lng,
+                visibility=meetup['visibility'],
+                attendee_count=len(self.mock_memberships.get(meetup['id'], ())),
+                is_member=request.user_id in self.mock_memberships.get(meetup['id'], ()),
+                score=score
+            )
+            for meetup, score in results
+            for lat, lng in [self._mock_location(meetup, request.user_id)]
+        ]
+    
+    async def active_meetups(self, request: ActiveMeetupsRequest) -> Tuple[List[MeetupSummary], Optional[str]]:
+        """
+        Public meetups and meetups the user has joined that are running at
+        any point between request.at and request.until
+        Returns: (meetups soonest start first, cursor for the next page)
+        """
+        at = request.at or datetime.now(timezone.utc)
+        until = request.until or at
+        if until < at:
+            raise ValueError('End of the time window must be after its start')
+        after = None
+        if request.cursor:
+            after_start, after_id = decode_cursor(request.cursor)
+            if not isinstance(after_id, str):
+                raise ValueError("Invalid cursor")
+            after = (after_start, after_id)
+        
+        if self.mock_mode:
+            meetups = await self._mock_active_meetups(request.user_id, at, until, request.limit + 1, after)
+        else:
+            async with self._client() as client:
+                response = await client.post(
+                    f"{self.supabase_url}/rest/v1/rpc/active_meetups",
+                    headers=self._get_headers(use_service_key=True),
+                    json={
+                        'p_user_id': request.user_id,
+                        'p_at': at.isoformat(),
+                        'p_until': until.isoformat(),
+                        'p_limit': request.limit + 1,
+                        'p_after_start': datetime.fromtimestamp(after[0], timezone.utc).isoformat() if after else None,
+                        'p_after_id': after[1] if after else None
+                    }
+                )
+                
+                if response.status_code != 200:
+                    raise Exception(f"Database error: {response.text}")
+                
+                meetups = [MeetupSummary(**row) for row in response.json()]
+        
+        if len(meetups) <= request.limit:
+            return meetups, None
+        last = meetups[request.limit - 1]
+        return meetups[:request.limit], encode_cursor(last.start_ts.timestamp(), last.id)
+    
+    async def _mock_active_meetups(
+        self,
+        user_id: str,
+        at: datetime,
+        until: datetime,
+        limit: int,
+        after: Optional[Tuple[float, str]]
+    ) -> List[MeetupSummary]:
+        """Mock implementation for active meetups, served from the index's interval tree"""
+        def visible(meetup: Dict[str, Any]) -> bool:
+            return meetup['visibility'] == 'public' or user_id in self.mock_memberships.get(meetup['id'], ())
+        
+        return [
+            MeetupSummary(
+                id=meetup['id'],
+                title=meetup['title'],
+                description=meetup.get('description'),
+                start_ts=meetup['start_ts'],
+                end_ts=meetup['end_ts'],
+                lat=lat,
+                lng=lng,
+                visibility=meetup['visibility'],
+                attendee_count=len(self.mock_memberships.get(meetup['id'], ())),
+                is_member=user_id in self.mock_memberships.get(meetup['id'], ())
+            )
+            for meetup in self.meetup_index.overlapping(at, until, visible, limit, after)
+            for lat, lng in [self._mock_location(meetup, user_id)]
+        ]
+    
+    def _mock_location(self, meetup: Dict[str, Any], user_id: str) -> Tuple[float, float]:
+        """Where user_id may see meetup: exactly if a member, else its fuzzed public location"""
+        if user_id in self.mock_memberships.get(meetup['id'], ()):
+            return meetup['lat'], meetup['lng']
+        return meetup['public_lat'], meetup['public_lng']
+    
+    async def home(self, request: HomeRequest) -> HomeResponse:
+        """
+        Everything the app's home screen shows, fetched concurrently
+        Each section has its own time budget in HOME_SECTION_TIMEOUTS; one
+        that fails or runs out of time is left null and named in missing,
+        so the rest still render.
+        """
+        now = datetime.now(timezone.utc)
+        sections = {
+            'joined': self.joined_meetups(request.user_id, now, request.limit),
+            'recent_messages': self.recent_messages(request.user_id, request.message_limit)
+        }
+        if request.lat is not None:
+            sections['nearby'] = self.nearby_meetups(
+                request.user_id, request.lat, request.lng, request.radius_m,
+                now, now + HOME_NEARBY_WINDOW, request.limit
+            )
+        
+        results = await asyncio.gather(
+            *(asyncio.wait_for(section, HOME_SECTION_TIMEOUTS[name]) for name, section in sections.items()),
+            return_exceptions=True
+        )
+        
+        fields: Dict[str, Any] = {'nearby': [], 'missing': []}
+        for name, result in zip(sections, results):
+            if isinstance(result, BaseException):
+                if not isinstance(result, asyncio.TimeoutError):
+                    print(f"Error in home section {name}: {result}")
+                fields[name] = None
+                fields['missing'].append(name)
+            else:
+                fields[name] = result
+        return HomeResponse(**fields)
+    
+    async def joined_meetups(self, user_id: str, at: datetime, limit: int) -> List[MeetupSummary]:
+        """
+        Unarchived meetups the user has joined that haven't ended by at
+        Returns: meetups, soonest start first
+        """
+        if self.mock_mode:
+            return await self._mock_joined_meetups(user_id, at, limit)
+        
+        async with self._client() as client:
+            response = await client.post(
+                f"{self.supabase_url}/rest/v1/rpc/joined_meetups",
+                headers=self._get_headers(use_service_key=True),
+                json={
+                    'p_user_id': user_id,
+                    'p_at': at.isoformat(),
+                    'p_limit': limit
+                }
+            )
+            
+            if response.status_code != 200:
+                raise Exception(f"Database error: {response.text}")
+            
+            return [MeetupSummary(**row) for row in response.json()]
+    
+    async def _mock_joined_meetups(self, user_id: str, at: datetime, limit: int) -> List[MeetupSummary]:
+        """Mock implementation for joined meetups: everything still running or upcoming, from the interval tree"""
+        def visible(meetup: Dict[str, Any]) -> bool:
+            return user_id in self.mock_memberships.get(meetup['id'], ())
+        
+        return [
+            MeetupSummary(
+                id=meetup['id'],
+                title=meetup['title'],
+                description=meetup.get('description'),
+                start_ts=meetup['start_ts'],
+                end_ts=meetup['end_ts'],
+                lat=meetup['lat'],
+                lng=meetup['lng'],
+                visibility=meetup['visibility'],
+                attendee_count=len(self.mock_memberships.get(meetup['id'], ())),
+                is_member=True
+            )
+            for meetup in self.meetup_index.overlapping(at, datetime.max.replace(tzinfo=timezone.utc), visible, limit)
+        ]
+    
+    async def nearby_meetups(
+        self,
+        user_id: str,
+        lat: float,
+        lng: float,
+        radius_m: float,
+        at: datetime,
+        until: datetime,
+        limit: int
+    ) -> List[MeetupSummary]:
+        """
+        Public meetups the user hasn't joined within radius_m of (lat, lng)
+        that are running at any point between at and until
+        Returns: meetups (with fuzzed coordinates), soonest start first
+        """
+        if self.mock_mode:
+            return await self._mock_nearby_meetups(user_id, lat, lng, radius_m, at, until, limit)
+        
+        async with self._client() as client:
+            response = await client.post(
+                f"{self.supabase_url}/rest/v1/rpc/nearby_meetups",
+                headers=self._get_headers(use_service_key=True),
+                json={
+                    'p_user_id': user_id,
+                    'p_lat': lat,
+                    'p_lng': lng,
+                    'p_radius_m': radius_m,
+                    'p_at': at.isoformat(),
+                    'p_until': until.isoformat(),
+                    'p_limit': limit
+                }
+            )
+            
+            if response.status_code != 200:
+                raise Exception(f"Database error: {response.text}")
+            
+            return [MeetupSummary(**row) for row in response.json()]
+    
+    async def _mock_nearby_meetups(
+        self,
+        user_id: str,
+        lat: float,
+        lng: float,
+        radius_m: float,
+        at: datetime,
+        until: datetime,
+        limit: int
+    ) -> List[MeetupSummary]:
+        """Mock implementation for nearby meetups, served from the index's interval tree"""
+        # Only public meetups the user has not joined, so distance and result
+        # use the fuzzed location, as nearby_meetups() does
+        def visible(meetup: Dict[str, Any]) -> bool:
+            return (
+                meetup['visibility'] == 'public'
+                and user_id not in self.mock_memberships.get(meetup['id'], ())
+                and haversine_m(lat, lng, meetup['public_lat'], meetup['public_lng']) <= radius_m
+            )
+        
+        return [
+            MeetupSummary(
+                id=meetup['id'],
+                title=meetup['title'],
+                description=meetup.get('description'),
+                start_ts=meetup['start_ts'],
+                end_ts=meetup['end_ts'],
+                lat=meetup['public_lat'],
+                lng=meetup['public_lng'],
+                visibility=meetup['visibility'],
+                attendee_count=len(self.mock_memberships.get(meetup['id'], ()))
+            )
+            for meetup in self.meetup_index.overlapping(at, until, visible, limit)
+        ]
+    
+    async def recent_messages(self, user_id: str, limit: int) -> List[MessageResponse]:
+        """
+        The latest chat across all of the user's unarchived meetups
+        Returns: messages, newest first
+        """
+        if self.mock_mode:
+            return await self._mock_recent_messages(user_id, limit)
+        
+        async with self._client() as client:
+            response = await client.post(
+                f"{self.supabase_url}/rest/v1/rpc/recent_messages",
+                headers=self._get_headers(use_service_key=True),
+                json={
+                    'p_user_id': user_id,
+                    'p_limit': limit
+                }
+            )
+            
+            if response.status_code != 200:
+                raise Exception(f"Database error: {response.text}")
+            
+            return [
+                MessageResponse(
+                    id=row['id'],
+                    meetup_id=row['meetup_id'],
+                    user_id=row['user_id'],
+                    user_name=row.get('user_name') or 'Unknown User',
+                    message=row['text'],
+                    message_type=row['type'],
+                    timestamp=datetime.fromisoformat(row['created_at'].replace('Z', '+00:00')),
+                    is_own_message=row['user_id'] == user_id
+                )
+                for row in response.json()
+            ]
+    
+    async def _mock_recent_messages(self, user_id: str, limit: int) -> List[MessageResponse]:
+        """Mock implementation for recent messages, merged from each meetup's indexed chat"""
+        candidates = []
+        for meetup_id, members in self.mock_memberships.items():
+            if user_id in members and self.meetup_index.get(meetup_id) is not None:
+                # Messages are indexed in the order they were sent, so each meetup's newest are at the end
+                candidates.extend(self.message_index.messages(meetup_id)[-limit:])
+        
+        newest = heapq.nlargest(limit, candidates, key=lambda msg: msg['timestamp'].timestamp())
+        return [
+            MessageResponse(
+                id=msg['id'],
+                meetup_id=msg['meetup_id'],
+                user_id=msg['user_id'],
+                user_name="You" if msg['user_id'] == user_id else msg['user_id'],
+                message=msg['message'],
+                message_type=msg['message_type'],
+                timestamp=msg['timestamp'],
+                is_own_message=msg['user_id'] == user_id
+            )
+            for msg in newest
+        ]
+
+    async def get_meetup(self, meetup_id: str, user_id: str) -> Tuple[bool, str, Optional[MeetupSummary]]:
+        """
+        Get a meetup the user can see (public, or one they are a member of)
+        Returns: (success, message, meetup)
+        """
+        if self.mock_mode:
+            return await self._mock_get_meetup(meetup_id, user_id)
+        
+        async with self._client() as client:
+            meetup_response = await client.get(
+                f"{self.supabase_url}/rest/v1/meetups",
+                headers=self._get_headers(use_service_key=True),
+                params={'id': f'eq.{meetup_id}'}
+            )
+            
+            if meetup_response.status_code != 200:
+                raise Exception(f"Database error: {meetup_response.text}")
+            
+            meetups = meetup_response.json()
+            if not meetups:
+                return False, "Meetup not found", None
+            meetup = meetups[0]
+            
+            membership_response = await client.get(
+                f"{self.supabase_url}/rest/v1/memberships",
+                headers=self._get_headers(use_service_key=True),
+                params={
+                    'meetup_id': f'eq.{meetup_id}',
+                    'user_id': f'eq.{user_id}'
+                }
+            )
+            
+            if membership_response.status_code != 200:
+                raise Exception(f"Database error: {membership_response.text}")
+            
+            is_member = bool(membership_response.json())
+            if not is_member and meetup['visibility'] != 'public':
+                return False, "Meetup not found", None
+            
+            # Non-members of public meetups only ever see the fuzzed location
+            return True, "Meetup retrieved successfully", MeetupSummary(
+                id=meetup['id'],
+                title=meetup['title'],
+                description=meetup.get('description'),
+                start_ts=meetup['start_ts'],
+                end_ts=meetup['end_ts'],
+                lat=meetup['lat'] if is_member else meetup['public_lat'],
+                lng=meetup['lng'] if is_member else meetup['public_lng'],
+                visibility=meetup['visibility'],
+                attendee_count=meetup.get('attendee_count') or 0,
+                is_member=is_member
+            )
+    
+    async def _mock_get_meetup(self, meetup_id: str, user_id: str) -> Tuple[bool, str, Optional[MeetupSummary]]:
+        """Mock implementation for getting a meetup"""
+        meetup = self.meetup_index.get(meetup_id) or self.mock_archived_meetups.get(meetup_id)
+        members = self.mock_memberships.get(meetup_id, set())
+        if meetup is None or (meetup['visibility'] != 'public' and user_id not in members):
+            return False, "Meetup not found", None
+        
+        lat, lng = self._mock_location(meetup, user_id)
+        return True, "Meetup retrieved successfully", MeetupSummary(
+            id=meetup['id'],
+            title=meetup['title'],
+            description=meetup.get('description'),
+            start_ts=meetup['start_ts'],
+            end_ts=meetup['end_ts'],
+            lat=lat,
+            lng=lng,
+            visibility=meetup['visibility'],
+            attendee_count=len(members),
+            is_member=user_id in members
+        )
+    
+    async def read_stamp(self, meetup_id: str, user_id: str, public_ok: bool) -> Optional[str]:
+        """
+        The meetup's version stamp for conditional GETs, if user_id may read it:
+        members always, anyone for public meetups when public_ok
+        Returns: the stamp, or None (also if the meetup does not exist)
+        Once access is cached this does not touch the database.
+        """
+        # Taken before the access check, so a write in between only makes it older
+        stamp = self.versions.stamp(meetup_id)
+        if self.mock_mode:
+            meetup = self.meetup_index.get(meetup_id) or self.mock_archived_meetups.get(meetup_id)
+            if meetup is None:
+                return None
+            is_member = user_id in self.mock_memberships.get(meetup_id, set())
+            return stamp if is_member or (public_ok and meetup['visibility'] == 'public') else None
+        
+        # Either cache answers without a query; each check below caches what it confirms
+        if (meetup_id, user_id) in self.members or (public_ok and meetup_id in self.public_meetups):
+            return stamp
+        if await self._is_member(meetup_id, user_id):
+            return stamp
+        if public_ok and await self._is_public(meetup_id):
+            return stamp
+        return None
+    
+    async def _is_public(self, meetup_id: str) -> bool:
+        """Whether the meetup exists and is public; only public meetups are cached"""
+        if meetup_id in self.public_meetups:
+            return True
+        
+        async with self._client() as client:
+            response = await client.get(
+                f"{self.supabase_url}/rest/v1/meetups",
+                headers=self._get_headers(use_service_key=True),
+                params={'id': f'eq.{meetup_id}', 'select': 'visibility'}
+            )
+            
+            if response.status_code != 200:
+                raise Exception(f"Database error: {response.text}")
+            
+            meetups = response.json()
+            if not meetups or meetups[0]['visibility'] != 'public':
+                return False
+            self.public_meetups.add(meetup_id)
+            return True
+    
+    async def create_upload(self, meetup_id: str, request: CreateUploadRequest) -> Tuple[bool, str, Optional[UploadStatusResponse]]:
+        """
+        Start a resumable upload, reserving its length against the meetup's quota
+        Returns: (success, message, upload)
+        Raises UploadTooLarge if the file does not fit
+        """
+        if request.length > MAX_FILE_BYTES:
+            raise UploadTooLarge(f"File size exceeds {MAX_FILE_BYTES // (1024 * 1024)}MB limit")
+        
+        storage_path = f"meetups/{meetup_id}/{uuid.uuid4().hex}-{request.filename}"
+        if self.mock_mode:
+            return await self._mock_create_upload(meetup_id, request, storage_path)
+        
+        async with self._client() as client:
+            response = await client.post(
+                f"{self.supabase_url}/rest/v1/rpc/reserve_file_upload",
+                headers=self._get_headers(use_service_key=True),
+                json={
+                    'p_meetup_id': meetup_id,
+                    'p_user_id': request.user_id,
+                    'p_type': request.file_type,
+                    'p_filename': request.filename,
+                    'p_storage_path': storage_path,
+                    'p_upload_length': request.length,
+                    'p_max_meetup_bytes': MAX_MEETUP_BYTES,
+                    'p_max_files': MAX_FILES_PER_MEETUP
+                }
+            )
+            
+            if response.status_code != 200:
+                raise Exception(f"Database error: {response.text}")
+            
+            result = response.json()[0]
+            if result['status'] == 'not_member':
+                return False, "You are not a member of this meetup", None
+            if result['status'] == 'too_many_files':
+                raise UploadTooLarge(f"Meetup has reached the maximum of {MAX_FILES_PER_MEETUP} files")
+            if result['status'] == 'quota_exceeded':
+                raise UploadTooLarge(f"Upload would exceed the {MAX_MEETUP_BYTES // (1024 * 1024)}MB storage limit")
+            
+            upload_ref = await self.storage.create_upload(storage_path, request.length)
+            update_response = await client.patch(
+                f"{self.supabase_url}/rest/v1/file_uploads",
+                headers=self._get_headers(use_service_key=True),
+                params={'id': f'eq.{result["upload_id"]}'},
+                json={'upload_ref': upload_ref}
+            )
+            
+            if update_response.status_code not in [200, 204]:
+                raise Exception(f"Database error: {update_response.text}")
+            
+            return True, "Upload created successfully", UploadStatusResponse(
+                upload_id=result['upload_id'],
+                offset=0,
+                length=request.length,
+                expires_at=datetime.fromisoformat(result['expires_at'].replace('Z', '+00:00'))
+            )
+    
+    async def _mock_create_upload(self, meetup_id: str, request: CreateUploadRequest, storage_path: str) -> Tuple[bool, str, Optional[UploadStatusResponse]]:
+        """Mock implementation for starting an upload"""
+        pending = [
+            u for u in self.mock_uploads.values()
+            if u['meetup_id'] == meetup_id and u['completed_at'] is None and u['expires_at'] > datetime.now(timezone.utc)
+        ]
+        files = [f for f in self.mock_files.values() if f['meetup_id'] == meetup_id]
+        if len(pending) + len(files) + 1 > MAX_FILES_PER_MEETUP:
+            raise UploadTooLarge(f"Meetup has reached the maximum of {MAX_FILES_PER_MEETUP} files")
+        used = sum(u['upload_length'] for u in pending) + sum(f['size_bytes'] for f in files)
+        if used + request.length > MAX_MEETUP_BYTES:
+            raise UploadTooLarge(f"Upload would exceed the {MAX_MEETUP_BYTES // (1024 * 1024)}MB storage limit")
+        
+        upload_id = str(uuid.uuid4())
+        upload = {
+            'id': upload_id,
+            'meetup_id': meetup_id,
+            'user_id': request.user_id,
+            'type': request.file_type,
+            'filename': request.filename,
+            'storage_path': storage_path,
+            'upload_length': request.length,
+            'upload_ref': await self.storage.create_upload(storage_path, request.length),
+            'file_id': None,
+            'expires_at': datetime.now(timezone.utc) + UPLOAD_TTL,
+            'completed_at': None
+        }
+        self.mock_uploads[upload_id] = upload
+        print(f"Mock: User {request.user_id} started a {request.length} byte upload to meetup {meetup_id}")
+        return True, "Upload created successfully", UploadStatusResponse(
+            upload_id=upload_id, offset=0, length=request.length, expires_at=upload['expires_at']
+        )
+    
+    async def _get_upload(self, upload_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+        """An upload session owned by user_id, with datetime fields parsed"""
+        uuid.UUID(upload_id)  # ValueError for malformed IDs
+        if self.mock_mode:
+            upload = self.mock_uploads.get(upload_id)
+            return upload if upload and upload['user_id'] == user_id else None
+        
+        async with self._client() as client:
+            response = await client.get(
+                f"{self.supabase_url}/rest/v1/file_uploads",
+                headers=self._get_headers(use_service_key=True),
+                params={'id': f'eq.{upload_id}', 'user_id': f'eq.{user_id}'}
+            )
+            
+            if response.status_code != 200:
+                raise Exception(f"Database error: {response.text}")
+            
+            uploads = response.json()
+            if not uploads:
+                return None
+            upload = uploads[0]
+            for field in ('expires_at', 'completed_at'):
+                if upload[field]:
+                    upload[field] = datetime.fromisoformat(upload[field].replace('Z', '+00:00'))
+            return upload
+    
+    async def upload_status(self, upload_id: str, user_id: str) -> Tuple[bool, str, Optional[UploadStatusResponse]]:
+        """
+        Where to resume an upload
+        Returns: (success, message, upload)
+        """
+        upload = await self._get_upload(upload_id, user_id)
+        if upload is None:
+            return False, "Upload not found", None
+        
+        offset = upload['upload_length']
+        if upload['completed_at'] is None:
+            offset = await self.storage.upload_offset(upload['upload_ref'])
+        return True, "Upload retrieved successfully", UploadStatusResponse(
+            upload_id=upload_id,
+            offset=offset,
+            length=upload['upload_length'],
+            expires_at=upload['expires_at'],
+            file_id=upload['file_id']
+        )
+    
+    async def append_upload(self, upload_id: str, user_id: str, offset: int, chunks: AsyncIterator[bytes]) -> Tuple[bool, str, Optional[UploadStatusResponse]]:
+        """
+        Stream a request body into an upload at offset; the file is recorded once the last byte arrives
+        Returns: (success, message, upload)
+        Raises UploadOffsetMismatch for a stale offset, UploadTooLarge once more than the declared length arrives
+        """
+        upload = await self._get_upload(upload_id, user_id)
+        if upload is None:
+            return False, "Upload not found", None
+        if upload['completed_at'] is not None:
+            raise UploadOffsetMismatch("Upload is already complete")
+        if upload['expires_at'] <= datetime.now(timezone.utc):
+            return False, "Upload has expired", None
+        
+        current = await self.storage.upload_offset(upload['upload_ref'])
+        if offset != current:
+            raise UploadOffsetMismatch(f"Upload is at offset {current}")
+        
+        length = upload['upload_length']
+        new_offset = await self.storage.append(upload['upload_ref'], offset, limit_stream(chunks, length - offset))
+        
+        file_id = None
+        if new_offset == length:
+            await self.storage.complete(upload['upload_ref'])
+            file_id = await self._complete_upload(upload)
+            if upload['type'] == 'image':
+                self.derivatives.submit(file_id, upload['storage_path'], length)
+        
+        return True, "Upload received successfully", UploadStatusResponse(
+            upload_id=upload_id,
+            offset=new_offset,
+            length=length,
+            expires_at=upload['expires_at'],
+            file_id=file_id
+        )
+    
+    async def _complete_upload(self, upload: Dict[str, Any]) -> str:
+        """Record a fully received upload in the files table; returns the file ID"""
+        if self.mock_mode:
+            file_id = str(uuid.uuid4())
+            self.mock_files[file_id] = {
+                'id': file_id,
+                'meetup_id': upload['meetup_id'],
+                'user_id': upload['user_id'],
+                'type': upload['type'],
+                'storage_path': upload['storage_path'],
+                'filename': upload['filename'],
+                'size_bytes': upload['upload_length'],
+                'created_at': datetime.now(timezone.utc)
+            }
+            upload.update(file_id=file_id, completed_at=datetime.now(timezone.utc))
+            print(f"Mock: Stored file {file_id} ({upload['upload_length']} bytes) in meetup {upload['meetup_id']}")
+            return file_id
+        
+        async with self._client() as client:
+            response = await client.post(
+                f"{self.supabase_url}/rest/v1/rpc/complete_file_upload",
+                headers=self._get_headers(use_service_key=True),
+                json={'p_upload_id': upload['id']}
+            )
+            
+            if response.status_code != 200:
+                raise Exception(f"Database error: {response.text}")
+            
+            return response.json()
+    
+    async def find_derivatives(self, content_hash: str) -> List[Derivative]:
+        """Derivatives already rendered from an identical original, one per variant"""
+        if self.mock_mode:
+            rows = [d for derivatives in self.mock_derivatives.values() for d in derivatives if d.content_hash == content_hash]
+        else:
+            async with self._client() as client:
+                response = await client.get(
+                    f"{self.supabase_url}/rest/v1/file_derivatives",
+                    headers=self._get_headers(use_service_key=True),
+                    params={
+                        'select': 'variant,content_hash,storage_path,width,height,size_bytes',
+                        'content_hash': f'eq.{content_hash}',
+                        'limit': 2 * len(VARIANTS)
+                    }
+                )
+                
+                if response.status_code != 200:
+                    raise Exception(f"Database error: {response.text}")
+                
+                rows = [Derivative(**row) for row in response.json()]
+        return list({d.variant: d for d in rows}.values())
+    
+    async def record_derivatives(self, file_id: str, derivatives: List[Derivative]) -> None:
+        if self.mock_mode:
+            self.mock_derivatives[file_id] = derivatives
+            print(f"Mock: Recorded {len(derivatives)} derivatives for file {file_id}")
+            return
+        
+        async with self._client() as client:
+            response = await client.post(
+                f"{self.supabase_url}/rest/v1/file_derivatives",
+                headers=dict(self._get_headers(use_service_key=True), Prefer='resolution=merge-duplicates,return=minimal'),
+                json=[dict(d._asdict(), file_id=file_id) for d in derivatives]
+            )
+            
+            if response.status_code not in [200, 201]:
+                raise Exception(f"Database error: {response.text}")
+    
+    async def _get_derivative(self, file_id: str, variant: str) -> Optional[Derivative]:
+        if self.mock_mode:
+            return next((d for d in self.mock_derivatives.get(file_id, []) if d.variant == variant), None)
+        
+        async with self._client() as client:
+            response = await client.get(
+                f"{self.supabase_url}/rest/v1/file_derivatives",
+                headers=self._get_headers(use_service_key=True),
+                params={
+                    'select': 'variant,content_hash,storage_path,width,height,size_bytes',
+                    'file_id': f'eq.{file_id}',
+                    'variant': f'eq.{variant}'
+                }
+            )
+            
+            if response.status_code != 200:
+                raise Exception(f"Database error: {response.text}")
+            
+            rows = response.json()
+            return Derivative(**rows[0]) if rows else None
+    
+    async def get_file(self, meetup_id: str, file_id: str, user_id: str, variant: Optional[str] = None) -> Tuple[bool, str, Optional[Dict[str, Any]]]:
+        """
+        Look up a file, or one of its derivatives, for download
+        Returns: (success, message, file)
+        """
+        success, message, file = await self._get_original(meetup_id, file_id, user_id)
+        if not success or variant is None:
+            return success, message, file
+        
+        if variant not in VARIANTS:
+            raise ValueError(f"Unknown variant: {variant}")
+        derivative = await self._get_derivative(file_id, variant)
+        if derivative is None:
+            return False, "Preview not available", None
+        stem = os.path.splitext(file['filename'] or file_id)[0]
+        return True, "File retrieved successfully", dict(
+            file,
+            storage_path=derivative.storage_path,
+            size_bytes=derivative.size_bytes,
+            filename=f"{stem}-{variant}.jpg"
+        )
+    
+    async def _get_original(self, meetup_id: str, file_id: str, user_id: str) -> Tuple[bool, str, Optional[Dict[str, Any]]]:
+        uuid.UUID(file_id)  # ValueError for malformed IDs
+        if self.mock_mode:
+            file = self.mock_files.get(file_id)
+            if file is None or file['meetup_id'] != meetup_id:
+                return False, "File not found", None
+            return True, "File retrieved successfully", file
+        
+        async with self._client() as client:
+            membership_response = await client.get(
+                f"{self.supabase_url}/rest/v1/memberships",
+                headers=self._get_headers(),
+                params={
+                    'meetup_id': f'eq.{meetup_id}',
+                    'user_id': f'eq.{user_id}'
+                }
+            )
+            
+            if membership_response.status_code != 200:
+                raise Exception(f"Database error: {membership_response.text}")
+            
+            if not membership_response.json():
+                return False, "You are not a member of this meetup", None
+            
+            file_response = await client.get(
+                f"{self.supabase_url}/rest/v1/files",
+                headers=self._get_headers(use_service_key=True),
+                params={
+                    'id': f'eq.{file_id}',
+                    'meetup_id': f'eq.{meetup_id}',
+                    'deleted_at': 'is.null'
+                }
+            )
+            
+            if file_response.status_code != 200:
+                raise Exception(f"Database error: {file_response.text}")
+            
+            files = file_response.json()
+            if not files:
+                return False, "File not found", None
+            return True, "File retrieved successfully", files[0]
+    
+    async def submit_report(self, request: SubmitReportRequest) -> Tuple[bool, str, bool]:
+        """
+        Report a user, message or file; soft-bans the offender once enough
+        different members have reported it within the window
+        Returns: (success, message, auto_soft_banned)
+        """
+        if not await self._is_member(request.meetup_id, request.reporter_id, allow_banned=False):
+            return False, "You must be a member in good standing to report content", False
+        
+        crossed = await self.reports.submit({
+            'meetup_id': request.meetup_id,
+            'target_type': request.target_type,
+            'target_id': request.target_id,
+            'reporter_id': request.reporter_id,
+            'reason': request.reason,
+            'created_at': datetime.now(timezone.utc).isoformat()
+        })
+        if not crossed:
+            return True, "Report submitted successfully", False
+        
+        offender = await self._report_target_owner(request)
+        if offender is None or offender == request.reporter_id:
+            return True, "Report submitted successfully", False
+        
+        # Enacted in the host's name, so the audit trail does not blame whichever
+        # member happened to file the report that crossed the threshold
+        host_id = await self._meetup_host(request.meetup_id)
+        if host_id is None or offender == host_id:
+            return True, "Report submitted successfully", False
+        
+        minutes = round(self.reports.window_seconds / 60)
+        success, _ = await self.soft_ban_user(SoftBanRequest(
+            meetup_id=request.meetup_id,
+            target_user_id=offender,
+            enacted_by=host_id,
+            reason=f"Automatic soft-ban: {self.reports.threshold} members reported {request.target_type} {request.target_id} within {minutes} minutes"
+        ))
+        return True, "Report submitted successfully", success
+    
+    async def _meetup_host(self, meetup_id: str) -> Optional[str]:
+        """The meetup's host, or None if it does not exist"""
+        if self.mock_mode:
+            meetup = self.meetup_index.get(meetup_id) or self.mock_archived_meetups.get(meetup_id)
+            return meetup.get('host_id') if meetup else None
+        
+        async with self._client() as client:
+            response = await client.get(
+                f"{self.supabase_url}/rest/v1/meetups",
+                headers=self._get_headers(use_service_key=True),
+                params={'id': f'eq.{meetup_id}', 'select': 'host_id'}
+            )
+            
+            if response.status_code != 200:
+                raise Exception(f"Database error: {response.text}")
+            
+            meetups = response.json()
+            return meetups[0]['host_id'] if meetups else None
+    
+    async def _is_member(self, meetup_id: str, user_id: str, allow_banned: bool = True) -> bool:
+        """
+        Whether user_id belongs to the meetup (and, with allow_banned=False,
+        is not soft-banned there); only members in good standing are cached
+        """
+        if self.mock_mode or (meetup_id, user_id) in self.members:
+            return True
+        
+        async with self._client() as client:
+            response = await client.get(
+                f"{self.supabase_url}/rest/v1/memberships",
+                headers=self._get_headers(),
+                params={
+                    'select': 'soft_banned',
+                    'meetup_id': f'eq.{meetup_id}',
+                    'user_id': f'eq.{user_id}'
+                }
+            )
+            
+            if response.status_code != 200:
+                raise Exception(f"Database error: {response.text}")
+            
+            rows = response.json()
+            if not rows:
+                return False
+            if rows[0]['soft_banned']:
+                return allow_banned
+            self.members.add((meetup_id, user_id))
+            return True
+    
+    async def _report_target_owner(self, request: SubmitReportRequest) -> Optional[str]:
+        """The user to soft-ban for a report: the user, or the author of the message or file"""
+        if request.target_type == 'user':
+            return request.target_id
+        
+        if self.mock_mode:
+            if request.target_type == 'message':
+                messages = self.message_index.messages(request.meetup_id)
+                return next((m['user_id'] for m in messages if m['id'] == request.target_id), None)
+            file = self.mock_files.get(request.target_id)
+            return file['user_id'] if file else None
+        
+        table = 'messages' if request.target_type == 'message' else 'files'
+        async with self._client() as client:
+            response = await client.get(
+                f"{self.supabase_url}/rest/v1/{table}",
+                headers=self._get_headers(use_service_key=True),
+                params={
+                    'select': 'user_id',
+                    'id': f'eq.{request.target_id}',
+                    'meetup_id': f'eq.{request.meetup_id}'
+                }
+            )
+            
+            if response.status_code != 200:
+                raise Exception(f"Database error: {response.text}")
+            
+            rows = response.json()
+            return rows[0]['user_id'] if rows else None
+    
+    async def _insert_reports(self, rows: List[Dict[str, Any]]) -> None:
+        """Write one batch of buffered reports"""
+        if self.mock_mode:
+            self.mock_reports.extend(rows)
+            print(f"Mock: Inserted {len(rows)} reports")
+            return
+        
+        async with self._client() as client:
+            response = await client.post(
+                f"{self.supabase_url}/rest/v1/reports",
+                headers=dict(self._get_headers(use_service_key=True), Prefer='return=minimal'),
+                json=rows
+            )
+            
+            # Malformed values and missing foreign keys; auth and rate limit errors are retried
+            if response.status_code in [400, 409, 422]:
+                raise RowsRejected(response.text)
+            if response.status_code not in [200, 201]:
+                raise Exception(f"Database error: {response.text}")
+    
+    async def heartbeat(self, meetup_id: str, user_id: str) -> Tuple[bool, str, Optional[PresenceResponse]]:
+        """
+        Mark a member online in a meetup until the next heartbeat is due
+        Returns: (success, message, presence)
+        """
+        if not await self._is_member(meetup_id, user_id):
+            return False, "You must be a member to join this meetup's presence", None
+    
+        online_count = self.presence.heartbeat(meetup_id, user_id)
+        return True, "OK", PresenceResponse(online_count=online_count, heartbeat_seconds=PRESENCE_HEARTBEAT_SECONDS)
+    
+    async def leave(self, meetup_id: str, user_id: str) -> Tuple[bool, str, Optional[PresenceResponse]]:
+        """
+        Mark a member offline without waiting for their heartbeats to lapse
+        Returns: (success, message, presence)
+        """
+        if not await self._is_member(meetup_id, user_id):
+            return False, "You must be a member to leave this meetup's presence", None
+    
+        online_count = self.presence.leave(meetup_id, user_id)
+        return True, "OK", PresenceResponse(online_count=online_count, heartbeat_seconds=PRESENCE_HEARTBEAT_SECONDS)
+    
+    async def get_online_members(self, request: OnlineMembersRequest) -> Tuple[bool, str, Optional[OnlineMembersResponse]]:
+        """
+        List who is online in a meetup, in the order they came online
+        Returns: (success, message, page)
+        """
+        if not await self._is_member(request.meetup_id, request.user_id):
+            return False, "You must be a member to see who is online", None
+    
+        after = None
+        if request.cursor:
+            after, cursor_meetup_id = decode_cursor(request.cursor)
+            # A cursor is a position in one meetup's roster; refuse one issued for another meetup
+            if cursor_meetup_id != request.meetup_id:
+                raise ValueError("Invalid cursor")
+    
+        page, last_arrival = self.presence.online(request.meetup_id, request.limit, int(after) if after is not None else None)
+        return True, "OK", OnlineMembersResponse(
+            online_count=self.presence.count(request.meetup_id),
+            members=[
+                OnlineMember(user_id=user_id, last_seen=datetime.fromtimestamp(seen, timezone.utc))
+                for user_id, seen in page
+            ],
+            next_cursor=encode_cursor(last_arrival, request.meetup_id) if last_arrival is not None else None
+        )
+    
+    async def can_export(self, request: ExportRequest) -> Tuple[bool, str]:
+        """
+        Whether the user may export the meetup: only its host can, archived or not
+        Checked before streaming starts, so failures still get a proper status
+        Returns: (success, message)
+        """
+        # Non-hosts are told the same as for a missing meetup
+        if await self._meetup_host(request.meetup_id) != request.user_id:
+            return False, "Meetup not found"
+        return True, "Export allowed"
+    
+    async def export_rows(self, request: ExportRequest) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """
+        (section, row) for every row of the requested sections, in section order
+        Rows are read EXPORT_PAGE_SIZE at a time; call can_export() first.
+        """
+        for section in request.sections:
+            if section == 'messages':
+                rows = self._export_messages(request.meetup_id)
+            elif section == 'memberships':
+                rows = self._export_memberships(request.meetup_id)
+            else:
+                rows = self._export_soft_ban_events(request.meetup_id)
+            async for row in rows:
+                yield section, row
+    
+    async def _keyset_rows(self, table: str, params: Dict[str, Any], keys: Sequence[str]) -> AsyncIterator[Dict[str, Any]]:
+        """Every row of table matching params, in ascending keys order, read a page at a time"""
+        order = ','.join(f'{key}.asc' for key in keys)
+        last: Optional[Dict[str, Any]] = None
+        while True:
+            page_params = dict(params, order=order, limit=EXPORT_PAGE_SIZE)
+            if last is not None:
+                # Keyset: everything after the last row seen, so each page is an index range scan
+                if len(keys) == 1:
+                    page_params[keys[0]] = f'gt.{last[keys[0]]}'
+                else:
+                    first, second = keys
+                    page_params['or'] = f'({first}.gt."{last[first]}",and({first}.eq."{last[first]}",{second}.gt.{last[second]}))'
+            
+            async with self._client() as client:
+                response = await client.get(
+                    f"{self.supabase_url}/rest/v1/{table}",
+                    headers=self._get_headers(use_service_key=True),
+                    params=page_params
+                )
+            
+            if response.status_code != 200:
+                raise Exception(f"Database error: {response.text}")
+            
+            rows = response.json()
+            for row in rows:
+                yield row
+            if len(rows) < EXPORT_PAGE_SIZE:
+                return
+            last = rows[-1]
+    
+    async def _export_messages(self, meetup_id: str) -> AsyncIterator[Dict[str, Any]]:
+        """A meetup's chat, oldest first: its cold storage, then any messages not compacted yet"""
+        params = {'meetup_id': f'eq.{meetup_id}', 'select': 'id,created_at,user_id,type,text,parent_id,users(handle)'}
+        blocks, sealed = await self._archive_state(meetup_id) if self.archive is not None else ([], False)
+        if blocks:
+            for ref in blocks:
+                # One block in memory at a time
+                for msg in await self.archive.read_block(ref):
+                    yield {
+                        'id': msg['id'],
+                        'created_at': msg['timestamp'],
+                        'user_id': msg['user_id'],
+                        'user_handle': msg.get('user_name'),
+                        'type': msg['message_type'],
+                        'text': msg['message'],
+                        'parent_id': msg.get('parent_id')
+                    }
+            if sealed:
+                return
+            # Mid-compaction: the hot table still holds the messages after the last block
+            params['and'] = f'(or{self._after_archived(blocks[-1])})'
+        
+        if self.mock_mode:
+            start = 0
+            while True:
+                page = self.message_index.messages_from(meetup_id, start, EXPORT_PAGE_SIZE)
+                for msg in page:
+                    yield {
+                        'id': msg['id'],
+                        'created_at': msg['timestamp'],
+                        'user_id': msg['user_id'],
+                        'user_handle': None,
+                        'type': msg['message_type'],
+                        'text': msg['message'],
+                        'parent_id': msg.get('parent_id')
+                    }
+                if len(page) < EXPORT_PAGE_SIZE:
+                    return
+                start += len(page)
+        
+        rows = self._keyset_rows('messages', params, ('created_at', 'id'))
+        async for row in rows:
+            row['user_handle'] = (row.pop('users', None) or {}).get('handle')
+            yield row
+    
+    async def _export_memberships(self, meetup_id: str) -> AsyncIterator[Dict[str, Any]]:
+        """A meetup's attendee list, by user ID (the primary key order)"""
+        if self.mock_mode:
+            meetup = self.meetup_index.get(meetup_id) or self.mock_archived_meetups.get(meetup_id) or {}
+            for user_id in sorted(self.mock_memberships.get(meetup_id, ())):
+                yield {
+                    'user_id': user_id,
+                    'user_handle': None,
+                    'role': 'host' if user_id == meetup.get('host_id') else 'member',
+                    'soft_banned': False,
+                    'soft_ban_reason': None,
+                    'joined_at': None
+                }
+            return
+        
+        rows = self._keyset_rows(
+            'memberships',
+            {'meetup_id': f'eq.{meetup_id}', 'select': 'user_id,role,soft_banned,soft_ban_reason,joined_at,users(handle)'},
+            ('user_id',)
+        )
+        async for row in rows:
+            row['user_handle'] = (row.pop('users', None) or {}).get('handle')
+            yield row
+    
+    async def _export_soft_ban_events(self, meetup_id: str) -> AsyncIterator[Dict[str, Any]]:
+        """A meetup's soft-ban history, oldest first"""
+        if self.mock_mode:
+            for event in list(self.mock_soft_ban_events.get(meetup_id, ())):
+                yield event
+            return
+        
+        rows = self._keyset_rows(
+            'soft_ban_events',
+            {'meetup_id': f'eq.{meetup_id}', 'select': 'id,created_at,target_user_id,enacted_by,reason'},
+            ('created_at', 'id')
+        )
+        async for row in rows:
+            yield row
+    
+    async def sweep_expired(self, batch_size: int) -> Optional[Dict[str, int]]:
+        """
+        One sweeper batch: archive ended meetups, revoke tokens of archived
+        meetups and purge long-dead tokens, then evict archived meetups from
+        in-process caches
+        Returns: per-operation row counts, or None if another host is sweeping
+        """
+        if self.mock_mode:
+            return await self._mock_sweep_expired(batch_size)
+        
+        async with self._client() as client:
+            response = await client.post(
+                f"{self.supabase_url}/rest/v1/rpc/sweep_expired",
+                headers=self._get_headers(use_service_key=True),
+                json={'p_batch_size': batch_size}
+            )
+            
+            if response.status_code != 200:
+                raise Exception(f"Database error: {response.text}")
+            
+            result = response.json()[0]
+            if not result['locked']:
+                return None
+            
+            archived = result['archived_meetup_ids'] or []
+            self._evict_archived(archived)
+            return {
+                'archived_meetups': len(archived),
+                'revoked_tokens': result['revoked_tokens'],
+                'purged_tokens': result['purged_tokens']
+            }
+    
+    async def _mock_sweep_expired(self, batch_size: int) -> Optional[Dict[str, int]]:
+        """Mock implementation for a sweeper batch (only signed invite tokens are stored)"""
+        now = datetime.now(timezone.utc)
+        archived = self.meetup_index.ended_before(now, batch_size)
+        for meetup_id in archived:
+            meetup = self.meetup_index.get(meetup_id)
+            self.mock_archived_meetups[meetup_id] = dict(meetup, is_archived=True, ended_at=meetup['end_ts'])
+        self._evict_archived(archived)
+        
+        revoked = [
+            token for token in self.mock_invite_tokens.values()
+            if token['meetup_id'] in self.mock_archived_meetups and token['revoked_at'] is None
+        ][:batch_size]
+        for token in revoked:
+            token['revoked_at'] = now
+        
+        # Revoked tokens are kept until they expire, as in sweep_expired()
+        purged = [
+            token_id for token_id, token in self.mock_invite_tokens.items()
+            if token['expires_at'] < now - TOKEN_RETENTION
+            or (token['revoked_at'] is not None and token['revoked_at'] < now - TOKEN_RETENTION and token['expires_at'] < now)
+        ][:batch_size]
+        for token_id in purged:
+            del self.mock_invite_tokens[token_id]
+        return {'archived_meetups': len(archived), 'revoked_tokens': len(revoked), 'purged_tokens': len(purged)}
+    
+    def _evict_archived(self, meetup_ids: List[str]) -> None:
+        """Drop archived meetups from search and invalidate their ETags"""
+        for meetup_id in meetup_ids:
+            self.meetup_index.remove(meetup_id)
+            self.versions.bump(meetup_id)
+    
+    async def compact_archived_messages(self, batch_size: int) -> Dict[str, int]:
+        """
+        One sweeper batch: move up to batch_size messages of archived meetups
+        from the messages table into cold storage
+        A meetup's hot rows are deleted only once storage has confirmed the
+        block holding them, and get_messages and the export read the blocks
+        plus the hot rows after them, so deleting them is invisible to readers.
+        Messages with newer replies are kept until those replies are archived too.
+        Returns: per-operation counts
+        """
+        counts = {'compacted_messages': 0, 'sealed_meetups': 0}
+        if self.archive is None:
+            return counts
+        
+        if self.mock_mode:
+            return await self._mock_compact_archived_messages(batch_size)
+        
+        async with self._client() as client:
+            meetups_response = await client.get(
+                f"{self.supabase_url}/rest/v1/meetups",
+                headers=self._get_headers(use_service_key=True),
+                params={
+                    'select': 'id',
+                    'is_archived': 'eq.true',
+                    'messages_archived_at': 'is.null',
+                    'order': 'ended_at.asc',
+                    'limit': 10
+                }
+            )
+            
+            if meetups_response.status_code != 200:
+                raise Exception(f"Database error: {meetups_response.text}")
+            
+            for meetup in meetups_response.json():
+                if counts['compacted_messages'] >= batch_size:
+                    break
+                await self._compact_meetup(client, meetup['id'], batch_size, counts)
+        
+        return counts
+    
+    async def _compact_meetup(self, client: httpx.AsyncClient, meetup_id: str, batch_size: int, counts: Dict[str, int]) -> None:
+        """Archive one meetup's messages, resuming after the newest archived one"""
+        blocks, _ = await self._archive_state(meetup_id)
+        last = blocks[-1] if blocks else None
+        
+        while True:
+            if counts['compacted_messages'] >= batch_size:
+                return
+            
+            params = {
+                'meetup_id': f'eq.{meetup_id}',
+                'select': 'id,meetup_id,user_id,created_at,text,type,parent_id,users(handle)',
+                'order': 'created_at.asc,id.asc',
+                'limit': BLOCK_MESSAGES
+            }
+            if last:
+                # Keyset: everything after (created_at, id) of the newest archived message
+                params['or'] = self._after_archived(last)
+            messages_response = await client.get(
+                f"{self.supabase_url}/rest/v1/messages",
+                headers=self._get_headers(use_service_key=True),
+                params=params
+            )
+            
+            if messages_response.status_code != 200:
+                raise Exception(f"Database error: {messages_response.text}")
+            
+            rows = messages_response.json()
+            if not rows:
+                break
+            
+            # Blocks keep get_messages' field names so archived pages need no join
+            block = [
+                {
+                    'id': row['id'],
+                    'meetup_id': row['meetup_id'],
+                    'user_id': row['user_id'],
+                    'user_name': (row.get('users') or {}).get('handle') or 'Unknown User',
+                    'message': row['text'],
+                    'message_type': row['type'],
+                    'parent_id': row.get('parent_id'),
+                    'timestamp': row['created_at']
+                }
+                for row in rows
+            ]
+            # Raises unless storage confirms the upload, so no row is deleted for a lost block
+            ref = await self.archive.write_block(meetup_id, block)
+            
+            # Records the block and deletes its rows in one transaction; readers take
+            # them from the block from then on. The function keeps the parents of
+            # newer messages, which the parent_id cascade would take with them. A
+            # concurrent compaction of the same meetup fails here on (meetup_id, seq).
+            record_response = await client.post(
+                f"{self.supabase_url}/rest/v1/rpc/archive_message_block",
+                headers=self._get_headers(use_service_key=True),
+                json={
+                    'p_meetup_id': meetup_id,
+                    'p_seq': len(blocks),
+                    'p_storage_path': ref.storage_path,
+                    'p_byte_length': ref.length,
+                    'p_message_count': ref.count,
+                    'p_last_created_at': ref.last_created_at,
+                    'p_last_message_id': ref.last_id
+                }
+            )
+            
+            if record_response.status_code != 200:
+                raise Exception(f"Database error: {record_response.text}")
+            
+            blocks.append(ref)
+            counts['compacted_messages'] += len(block)
+            last = ref
+            
+            if len(rows) < BLOCK_MESSAGES:
+                break
+        
+        # A message that slipped in during compaction is picked up next batch
+        remaining_response = await client.get(
+            f"{self.supabase_url}/rest/v1/messages",
+            headers=self._get_headers(use_service_key=True),
+            params={'select': 'id', 'meetup_id': f'eq.{meetup_id}', 'limit': 1}
+        )
+        
+        if remaining_response.status_code != 200:
+            raise Exception(f"Database error: {remaining_response.text}")
+        
+        if remaining_response.json():
+            return
+        
+        patch_response = await client.patch(
+            f"{self.supabase_url}/rest/v1/meetups",
+            headers=self._get_headers(use_service_key=True),
+            params={'id': f'eq.{meetup_id}'},
+            json={'messages_archived_at': datetime.now(timezone.utc).isoformat()}
+        )
+        
+        if patch_response.status_code not in [200, 204]:
+            raise Exception(f"Database error: {patch_response.text}")
+        
+        counts['sealed_meetups'] += 1
+    
+    async def _mock_compact_archived_messages(self, batch_size: int) -> Dict[str, int]:
+        """Mock implementation for compaction, moving archived chat out of the search index"""
+        counts = {'compacted_messages': 0, 'sealed_meetups': 0}
+        for meetup_id, meetup in list(self.mock_archived_meetups.items()):
+            if counts['compacted_messages'] >= batch_size:
+                break
+            if meetup.get('messages_archived_at') is not None:
+                continue
+            messages = [
+                dict(
+                    msg,
+                    user_name='Unknown User',
+                    parent_id=None,
+                    timestamp=msg['timestamp'].isoformat()
+                )
+                for msg in self.message_index.messages(meetup_id)
+            ]
+            self.mock_archive_blocks[meetup_id] = [
+                await self.archive.write_block(meetup_id, messages[i:i + BLOCK_MESSAGES])
+                for i in range(0, len(messages), BLOCK_MESSAGES)
+            ]
+            meetup['messages_archived_at'] = datetime.now(timezone.utc)
+            self.message_index.drop_meetup(meetup_id)
+            counts['compacted_messages'] += len(messages)
+            counts['sealed_meetups'] += 1
+        return counts
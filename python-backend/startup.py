@@ -0,0 +1,66 @@
+"""
+Startup warm-up and readiness tracking
+
+The platform scales workers to zero, so a cold worker would otherwise pay for
+TLS handshakes and lazy initialisation on its first user request. Warm-up
+steps run in the background as soon as the app starts; /health answers
+immediately (the process is alive) while /ready only reports ready once every
+step has finished.
+"""
+
+import asyncio
+import time
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple, Any
+
+# Process start, as close as we can get to it without the platform's help
+PROCESS_STARTED = time.perf_counter()
+
+
+class Readiness:
+    """Runs named warm-up steps once and records how long each took"""
+
+    def __init__(self):
+        self._steps: List[Tuple[str, Callable[[], Awaitable[Any]]]] = []
+        self.ready = False
+        self.started_at: Optional[datetime] = None
+        self.ready_at: Optional[datetime] = None
+        self.step_ms: Dict[str, float] = {}
+        self.errors: Dict[str, str] = {}
+        self._task: Optional["asyncio.Task[None]"] = None
+
+    def add_step(self, name: str, step: Callable[[], Awaitable[Any]]) -> None:
+        self._steps.append((name, step))
+
+    def start(self) -> None:
+        """Kick off warm-up in the background; call from the running event loop"""
+        if self._task is None:
+            self.started_at = datetime.now()
+            self._task = asyncio.create_task(self._run())
+
+    async def wait(self) -> None:
+        if self._task is not None:
+            await self._task
+
+    async def _run(self) -> None:
+        for name, step in self._steps:
+            t0 = time.perf_counter()
+            try:
+                await step()
+            except Exception as e:
+                # A failed warm-up step only costs latency later, so still become ready
+                self.errors[name] = str(e)
+                print(f"Warning: warm-up step {name} failed: {e}")
+            self.step_ms[name] = round((time.perf_counter() - t0) * 1000, 1)
+        self.ready = True
+        self.ready_at = datetime.now()
+        print(f"Ready {(time.perf_counter() - PROCESS_STARTED) * 1000:.0f}ms after process start ({self.step_ms})")
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "ready_at": self.ready_at.isoformat() if self.ready_at else None,
+            "step_ms": self.step_ms,
+            "errors": self.errors,
+        }
@@ -0,0 +1,263 @@
+"""
+Streaming storage backends for meetup files
+
+Uploads follow the tus resumable-upload model: a session is created with the
+total length up front, then bytes are appended at an offset in as many
+requests as the client needs, and the current offset can be asked for after
+a dropped connection. Every backend moves data chunk by chunk, so a file is
+never held in memory as a whole.
+
+- SupabaseStorage proxies to Supabase Storage's tus endpoint and streams
+  downloads from the meetup-files bucket, forwarding Range headers.
+- LocalStorage keeps files under a directory. It is the mock-mode backend
+  and the stand-in used by the throughput benchmark.
+"""
+
+import asyncio
+import base64
+import os
+import re
+from datetime import timedelta
+from typing import AsyncContextManager, AsyncIterator, Callable, List, Optional, Tuple
+
+import httpx
+
+BUCKET = "meetup-files"
+CHUNK_BYTES = 256 * 1024
+
+# Same limits the app checks up front (lib/config.ts FILES)
+MAX_FILE_BYTES = int(os.getenv("MAX_FILE_BYTES", str(10 * 1024 * 1024)))
+MAX_MEETUP_BYTES = int(os.getenv("MAX_MEETUP_BYTES", str(100 * 1024 * 1024)))
+MAX_FILES_PER_MEETUP = 25
+UPLOAD_TTL = timedelta(hours=24)
+
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class UploadTooLarge(ValueError):
+    """More bytes arrived than the upload session declared"""
+
+
+class UploadOffsetMismatch(ValueError):
+    """A chunk was sent for an offset other than the upload's current one"""
+
+
+class RangeNotSatisfiable(ValueError):
+    """The requested byte range lies outside the file"""
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Inclusive (start, end) byte positions for a single-range Range header
+    None means the whole file: no header, or one we don't support (multiple
+    ranges), which RFC 9110 allows us to ignore.
+    """
+    if not header:
+        return None
+    match = _RANGE.match(header.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0 or size == 0:
+            raise RangeNotSatisfiable(f"bytes */{size}")
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        raise RangeNotSatisfiable(f"bytes */{size}")
+    return start, end
+
+
+async def limit_stream(chunks: AsyncIterator[bytes], max_bytes: int) -> AsyncIterator[bytes]:
+    """Pass chunks through, failing as soon as more than max_bytes have arrived"""
+    received = 0
+    async for chunk in chunks:
+        received += len(chunk)
+        if received > max_bytes:
+            raise UploadTooLarge("Upload exceeds its declared length")
+        yield chunk
+
+
+class LocalStorage:
+    """Files in a local directory; in-progress uploads live next to them as .part files"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, storage_path: str) -> str:
+        path = os.path.normpath(os.path.join(self.directory, storage_path))
+        if not path.startswith(os.path.normpath(self.directory) + os.sep):
+            raise ValueError("Invalid storage path")
+        return path
+
+    async def create_upload(self, storage_path: str, length: int) -> str:
+        path = self._path(storage_path) + ".part"
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        open(path, "wb").close()
+        return storage_path
+
+    async def upload_offset(self, upload_ref: str) -> int:
+        try:
+            return os.path.getsize(self._path(upload_ref) + ".part")
+        except FileNotFoundError:
+            return os.path.getsize(self._path(upload_ref))
+
+    async def append(self, upload_ref: str, offset: int, chunks: AsyncIterator[bytes]) -> int:
+        """Write chunks at offset; returns the new offset (what was written survives a failure)"""
+        with open(self._path(upload_ref) + ".part", "r+b") as f:
+            f.seek(offset)
+            # Request bodies arrive in small pieces; batch them so each
+            # thread hop writes up to CHUNK_BYTES
+            pending: List[bytes] = []
+            pending_bytes = 0
+            try:
+                async for chunk in chunks:
+                    pending.append(chunk)
+                    pending_bytes += len(chunk)
+                    if pending_bytes >= CHUNK_BYTES:
+                        await asyncio.to_thread(f.write, b"".join(pending))
+                        pending, pending_bytes = [], 0
+            finally:
+                if pending:
+                    await asyncio.to_thread(f.write, b"".join(pending))
+            return f.tell()
+
+    async def complete(self, upload_ref: str) -> None:
+        path = self._path(upload_ref)
+        os.replace(path + ".part", path)
+
+    async def size(self, storage_path: str) -> int:
+        return os.path.getsize(self._path(storage_path))
+
+    def local_path(self, storage_path: str) -> str:
+        return self._path(storage_path)
+
+    async def put(self, storage_path: str, data: bytes, content_type: str) -> None:
+        """Store a small object in one go (derivatives, archive blocks); replaces any existing one atomically"""
+        path = self._path(storage_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".tmp", "wb") as f:
+            f.write(data)
+        os.replace(path + ".tmp", path)
+
+    async def read(self, storage_path: str, start: int, end: int) -> AsyncIterator[bytes]:
+        """Bytes start..end (inclusive) in CHUNK_BYTES pieces"""
+        with open(self._path(storage_path), "rb") as f:
+            f.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = await asyncio.to_thread(f.read, min(CHUNK_BYTES, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+
+
+class SupabaseStorage:
+    """Supabase Storage: tus for uploads, ranged object GETs for downloads"""
+
+    def __init__(
+        self,
+        supabase_url: str,
+        service_key: str,
+        client: Callable[[], AsyncContextManager[httpx.AsyncClient]]
+    ):
+        self.base_url = f"{supabase_url}/storage/v1"
+        self.service_key = service_key
+        # The service's shared-client context manager, so uploads reuse its pool
+        self._client = client
+
+    def _headers(self, **extra: str) -> dict:
+        headers = {"apikey": self.service_key, "Authorization": f"Bearer {self.service_key}"}
+        headers.update(extra)
+        return headers
+
+    async def create_upload(self, storage_path: str, length: int) -> str:
+        """Start a tus upload; returns its upload URL"""
+        metadata = ",".join(
+            f"{key} {base64.b64encode(value.encode()).decode()}"
+            for key, value in [("bucketName", BUCKET), ("objectName", storage_path)]
+        )
+        async with self._client() as client:
+            response = await client.post(
+                f"{self.base_url}/upload/resumable",
+                headers=self._headers(**{
+                    "Tus-Resumable": "1.0.0",
+                    "Upload-Length": str(length),
+                    "Upload-Metadata": metadata
+                })
+            )
+        if response.status_code != 201:
+            raise Exception(f"Storage error: {response.text}")
+        return response.headers["location"]
+
+    async def upload_offset(self, upload_ref: str) -> int:
+        async with self._client() as client:
+            response = await client.head(upload_ref, headers=self._headers(**{"Tus-Resumable": "1.0.0"}))
+        if response.status_code != 200:
+            raise Exception(f"Storage error: {response.status_code}")
+        return int(response.headers["upload-offset"])
+
+    async def append(self, upload_ref: str, offset: int, chunks: AsyncIterator[bytes]) -> int:
+        async with self._client() as client:
+            response = await client.patch(
+                upload_ref,
+                headers=self._headers(**{
+                    "Tus-Resumable": "1.0.0",
+                    "Upload-Offset": str(offset),
+                    "Content-Type": "application/offset+octet-stream"
+                }),
+                content=chunks,
+                timeout=httpx.Timeout(None, connect=5.0)
+            )
+        if response.status_code != 204:
+            raise Exception(f"Storage error: {response.text}")
+        return int(response.headers["upload-offset"])
+
+    async def complete(self, upload_ref: str) -> None:
+        # tus finalises the object once the last byte arrives
+        return None
+
+    async def put(self, storage_path: str, data: bytes, content_type: str) -> None:
+        """Store a small object in one go (derivatives, archive blocks); replaces any existing one"""
+        async with self._client() as client:
+            response = await client.post(
+                f"{self.base_url}/object/{BUCKET}/{storage_path}",
+                headers=self._headers(**{"Content-Type": content_type, "x-upsert": "true"}),
+                content=data
+            )
+        if response.status_code != 200:
+            raise Exception(f"Storage error: {response.text}")
+
+    async def size(self, storage_path: str) -> int:
+        async with self._client() as client:
+            response = await client.head(
+                f"{self.base_url}/object/authenticated/{BUCKET}/{storage_path}",
+                headers=self._headers()
+            )
+        if response.status_code != 200:
+            raise Exception(f"Storage error: {response.status_code}")
+        return int(response.headers["content-length"])
+
+    async def read(self, storage_path: str, start: int, end: int) -> AsyncIterator[bytes]:
+        async with self._client() as client:
+            request = client.build_request(
+                "GET",
+                f"{self.base_url}/object/authenticated/{BUCKET}/{storage_path}",
+                headers=self._headers(Range=f"bytes={start}-{end}"),
+                timeout=httpx.Timeout(None, connect=5.0)
+            )
+            response = await client.send(request, stream=True)
+            try:
+                if response.status_code not in (200, 206):
+                    raise Exception(f"Storage error: {response.status_code}")
+                async for chunk in response.aiter_bytes(CHUNK_BYTES):
+                    yield chunk
+            finally:
+                await response.aclose()
@@ -0,0 +1,163 @@
+"""
+Background sweeper for ended meetups and stale invite tokens
+
+Every run archives meetups that have ended, revokes the invite tokens of
+archived meetups and purges tokens that expired long ago (revoked tokens
+are kept until they expire, or a signed one would verify again).
+Work is done in bounded batches so a backlog never turns into one long
+transaction, and runs are spread out with jitter so workers that start
+together do not sweep in lockstep.
+
+Only one worker per host sweeps at a time (an flock on SWEEPER_LOCK_PATH);
+across hosts the sweep_expired() database function additionally takes a
+transaction-scoped advisory lock.
+"""
+
+import asyncio
+import os
+import random
+import tempfile
+import time
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Any, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows dev machines: no cross-process lock, single worker assumed
+    fcntl = None
+
+SWEEP_INTERVAL_SECONDS = float(os.getenv("SWEEP_INTERVAL_SECONDS", "300"))
+SWEEP_JITTER = 0.2
+SWEEP_BATCH_SIZE = int(os.getenv("SWEEP_BATCH_SIZE", "500"))
+# Upper bound on batches per run; whatever is left waits for the next run
+SWEEP_MAX_BATCHES = 20
+SWEEPER_LOCK_PATH = os.getenv("SWEEPER_LOCK_PATH", os.path.join(tempfile.gettempdir(), "pennapps-sweeper.lock"))
+
+# One batch: returns counts, or None when another host holds the database lock
+SweepBatch = Callable[[int], Awaitable[Optional[Dict[str, int]]]]
+
+
+class _HostLock:
+    """Non-blocking exclusive flock, held for the duration of one run"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fd: Optional[int] = None
+
+    def acquire(self) -> bool:
+        if fcntl is None:
+            return True
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        self._fd = fd
+        return True
+
+    def release(self) -> None:
+        if self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+
+
+class Sweeper:
+    """Runs a batched sweep periodically and keeps per-run metrics"""
+
+    def __init__(
+        self,
+        jobs: Dict[str, SweepBatch],
+        interval: float = SWEEP_INTERVAL_SECONDS,
+        jitter: float = SWEEP_JITTER,
+        batch_size: int = SWEEP_BATCH_SIZE,
+        max_batches: int = SWEEP_MAX_BATCHES,
+        lock_path: str = SWEEPER_LOCK_PATH
+    ):
+        # Run in order every batch round, e.g. archive meetups before compacting their chat
+        self.jobs = jobs
+        self.interval = interval
+        self.jitter = jitter
+        self.batch_size = batch_size
+        self.max_batches = max_batches
+        self._lock = _HostLock(lock_path)
+        self._task: Optional["asyncio.Task[None]"] = None
+
+        self.runs = 0
+        self.skipped_locked = 0
+        self.failures = 0
+        self.last_run_at: Optional[datetime] = None
+        self.last_duration_ms: Optional[float] = None
+        self.last_counts: Dict[str, int] = {}
+        self.totals: Dict[str, int] = {}
+
+    def _next_delay(self) -> float:
+        return self.interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run_forever())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run_forever(self) -> None:
+        while True:
+            await asyncio.sleep(self._next_delay())
+            try:
+                await self.run_once()
+            except Exception as e:
+                self.failures += 1
+                print(f"Error in sweeper run: {e}")
+
+    async def run_once(self) -> Dict[str, int]:
+        """Run each job until one of its batches comes back short or max_batches is reached"""
+        if not self._lock.acquire():
+            self.skipped_locked += 1
+            return {}
+
+        t0 = time.perf_counter()
+        counts: Dict[str, int] = {}
+        try:
+            pending = list(self.jobs)
+            for _ in range(self.max_batches):
+                if not pending:
+                    break
+                for job in list(pending):
+                    batch = await self.jobs[job](self.batch_size)
+                    if batch is None:
+                        self.skipped_locked += 1
+                        pending.remove(job)
+                        continue
+                    for name, n in batch.items():
+                        counts[name] = counts.get(name, 0) + n
+                    if max(batch.values(), default=0) < self.batch_size:
+                        pending.remove(job)
+        finally:
+            self._lock.release()
+
+        self.runs += 1
+        self.last_run_at = datetime.now()
+        self.last_duration_ms = round((time.perf_counter() - t0) * 1000, 1)
+        self.last_counts = counts
+        for name, n in counts.items():
+            self.totals[name] = self.totals.get(name, 0) + n
+        return counts
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "runs": self.runs,
+            "skipped_locked": self.skipped_locked,
+            "failures": self.failures,
+            "last_run_at": self.last_run_at.isoformat() if self.last_run_at else None,
+            "last_duration_ms": self.last_duration_ms,
+            "last_counts": self.last_counts,
+            "totals": self.totals,
+        }
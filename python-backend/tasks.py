@@ -0,0 +1,251 @@
+"""
+In-process task queue for follow-up work that must not slow down requests
+
+Endpoints commit their critical write, enqueue the rest (audit rows, stats)
+and return. Jobs are run by a fixed number of worker coroutines and retried
+with exponential backoff when they fail.
+
+Every job is appended to a JSONL journal before it is queued, and a "done"
+record is appended once it finishes, so jobs that were queued or running
+when the process stopped are run again on the next start. Handlers must
+therefore be idempotent. Each worker process claims its own journal slot
+(an flock on <dir>/journal-<n>.jsonl), so several workers can share the
+directory and a restarted worker picks up an orphaned slot. The journal
+is flushed but not fsynced per job: it survives a process restart, not a
+power loss.
+"""
+
+import asyncio
+import json
+import os
+import random
+import tempfile
+import uuid
+from typing import Any, Awaitable, Callable, Dict, IO, List, NamedTuple, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows dev machines: single worker assumed
+    fcntl = None
+
+TASK_JOURNAL_DIR = os.getenv("TASK_JOURNAL_DIR", os.path.join(tempfile.gettempdir(), "pennapps-tasks"))
+TASK_QUEUE_CAPACITY = 10_000
+TASK_CONCURRENCY = 4
+TASK_MAX_ATTEMPTS = 6
+TASK_RETRY_BASE_SECONDS = 0.5
+TASK_RETRY_MAX_SECONDS = 60.0
+# Rewrite the journal with only pending jobs once it holds this many records
+JOURNAL_COMPACT_RECORDS = 50_000
+_MAX_SLOTS = 64
+
+Handler = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+class Job(NamedTuple):
+    id: str
+    name: str
+    payload: Dict[str, Any]
+    attempts: int = 0
+
+
+class TaskQueue:
+    """Bounded queue of named jobs with retries and a replayable journal"""
+
+    def __init__(
+        self,
+        journal_dir: str = TASK_JOURNAL_DIR,
+        capacity: int = TASK_QUEUE_CAPACITY,
+        concurrency: int = TASK_CONCURRENCY,
+        max_attempts: int = TASK_MAX_ATTEMPTS
+    ):
+        self.journal_dir = journal_dir
+        self.capacity = capacity
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self._handlers: Dict[str, Handler] = {}
+        # Created in start(), inside the running event loop
+        self._queue: Optional["asyncio.Queue[Job]"] = None
+        self._workers: List["asyncio.Task[None]"] = []
+        self._retries: Dict[str, "asyncio.Task[None]"] = {}
+        self._journal: Optional[IO[str]] = None
+        self._journal_fd: Optional[int] = None
+        self._journal_path: Optional[str] = None
+        self._journal_records = 0
+        self._pending: Dict[str, Job] = {}
+
+        self.enqueued = 0
+        self.replayed = 0
+        self.completed = 0
+        self.retried = 0
+        self.dead = 0
+        self.rejected = 0
+        self.in_flight = 0
+
+    def register(self, name: str, handler: Handler) -> None:
+        self._handlers[name] = handler
+
+    # --- Journal ---------------------------------------------------------
+
+    def _claim_slot(self) -> None:
+        os.makedirs(self.journal_dir, exist_ok=True)
+        for slot in range(_MAX_SLOTS):
+            path = os.path.join(self.journal_dir, f"journal-{slot}.jsonl")
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+            if fcntl is not None:
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    os.close(fd)
+                    continue
+            self._journal_fd = fd
+            self._journal_path = path
+            return
+        raise RuntimeError(f"No free task journal slot in {self.journal_dir}")
+
+    def _replay(self) -> List[Job]:
+        """Jobs added but never finished, in their original order"""
+        pending: Dict[str, Job] = {}
+        with open(self._journal_path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # torn final line from a crash
+                if record["op"] == "add":
+                    pending[record["id"]] = Job(record["id"], record["name"], record["payload"])
+                else:
+                    pending.pop(record["id"], None)
+        return list(pending.values())
+
+    def _rewrite_journal(self, jobs: List[Job]) -> None:
+        """Replace the journal with add records for jobs only"""
+        if self._journal is not None:
+            self._journal.close()
+        tmp_path = self._journal_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            for job in jobs:
+                f.write(json.dumps({"op": "add", "id": job.id, "name": job.name, "payload": job.payload}) + "\n")
+        os.replace(tmp_path, self._journal_path)
+        self._journal = open(self._journal_path, "a")
+        self._journal_records = len(jobs)
+
+    def _append(self, record: Dict[str, Any]) -> None:
+        self._journal.write(json.dumps(record, default=str) + "\n")
+        self._journal.flush()
+        self._journal_records += 1
+        if self._journal_records >= JOURNAL_COMPACT_RECORDS:
+            self._rewrite_journal(list(self._pending.values()))
+
+    # --- Lifecycle -------------------------------------------------------
+
+    def start(self) -> None:
+        """Claim a journal slot, re-queue its unfinished jobs and start the workers"""
+        if self._workers:
+            return
+        self._queue = asyncio.Queue()
+        self._claim_slot()
+        jobs = self._replay()
+        self._rewrite_journal(jobs)
+        for job in jobs:
+            self._pending[job.id] = job
+            self._queue.put_nowait(job)
+        self.replayed += len(jobs)
+        if jobs:
+            print(f"Task queue: replaying {len(jobs)} unfinished jobs from {self._journal_path}")
+        self._workers = [asyncio.create_task(self._work()) for _ in range(self.concurrency)]
+
+    async def stop(self, timeout: float = 5.0) -> None:
+        """Give queued jobs a moment to finish; whatever is left runs after the next start"""
+        if not self._workers:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        for task in self._workers + list(self._retries.values()):
+            task.cancel()
+        await asyncio.gather(*self._workers, *self._retries.values(), return_exceptions=True)
+        self._workers = []
+        self._retries = {}
+        self._journal.close()
+        self._journal = None
+        if fcntl is not None:
+            fcntl.flock(self._journal_fd, fcntl.LOCK_UN)
+        os.close(self._journal_fd)
+        self._journal_fd = None
+
+    # --- Jobs ------------------------------------------------------------
+
+    def enqueue(self, name: str, payload: Dict[str, Any]) -> bool:
+        """
+        Queue a job; False if the queue is not running or full, in which case
+        the caller should do the work itself
+        """
+        if name not in self._handlers:
+            raise ValueError(f"No handler registered for task {name}")
+        if not self._workers or len(self._pending) >= self.capacity:
+            self.rejected += 1
+            return False
+        job = Job(uuid.uuid4().hex, name, payload)
+        self._pending[job.id] = job
+        self._append({"op": "add", "id": job.id, "name": name, "payload": payload})
+        self._queue.put_nowait(job)
+        self.enqueued += 1
+        return True
+
+    async def run_now(self, name: str, payload: Dict[str, Any]) -> None:
+        """Run a job's handler inline, without queueing or retries"""
+        await self._handlers[name](payload)
+
+    def _finish(self, job: Job, op: str) -> None:
+        self._pending.pop(job.id, None)
+        self._append({"op": op, "id": job.id})
+
+    async def _work(self) -> None:
+        while True:
+            job = await self._queue.get()
+            self.in_flight += 1
+            try:
+                await self._handlers[job.name](job.payload)
+            except Exception as e:
+                self._failed(job, e)
+            else:
+                self.completed += 1
+                self._finish(job, "done")
+            finally:
+                self.in_flight -= 1
+                self._queue.task_done()
+
+    def _failed(self, job: Job, error: Exception) -> None:
+        attempts = job.attempts + 1
+        if attempts >= self.max_attempts:
+            self.dead += 1
+            print(f"Task {job.name} {job.id} failed after {attempts} attempts, giving up: {error}")
+            self._finish(job, "dead")
+            return
+        self.retried += 1
+        delay = min(TASK_RETRY_MAX_SECONDS, TASK_RETRY_BASE_SECONDS * 2 ** job.attempts)
+        delay *= random.uniform(0.5, 1.0)
+        print(f"Task {job.name} {job.id} failed (attempt {attempts}), retrying in {delay:.1f}s: {error}")
+        self._retries[job.id] = asyncio.create_task(self._retry_later(job._replace(attempts=attempts), delay))
+
+    async def _retry_later(self, job: Job, delay: float) -> None:
+        await asyncio.sleep(delay)
+        self._retries.pop(job.id, None)
+        self._queue.put_nowait(job)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending": len(self._pending),
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "in_flight": self.in_flight,
+            "waiting_retry": len(self._retries),
+            "capacity": self.capacity,
+            "enqueued": self.enqueued,
+            "replayed": self.replayed,
+            "completed": self.completed,
+            "retried": self.retried,
+            "dead": self.dead,
+            "rejected": self.rejected,
+            "journal": self._journal_path,
+        }
@@ -0,0 +1,14 @@
+"""
+Tests for the backend's self-contained modules
+
+Run from python-backend/:
+
+    pip install -r requirements-dev.txt
+    python -m pytest tests
+"""
+
+import os
+import sys
+
+# The backend is a flat set of modules rather than a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
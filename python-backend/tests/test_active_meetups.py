@@ -0,0 +1,32 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from services import SupabaseService
+from validators import ActiveMeetupsRequest, CreateMeetupRequest
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_mixed_naive_and_aware_window_bounds():
+    service = SupabaseService()
+    start = datetime.now(timezone.utc).replace(microsecond=0) + timedelta(hours=1)
+
+    async def scenario():
+        meetup_id, _, _ = await service.create_meetup(
+            CreateMeetupRequest(title="Board games", start_ts=start, end_ts=start + timedelta(hours=2), lat=39.95, lng=-75.16),
+            "host"
+        )
+        # A naive start (taken as UTC) and an aware end two hours later in UTC+02:00
+        request = ActiveMeetupsRequest(
+            user_id="host",
+            at=(start + timedelta(minutes=30)).replace(tzinfo=None).isoformat(),
+            until=(start + timedelta(minutes=30)).astimezone(timezone(timedelta(hours=2))).isoformat()
+        )
+        assert request.at == request.until
+        meetups, cursor = await service.active_meetups(request)
+        return meetup_id, meetups
+
+    meetup_id, meetups = run(scenario())
+    assert [meetup.id for meetup in meetups] == [meetup_id]
@@ -0,0 +1,114 @@
+import asyncio
+import tempfile
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from archive import BLOCK_MESSAGES, MessageArchive
+from services import SupabaseService
+from storage import LocalStorage
+from validators import CreateMeetupRequest, GetMessagesRequest, SendMessageRequest
+
+
+def messages(count):
+    start = datetime(2025, 6, 1, 12, 0, tzinfo=timezone.utc)
+    return [
+        {"id": str(uuid.uuid4()), "n": n, "timestamp": (start + timedelta(seconds=n)).isoformat()}
+        for n in range(count)
+    ]
+
+
+class CountingStorage(LocalStorage):
+    def __init__(self, root):
+        super().__init__(root)
+        self.reads = []
+
+    async def read(self, storage_path, start, end):
+        self.reads.append(storage_path)
+        async for chunk in super().read(storage_path, start, end):
+            yield chunk
+
+
+def test_pages_read_only_the_blocks_they_overlap():
+    storage = CountingStorage(tempfile.mkdtemp())
+    archive = MessageArchive(storage)
+    chat = messages(25)
+
+    async def scenario():
+        blocks = [await archive.write_block("m", chat[i:i + 10]) for i in range(0, 25, 10)]
+        assert [ref.count for ref in blocks] == [10, 10, 5]
+        assert blocks[-1].last_id == chat[-1]["id"]
+
+        # Newest first, across the boundary of the two newest blocks
+        page = await archive.read_page(blocks, limit=6, offset=3)
+        assert [msg["n"] for msg in page] == [21, 20, 19, 18, 17, 16]
+        assert sorted(storage.reads) == sorted(ref.storage_path for ref in blocks[1:])
+
+        storage.reads.clear()
+        assert [msg["n"] for msg in await archive.read_page(blocks, limit=50, offset=22)] == [2, 1, 0]
+        assert storage.reads == [blocks[0].storage_path]
+        assert await archive.read_page(blocks, limit=10, offset=25) == []
+
+    asyncio.run(scenario())
+
+
+async def archived_meetup(service, count):
+    start = datetime.now(timezone.utc) + timedelta(hours=1)
+    meetup_id, _, _ = await service.create_meetup(
+        CreateMeetupRequest(title="Picnic", start_ts=start, end_ts=start + timedelta(hours=2), lat=39.95, lng=-75.16),
+        "host"
+    )
+    sent = []
+    for n in range(count):
+        _, _, message_id = await service.send_message(
+            SendMessageRequest(meetup_id=meetup_id, user_id="host", message=f"message {n}")
+        )
+        sent.append(message_id)
+    service.meetup_index.get(meetup_id)["end_ts"] = datetime.now(timezone.utc) - timedelta(minutes=1)
+    await service.sweep_expired(100)
+    return meetup_id, sent
+
+
+def test_compacted_chat_reads_back_from_storage():
+    service = SupabaseService()
+    count = BLOCK_MESSAGES * 2 + 7
+
+    async def scenario():
+        meetup_id, sent = await archived_meetup(service, count)
+        stats = await service.compact_archived_messages(10_000)
+        assert stats == {"compacted_messages": count, "sealed_meetups": 1}
+        assert len(service.mock_archive_blocks[meetup_id]) == 3
+        assert service.message_index.messages(meetup_id) == []
+
+        read = []
+        for offset in range(0, count, 100):
+            ok, _, page = await service.get_messages(
+                GetMessagesRequest(meetup_id=meetup_id, user_id="host", limit=100, offset=offset)
+            )
+            assert ok
+            read.extend(msg.id for msg in page)
+        assert read == sent[::-1]
+
+        # A second run has nothing left to move
+        assert await service.compact_archived_messages(10_000) == {"compacted_messages": 0, "sealed_meetups": 0}
+
+    asyncio.run(scenario())
+
+
+def test_failed_upload_keeps_the_hot_messages():
+    service = SupabaseService()
+
+    async def scenario():
+        meetup_id, sent = await archived_meetup(service, 3)
+
+        async def unavailable(storage_path, data, content_type):
+            raise Exception("Storage error: 503")
+
+        service.storage.put = unavailable
+        with pytest.raises(Exception):
+            await service.compact_archived_messages(100)
+        assert [msg["id"] for msg in service.message_index.messages(meetup_id)] == sent
+        assert meetup_id not in service.mock_archive_blocks
+
+    asyncio.run(scenario())
@@ -0,0 +1,110 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import FastAPI, Header, Response
+from fastapi.testclient import TestClient
+from typing import Optional
+
+import main
+from validators import CreateMeetupRequest, SendMessageRequest
+from versions import MeetupVersions, matching_etag, meetup_etag
+from wire import CompressionMiddleware
+
+HOST = "550e8400-e29b-41d4-a716-446655440000"
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def meetup():
+    service = main.supabase_service
+    clock = Clock()
+    service.versions = MeetupVersions(max_stale=10, clock=clock)
+    start = datetime.now(timezone.utc) + timedelta(hours=1)
+
+    async def setup():
+        meetup_id, _, _ = await service.create_meetup(
+            CreateMeetupRequest(title="Chess club", start_ts=start, end_ts=start + timedelta(hours=2), lat=39.95, lng=-75.16),
+            HOST
+        )
+        return meetup_id
+
+    return asyncio.run(setup()), clock
+
+
+def get_messages(client, meetup_id, user_id=HOST, etag=None):
+    headers = {"If-None-Match": etag} if etag else {}
+    return client.get("/get_messages", params={"meetup_id": meetup_id, "user_id": user_id}, headers=headers)
+
+
+def test_not_modified_until_the_meetup_changes(meetup):
+    meetup_id, clock = meetup
+    client = TestClient(main.app)
+
+    first = get_messages(client, meetup_id)
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+
+    cached = get_messages(client, meetup_id, etag=etag)
+    assert cached.status_code == 304
+    assert cached.headers["etag"] == etag
+
+    asyncio.run(main.supabase_service.send_message(SendMessageRequest(meetup_id=meetup_id, user_id=HOST, message="new")))
+    changed = get_messages(client, meetup_id, etag=etag)
+    assert changed.status_code == 200 and changed.headers["etag"] != etag
+
+    # Writes made elsewhere are picked up once the stamp rolls over
+    etag = changed.headers["etag"]
+    clock.now += 10
+    assert get_messages(client, meetup_id, etag=etag).status_code == 200
+
+
+def test_non_members_never_get_a_304(meetup):
+    meetup_id, _ = meetup
+    client = TestClient(main.app)
+    etag = get_messages(client, meetup_id).headers["etag"]
+
+    outsider = get_messages(client, meetup_id, user_id="someone-else", etag=etag)
+    assert outsider.status_code != 304
+    assert "etag" not in outsider.headers
+
+    private = client.get(f"/meetups/{meetup_id}", params={"user_id": "someone-else"}, headers={"If-None-Match": "*"})
+    assert private.status_code == 404
+
+
+def test_matching_etag():
+    etag = meetup_etag("m", "v1", "messages")
+    assert matching_etag(None, etag) is None
+    assert matching_etag('"other"', etag) is None
+    assert matching_etag("*", etag) == etag
+    gzipped = f'{etag[:-1]}-gzip"'
+    assert matching_etag(f'"other", W/{gzipped}', etag) == f"W/{gzipped}"
+
+
+def test_304_repeats_the_compressed_responses_etag():
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware)
+    etag = meetup_etag("m", "v1", "messages")
+
+    @app.get("/page")
+    def page(if_none_match: Optional[str] = Header(None)):
+        cached = matching_etag(if_none_match, etag)
+        if cached is not None:
+            return Response(status_code=304, headers={"ETag": cached})
+        return Response("x" * 4096, headers={"ETag": etag})
+
+    client = TestClient(app)
+    first = client.get("/page", headers={"Accept-Encoding": "gzip"})
+    assert first.headers["content-encoding"] == "gzip"
+    assert first.headers["etag"] == f'{etag[:-1]}-gzip"'
+
+    cached = client.get("/page", headers={"Accept-Encoding": "gzip", "If-None-Match": first.headers["etag"]})
+    assert cached.status_code == 304
+    assert cached.headers["etag"] == first.headers["etag"]
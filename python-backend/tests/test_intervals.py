@@ -0,0 +1,92 @@
+import random
+
+import pytest
+
+from intervals import IntervalTree
+
+
+def brute_force(intervals, start, end):
+    return sorted(
+        (s, key, e) for key, (s, e) in intervals.items() if s <= end and e >= start
+    )
+
+
+def query(tree, start, end, after=None):
+    return [(s, key, e) for key, s, e in tree.overlapping(start, end, after)]
+
+
+def test_overlap_includes_touching_intervals():
+    tree = IntervalTree(seed=1)
+    tree.add("a", 0, 10)
+    tree.add("b", 10, 20)
+    tree.add("c", 21, 30)
+    tree.add("d", 5, 6)
+    assert query(tree, 10, 10) == [(0, "a", 10), (10, "b", 20)]
+    assert query(tree, 20.5, 20.9) == []
+    assert query(tree, 0, 100) == [(0, "a", 10), (5, "d", 6), (10, "b", 20), (21, "c", 30)]
+
+
+def test_add_replaces_and_remove_forgets():
+    tree = IntervalTree(seed=1)
+    tree.add("a", 0, 10)
+    tree.add("a", 50, 60)
+    assert len(tree) == 1
+    assert query(tree, 0, 10) == []
+    assert query(tree, 55, 55) == [(50, "a", 60)]
+
+    tree.remove("a")
+    tree.remove("a")
+    tree.remove("missing")
+    assert len(tree) == 0 and "a" not in tree
+    assert query(tree, 0, 100) == []
+
+
+def test_rejects_interval_ending_before_it_starts():
+    with pytest.raises(ValueError):
+        IntervalTree().add("a", 10, 5)
+
+
+def test_matches_brute_force_through_adds_and_removes():
+    rng = random.Random(7)
+    tree = IntervalTree(seed=7)
+    intervals = {}
+    for step in range(3000):
+        key = rng.randrange(400)
+        if rng.random() < 0.3:
+            tree.remove(key)
+            intervals.pop(key, None)
+        else:
+            start = rng.uniform(0, 1000)
+            end = start + rng.expovariate(1 / 30)
+            tree.add(key, start, end)
+            intervals[key] = (start, end)
+        if step % 100 == 0:
+            start = rng.uniform(0, 1000)
+            end = start + rng.uniform(0, 100)
+            assert query(tree, start, end) == brute_force(intervals, start, end)
+    assert len(tree) == len(intervals)
+
+
+def test_paging_with_after_visits_every_result_once():
+    rng = random.Random(3)
+    tree = IntervalTree(seed=3)
+    intervals = {}
+    for key in range(500):
+        # Many equal starts, so paging has to break ties on the key
+        start = float(rng.randrange(50))
+        end = start + rng.randrange(20)
+        tree.add(key, start, end)
+        intervals[key] = (start, end)
+
+    pages, after = [], None
+    while True:
+        page = []
+        for key, start, end in tree.overlapping(20, 30, after):
+            page.append((start, key, end))
+            if len(page) == 7:
+                break
+        if not page:
+            break
+        pages.extend(page)
+        after = page[-1][:2]
+    assert pages == brute_force(intervals, 20, 30)
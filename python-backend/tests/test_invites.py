@@ -0,0 +1,177 @@
+import asyncio
+import base64
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from invites import SIGNED_PREFIX, BloomFilter, InviteSigner, RevocationSet
+from services import SupabaseService
+from validators import AcceptInviteRequest, CreateMeetupRequest
+
+MEETUP_ID = str(uuid.uuid4())
+TOKEN_ID = str(uuid.uuid4())
+NOW = datetime(2025, 6, 1, 12, 0, tzinfo=timezone.utc)
+EXPIRES = NOW + timedelta(hours=6)
+
+
+def sign(keys=("current",)):
+    return InviteSigner(list(keys)).sign(MEETUP_ID, TOKEN_ID, EXPIRES)
+
+
+def test_verify_returns_claims():
+    claims = InviteSigner(["current"]).verify(sign(), now=NOW.timestamp())
+    assert claims is not None
+    assert claims.meetup_id == MEETUP_ID
+    assert claims.token_id == TOKEN_ID
+    assert claims.expires_at == EXPIRES
+
+
+def test_rejects_token_signed_with_another_key():
+    assert InviteSigner(["attacker"]).verify(sign(), now=NOW.timestamp()) is None
+
+
+def test_rejects_tampered_payload():
+    token = sign()
+    raw = bytearray(base64.urlsafe_b64decode(token[len(SIGNED_PREFIX):] + "=="))
+    # Point the token at another meetup but keep the original MAC
+    raw[0] ^= 0x01
+    forged = SIGNED_PREFIX + base64.urlsafe_b64encode(bytes(raw)).rstrip(b"=").decode()
+    assert len(forged) == len(token)
+    assert InviteSigner(["current"]).verify(forged, now=NOW.timestamp()) is None
+
+
+def test_rejects_expired_token():
+    signer = InviteSigner(["current"])
+    assert signer.verify(sign(), now=EXPIRES.timestamp()) is None
+    assert signer.verify(sign(), now=(EXPIRES + timedelta(seconds=1)).timestamp()) is None
+
+
+@pytest.mark.parametrize("token", [
+    sign()[:-1],
+    sign()[:len(SIGNED_PREFIX) + 10],
+    SIGNED_PREFIX,
+    sign() + "A",
+    "s2." + sign()[len(SIGNED_PREFIX):],
+    SIGNED_PREFIX + "!" * (len(sign()) - len(SIGNED_PREFIX)),
+    "0123456789abcdef0123456789abcdef",
+])
+def test_rejects_malformed_tokens(token):
+    assert InviteSigner(["current"]).verify(token, now=NOW.timestamp()) is None
+
+
+def test_any_key_in_rotation_verifies():
+    signer = InviteSigner(["new", "old", "older"])
+    for key in ("new", "old", "older"):
+        claims = signer.verify(sign([key]), now=NOW.timestamp())
+        assert claims is not None and claims.token_id == TOKEN_ID
+
+
+def test_signs_with_first_key():
+    token = InviteSigner(["new", "old"]).sign(MEETUP_ID, TOKEN_ID, EXPIRES)
+    assert InviteSigner(["new"]).verify(token, now=NOW.timestamp()) is not None
+    assert InviteSigner(["old"]).verify(token, now=NOW.timestamp()) is None
+
+
+def test_disabled_without_keys():
+    signer = InviteSigner([])
+    assert not signer.enabled
+    assert signer.verify(sign(), now=NOW.timestamp()) is None
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(1000)
+    keys = [str(uuid.uuid4()) for _ in range(1000)]
+    for key in keys:
+        bloom.add(key)
+    assert all(key in bloom for key in keys)
+    false_positives = sum(str(uuid.uuid4()) in bloom for _ in range(10_000))
+    assert false_positives < 300
+
+
+def test_revocation_set_reloads_and_fails_closed():
+    revoked = []
+    fail = False
+
+    async def loader():
+        if fail:
+            raise RuntimeError("database down")
+        for token_id in revoked:
+            yield token_id, EXPIRES.timestamp()
+
+    async def scenario():
+        nonlocal fail
+        revocations = RevocationSet(loader, refresh=0)
+        revoked.append(TOKEN_ID)
+        assert await revocations.is_revoked(TOKEN_ID)
+        assert not await revocations.is_revoked(str(uuid.uuid4()))
+
+        # Later loads refresh in the background and keep the last good set meanwhile
+        revoked.clear()
+        await revocations.is_revoked(TOKEN_ID)
+        await asyncio.sleep(0)
+        assert not await revocations.is_revoked(TOKEN_ID)
+
+        fail = True
+        first_load_fails = RevocationSet(loader, refresh=0)
+        with pytest.raises(RuntimeError):
+            await first_load_fails.is_revoked(TOKEN_ID)
+
+    asyncio.run(scenario())
+
+
+def mock_service():
+    service = SupabaseService()
+    service.invites = InviteSigner(["current"])
+    return service
+
+
+async def create_meetup(service):
+    start = datetime.now(timezone.utc) + timedelta(hours=1)
+    meetup_id, token, _ = await service.create_meetup(
+        CreateMeetupRequest(title="Picnic", start_ts=start, end_ts=start + timedelta(hours=2), lat=39.95, lng=-75.16),
+        "host"
+    )
+    (token_id,) = service.mock_invite_tokens
+    return meetup_id, token, token_id
+
+
+async def accept(service, token, user_id):
+    # A fresh set, as another worker would load after the refresh interval
+    service.revocations = RevocationSet(service._load_revoked_tokens, refresh=0)
+    return await service.accept_invite(AcceptInviteRequest(token=token, user_id=user_id))
+
+
+def test_revoked_token_is_kept_until_it_expires():
+    service = mock_service()
+
+    async def scenario():
+        meetup_id, token, token_id = await create_meetup(service)
+        assert (await accept(service, token, "guest-1"))[0]
+
+        # Revoked long ago, but the signed token has not expired yet
+        row = service.mock_invite_tokens[token_id]
+        row["revoked_at"] = datetime.now(timezone.utc) - timedelta(days=30)
+        stats = await service.sweep_expired(100)
+        assert stats["purged_tokens"] == 0
+        assert token_id in service.mock_invite_tokens
+        assert await accept(service, token, "guest-2") == (False, "Invalid or expired token", None)
+
+        row["expires_at"] = datetime.now(timezone.utc) - timedelta(minutes=1)
+        stats = await service.sweep_expired(100)
+        assert stats["purged_tokens"] == 1
+        assert token_id not in service.mock_invite_tokens
+
+    asyncio.run(scenario())
+
+
+def test_signed_token_of_an_ended_meetup_is_refused():
+    service = mock_service()
+
+    async def scenario():
+        meetup_id, token, _ = await create_meetup(service)
+        service.meetup_index.get(meetup_id)["end_ts"] = datetime.now(timezone.utc) - timedelta(minutes=1)
+        assert await accept(service, token, "guest") == (False, "This meetup has ended", None)
+        assert "guest" not in service.mock_memberships.get(meetup_id, set())
+
+    asyncio.run(scenario())
@@ -0,0 +1,117 @@
+import asyncio
+
+import pytest
+
+from presence import PresenceTracker, TimingWheel
+from services import SupabaseService
+from validators import OnlineMembersRequest
+
+
+class FakeClock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_key_expires_after_ttl_not_before():
+    clock = FakeClock()
+    wheel = TimingWheel(ttl=5, tick=1, clock=clock)
+    wheel.touch("a")
+    clock.now += 4.9
+    assert wheel.advance() == []
+    assert "a" in wheel
+    # Rounded up to the next tick, so gone by ttl plus one tick
+    clock.now += 1.1
+    assert wheel.advance() == ["a"]
+    assert "a" not in wheel and len(wheel) == 0
+
+
+def test_touch_pushes_expiry_back():
+    clock = FakeClock()
+    wheel = TimingWheel(ttl=5, tick=1, clock=clock)
+    wheel.touch("a")
+    for _ in range(20):
+        clock.now += 3
+        assert wheel.advance() == []
+        wheel.touch("a")
+    clock.now += 6
+    assert wheel.advance() == ["a"]
+
+
+def test_everything_expires_once_after_a_long_stall():
+    clock = FakeClock()
+    wheel = TimingWheel(ttl=5, tick=1, clock=clock)
+    for i in range(5):
+        wheel.touch(f"early-{i}")
+    clock.now += 3
+    wheel.advance()
+    for i in range(5):
+        wheel.touch(f"late-{i}")
+
+    # Stalled for far longer than the wheel spans
+    clock.now += 10_000
+    expired = wheel.advance()
+    assert sorted(expired) == sorted([f"early-{i}" for i in range(5)] + [f"late-{i}" for i in range(5)])
+    assert len(wheel) == 0
+    assert wheel.advance() == []
+
+    # Slots are reused correctly after the stall
+    wheel.touch("after")
+    clock.now += 4
+    assert wheel.advance() == []
+    clock.now += 2
+    assert wheel.advance() == ["after"]
+
+
+def test_stall_shorter_than_the_wheel_keeps_fresh_keys():
+    clock = FakeClock()
+    wheel = TimingWheel(ttl=10, tick=1, clock=clock)
+    wheel.touch("old")
+    clock.now += 8
+    wheel.advance()
+    wheel.touch("fresh")
+    clock.now += 4
+    assert wheel.advance() == ["old"]
+    assert "fresh" in wheel
+
+
+def test_tracker_drops_members_after_a_stall():
+    clock = FakeClock()
+    tracker = PresenceTracker(ttl=45, tick=1, clock=clock, wall_clock=clock)
+    tracker.heartbeat("m1", "alice")
+    tracker.heartbeat("m1", "bob")
+    tracker.heartbeat("m2", "carol")
+    assert tracker.count("m1") == 2
+
+    clock.now += 3600
+    assert tracker.count("m1") == 0
+    assert not tracker.is_online("m2", "carol")
+    assert tracker.online("m1", 10) == ([], None)
+    assert tracker.stats()["expired"] == 3
+
+    assert tracker.heartbeat("m1", "alice") == 1
+
+
+def test_online_members_cursor_is_bound_to_its_meetup():
+    service = SupabaseService()
+    for meetup_id in ("m1", "m2"):
+        service.mock_memberships[meetup_id] = {"alice", "bob", "carol"}
+        for user_id in ("alice", "bob", "carol"):
+            service.presence.heartbeat(meetup_id, user_id)
+
+    async def scenario():
+        ok, _, first = await service.get_online_members(OnlineMembersRequest(meetup_id="m1", user_id="alice", limit=2))
+        assert ok and [m.user_id for m in first.members] == ["alice", "bob"]
+        _, _, rest = await service.get_online_members(
+            OnlineMembersRequest(meetup_id="m1", user_id="alice", limit=2, cursor=first.next_cursor)
+        )
+        assert [m.user_id for m in rest.members] == ["carol"]
+
+        with pytest.raises(ValueError):
+            await service.get_online_members(
+                OnlineMembersRequest(meetup_id="m2", user_id="alice", limit=2, cursor=first.next_cursor)
+            )
+
+    asyncio.run(scenario())
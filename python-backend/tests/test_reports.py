@@ -0,0 +1,146 @@
+import asyncio
+import uuid
+
+import pytest
+from pydantic import ValidationError
+
+from reports import BatchInserter, ReportModerator, RowsRejected
+from validators import SubmitReportRequest
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+class FakeTable:
+    """Accepts a batch only if none of its rows is poisoned, like one INSERT statement"""
+
+    def __init__(self, poisoned=(), down=False):
+        self.poisoned = set(poisoned)
+        self.down = down
+        self.rows = []
+        self.calls = 0
+
+    async def insert(self, rows):
+        self.calls += 1
+        if self.down:
+            raise ConnectionError("database unreachable")
+        if any(row["n"] in self.poisoned for row in rows):
+            raise RowsRejected("invalid input syntax for type uuid")
+        self.rows.extend(rows)
+
+
+def rows(count):
+    return [{"n": n} for n in range(count)]
+
+
+def test_a_rejected_row_is_dropped_and_the_rest_of_its_batch_written():
+    table = FakeTable(poisoned={13, 77})
+    writer = BatchInserter(table.insert, batch_size=100)
+
+    async def scenario():
+        for row in rows(250):
+            writer._pending.append(row)
+        await writer.flush()
+
+    run(scenario())
+    assert sorted(row["n"] for row in table.rows) == [n for n in range(250) if n not in (13, 77)]
+    assert writer.rejected == 2
+    assert writer.stats()["pending"] == 0
+    # Bisecting costs a few requests per bad row, not one per row
+    assert table.calls < 40
+
+
+def test_later_reports_are_not_stuck_behind_a_rejected_batch():
+    table = FakeTable(poisoned={0})
+    writer = BatchInserter(table.insert, batch_size=10, flush_seconds=0.01)
+
+    async def scenario():
+        writer.start()
+        for row in rows(25):
+            await writer.add(row)
+        await asyncio.sleep(0.1)
+        await writer.stop()
+
+    run(scenario())
+    assert len(table.rows) == 24
+    assert writer.failures == 0
+
+
+def test_unreachable_database_keeps_rows_for_the_next_flush():
+    table = FakeTable(down=True)
+    writer = BatchInserter(table.insert, batch_size=10, max_pending=15)
+
+    async def scenario():
+        writer._pending.extend(rows(20))
+        await writer.flush()
+        assert writer.failures == 1
+        # The oldest rows go first once the buffer is over its bound
+        assert [row["n"] for row in writer._pending] == list(range(5, 20))
+        table.down = False
+        await writer.flush()
+
+    run(scenario())
+    assert [row["n"] for row in table.rows] == list(range(5, 20))
+    assert writer.dropped == 5
+
+
+def test_failure_midway_through_bisecting_requeues_only_unwritten_rows():
+    table = FakeTable(poisoned={2})
+    writer = BatchInserter(table.insert, batch_size=8)
+    original = table.insert
+
+    async def flaky(batch):
+        # The first half of the split is written, then the database goes away
+        if table.rows:
+            table.down = True
+        await original(batch)
+
+    writer.insert = flaky
+
+    async def scenario():
+        writer._pending.extend(rows(8))
+        await writer.flush()
+
+    run(scenario())
+    written = [row["n"] for row in table.rows]
+    assert written == [0, 1]
+    # Nothing written is queued again, and the unwritten rows keep their order
+    assert [row["n"] for row in writer._pending] == [2, 3, 4, 5, 6, 7]
+
+
+def test_repeat_reports_are_neither_counted_nor_stored():
+    stored = []
+
+    async def insert(batch):
+        stored.extend(batch)
+
+    moderator = ReportModerator(insert, threshold=2)
+    report = {"meetup_id": "m", "target_type": "user", "target_id": "t", "reporter_id": "a"}
+
+    async def scenario():
+        assert not await moderator.submit(report)
+        assert not await moderator.submit(dict(report))
+        assert await moderator.submit(dict(report, reporter_id="b"))
+        # Crossing the threshold again in the same window does not act twice
+        assert not await moderator.submit(dict(report, reporter_id="c"))
+
+    run(scenario())
+    assert [row["reporter_id"] for row in stored] == ["a", "b", "c"]
+    assert moderator.repeats == 1
+
+
+def test_report_ids_must_be_uuids():
+    reporter = str(uuid.uuid4())
+    request = SubmitReportRequest(
+        meetup_id="m", reporter_id=reporter.upper(), target_type="message", target_id=str(uuid.uuid4())
+    )
+    assert request.reporter_id == reporter
+
+    for field in ("reporter_id", "target_id"):
+        fields = {"reporter_id": reporter, "target_id": str(uuid.uuid4()), field: "not-a-uuid"}
+        with pytest.raises(ValidationError):
+            SubmitReportRequest(meetup_id="m", target_type="message", **fields)
+
+    with pytest.raises(ValidationError):
+        SubmitReportRequest(meetup_id="m", reporter_id=reporter, target_type="user", target_id=reporter.upper())
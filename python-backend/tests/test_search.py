@@ -0,0 +1,59 @@
+import random
+
+import pytest
+
+from search import MessageSearchIndex, encode_cursor
+
+WORDS = ["pizza", "park", "meet", "gate", "late", "bring", "snacks", "north"]
+
+
+def index_of(count, seed=7):
+    rng = random.Random(seed)
+    index = MessageSearchIndex()
+    for n in range(count):
+        words = [rng.choice(WORDS) for _ in range(rng.randint(1, 8))]
+        index.add({"id": n, "meetup_id": "m", "message": " ".join(words)})
+    return index
+
+
+def pages(index, query, limit, cursor=None):
+    seen = []
+    while True:
+        hits, cursor = index.search("m", query, limit=limit, cursor=cursor)
+        seen.extend(msg["id"] for msg, _, _ in hits)
+        if cursor is None:
+            return seen
+
+
+@pytest.mark.parametrize("query", ["pizza", "pizza park", "late gate snacks"])
+def test_paging_returns_every_hit_once_in_rank_order(query):
+    index = index_of(500)
+    everything, cursor = index.search("m", query, limit=1000)
+    assert cursor is None and everything
+
+    ranks = [rank for _, rank, _ in everything]
+    assert ranks == sorted(ranks, reverse=True)
+    for limit in (1, 7, 50):
+        assert pages(index, query, limit) == [msg["id"] for msg, _, _ in everything]
+
+
+@pytest.mark.parametrize("query", ["pizza", "pizza park"])
+def test_cursor_survives_new_messages(query):
+    index = index_of(300)
+    first, cursor = index.search("m", query, limit=10)
+    before = pages(index, query, 10, cursor)
+
+    # New messages never reorder what is already indexed, so the rest of the
+    # listing only gains the new hits that rank after the cursor
+    for n in range(300, 400):
+        index.add({"id": n, "meetup_id": "m", "message": "pizza park pizza"})
+    after = pages(index, query, 10, cursor)
+    assert [n for n in after if n < 300] == before
+    assert not {msg["id"] for msg, _, _ in first} & set(after)
+
+
+def test_malformed_cursors_are_rejected():
+    index = index_of(50)
+    for cursor in ("not base64!", encode_cursor(0.5, "doc-id"), "e30"):
+        with pytest.raises(ValueError):
+            index.search("m", "pizza", cursor=cursor)
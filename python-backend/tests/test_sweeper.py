@@ -0,0 +1,109 @@
+import asyncio
+import os
+import tempfile
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from invites import InviteSigner
+from services import TOKEN_RETENTION, SupabaseService
+from sweeper import Sweeper, _HostLock, fcntl
+from validators import CreateMeetupRequest
+
+
+def lock_path():
+    return os.path.join(tempfile.mkdtemp(), "sweeper.lock")
+
+
+def batches(*counts):
+    """A job that returns the given batches in turn, then empty ones"""
+    calls = []
+
+    async def job(batch_size):
+        calls.append(batch_size)
+        return counts[len(calls) - 1] if len(calls) <= len(counts) else {"rows": 0}
+
+    job.calls = calls
+    return job
+
+
+def test_runs_each_job_until_a_short_batch():
+    busy = batches({"rows": 10}, {"rows": 10}, {"rows": 3})
+    quiet = batches({"rows": 0})
+    sweeper = Sweeper({"busy": busy, "quiet": quiet}, batch_size=10, lock_path=lock_path())
+
+    assert asyncio.run(sweeper.run_once()) == {"rows": 23}
+    assert len(busy.calls) == 3
+    assert len(quiet.calls) == 1
+    assert sweeper.stats()["totals"] == {"rows": 23}
+
+
+def test_a_run_stops_at_max_batches():
+    endless = batches(*[{"rows": 10}] * 100)
+    sweeper = Sweeper({"endless": endless}, batch_size=10, max_batches=4, lock_path=lock_path())
+
+    assert asyncio.run(sweeper.run_once()) == {"rows": 40}
+    assert len(endless.calls) == 4
+
+
+def test_job_locked_by_another_host_is_skipped_for_the_run():
+    async def locked(batch_size):
+        return None
+
+    other = batches({"rows": 1})
+    sweeper = Sweeper({"locked": locked, "other": other}, batch_size=10, lock_path=lock_path())
+
+    assert asyncio.run(sweeper.run_once()) == {"rows": 1}
+    assert sweeper.skipped_locked == 1
+
+
+@pytest.mark.skipif(fcntl is None, reason="no flock on this platform")
+def test_only_one_worker_per_host_sweeps():
+    path = lock_path()
+    job = batches({"rows": 1})
+    holder = _HostLock(path)
+    assert holder.acquire()
+    try:
+        sweeper = Sweeper({"job": job}, lock_path=path)
+        assert asyncio.run(sweeper.run_once()) == {}
+        assert sweeper.skipped_locked == 1 and sweeper.runs == 0
+        assert job.calls == []
+    finally:
+        holder.release()
+
+
+def test_sweep_archives_ended_meetups_and_purges_old_tokens():
+    service = SupabaseService()
+    # Only signed tokens are stored in mock mode
+    service.invites = InviteSigner(["current"])
+    now = datetime.now(timezone.utc)
+
+    async def scenario():
+        start = now + timedelta(hours=1)
+        ids = []
+        for title in ("Ended", "Upcoming"):
+            meetup_id, _, _ = await service.create_meetup(
+                CreateMeetupRequest(title=title, start_ts=start, end_ts=start + timedelta(hours=2), lat=39.95, lng=-75.16),
+                "host"
+            )
+            ids.append(meetup_id)
+        ended, upcoming = ids
+        service.meetup_index.get(ended)["end_ts"] = now - timedelta(minutes=1)
+        tokens = {token["meetup_id"]: token for token in service.mock_invite_tokens.values()}
+
+        # Expired, but still inside the retention window
+        tokens[upcoming]["expires_at"] = now - TOKEN_RETENTION + timedelta(hours=1)
+        stats = await service.sweep_expired(100)
+        assert stats == {"archived_meetups": 1, "revoked_tokens": 1, "purged_tokens": 0}
+        assert service.meetup_index.get(ended) is None
+        assert tokens[ended]["revoked_at"] is not None
+        assert tokens[upcoming]["revoked_at"] is None
+
+        tokens[upcoming]["expires_at"] = now - TOKEN_RETENTION - timedelta(hours=1)
+        stats = await service.sweep_expired(100)
+        assert stats == {"archived_meetups": 0, "revoked_tokens": 0, "purged_tokens": 1}
+        assert tokens[upcoming]["id"] not in service.mock_invite_tokens
+        # Revoked on archiving, but not expired: kept so the revocation still applies
+        assert tokens[ended]["id"] in service.mock_invite_tokens
+
+    asyncio.run(scenario())
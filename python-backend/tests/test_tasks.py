@@ -0,0 +1,124 @@
+import asyncio
+import json
+import os
+
+import pytest
+
+from tasks import TaskQueue
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+async def wait_until(condition, timeout=2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+
+def test_unfinished_jobs_are_replayed_in_order(tmp_path):
+    ran = []
+
+    async def first_run():
+        queue = TaskQueue(str(tmp_path), concurrency=1)
+        release = asyncio.Event()
+
+        async def handler(payload):
+            if payload["n"] > 0:
+                # Still running when the process stops
+                await release.wait()
+            ran.append(payload["n"])
+
+        queue.register("audit", handler)
+        queue.start()
+        for n in range(4):
+            assert queue.enqueue("audit", {"n": n})
+        await wait_until(lambda: ran == [0])
+        await queue.stop(timeout=0.05)
+
+    async def second_run():
+        queue = TaskQueue(str(tmp_path), concurrency=1)
+
+        async def handler(payload):
+            ran.append(payload["n"])
+
+        queue.register("audit", handler)
+        queue.start()
+        await wait_until(lambda: queue.completed == 3)
+        assert queue.replayed == 3
+        await queue.stop()
+
+    run(first_run())
+    assert ran == [0]
+    run(second_run())
+    # Job 0 finished before the stop and is not run again
+    assert ran == [0, 1, 2, 3]
+
+    async def third_run():
+        queue = TaskQueue(str(tmp_path))
+        queue.register("audit", lambda payload: asyncio.sleep(0))
+        queue.start()
+        assert queue.replayed == 0
+        await queue.stop()
+
+    run(third_run())
+
+
+def test_replay_ignores_a_torn_final_line(tmp_path):
+    path = os.path.join(str(tmp_path), "journal-0.jsonl")
+    with open(path, "w") as f:
+        f.write(json.dumps({"op": "add", "id": "a", "name": "audit", "payload": {"n": 1}}) + "\n")
+        f.write(json.dumps({"op": "add", "id": "b", "name": "audit", "payload": {"n": 2}}) + "\n")
+        f.write(json.dumps({"op": "done", "id": "a"}) + "\n")
+        f.write('{"op": "add", "id": "c", "na')
+
+    ran = []
+
+    async def scenario():
+        queue = TaskQueue(str(tmp_path))
+
+        async def handler(payload):
+            ran.append(payload["n"])
+
+        queue.register("audit", handler)
+        queue.start()
+        await wait_until(lambda: queue.completed == 1)
+        await queue.stop()
+
+    run(scenario())
+    assert ran == [2]
+
+
+def test_failed_jobs_are_retried_until_they_succeed(tmp_path, monkeypatch):
+    monkeypatch.setattr("tasks.TASK_RETRY_BASE_SECONDS", 0.001)
+    attempts = []
+
+    async def scenario():
+        queue = TaskQueue(str(tmp_path))
+
+        async def flaky(payload):
+            attempts.append(payload)
+            if len(attempts) < 3:
+                raise RuntimeError("transient")
+
+        queue.register("audit", flaky)
+        queue.start()
+        queue.enqueue("audit", {"n": 1})
+        await wait_until(lambda: queue.completed == 1)
+        assert queue.retried == 2 and queue.dead == 0
+        await queue.stop()
+
+    run(scenario())
+    assert len(attempts) == 3
+
+
+def test_enqueue_rejects_unknown_tasks_and_a_stopped_queue(tmp_path):
+    queue = TaskQueue(str(tmp_path))
+    queue.register("audit", lambda payload: asyncio.sleep(0))
+    with pytest.raises(ValueError):
+        queue.enqueue("unknown", {})
+    # Not started: the caller has to do the work itself
+    assert not queue.enqueue("audit", {})
+    assert queue.rejected == 1
@@ -0,0 +1,83 @@
+import asyncio
+
+import pytest
+
+import services
+from services import SupabaseService
+from storage import UploadOffsetMismatch, UploadTooLarge
+from validators import CreateUploadRequest
+
+MEETUP_ID = "meetup-1"
+
+
+def upload(length, user_id="alice"):
+    return CreateUploadRequest(user_id=user_id, filename="notes.txt", file_type="note", length=length)
+
+
+async def body(*chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+def test_oversized_file_is_refused_up_front():
+    service = SupabaseService()
+    with pytest.raises(UploadTooLarge):
+        asyncio.run(service.create_upload(MEETUP_ID, upload(services.MAX_FILE_BYTES + 1)))
+    assert service.mock_uploads == {}
+
+
+def test_pending_uploads_count_against_the_meetup_quota(monkeypatch):
+    monkeypatch.setattr(services, "MAX_MEETUP_BYTES", 1000)
+    monkeypatch.setattr(services, "MAX_FILES_PER_MEETUP", 3)
+    service = SupabaseService()
+
+    async def scenario():
+        first = (await service.create_upload(MEETUP_ID, upload(600)))[2]
+        with pytest.raises(UploadTooLarge):
+            await service.create_upload(MEETUP_ID, upload(500))
+        # Other meetups have their own quota
+        assert (await service.create_upload("meetup-2", upload(500)))[0]
+
+        # Completed files count by their size, like pending ones do
+        await service.append_upload(first.upload_id, "alice", 0, body(b"x" * 600))
+        assert (await service.create_upload(MEETUP_ID, upload(200)))[0]
+        assert (await service.create_upload(MEETUP_ID, upload(100)))[0]
+        with pytest.raises(UploadTooLarge):
+            await service.create_upload(MEETUP_ID, upload(1))
+
+    asyncio.run(scenario())
+
+
+def test_body_longer_than_declared_is_cut_off_and_can_resume():
+    service = SupabaseService()
+
+    async def scenario():
+        created = (await service.create_upload(MEETUP_ID, upload(10)))[2]
+
+        with pytest.raises(UploadTooLarge):
+            await service.append_upload(created.upload_id, "alice", 0, body(b"hello", b"world!"))
+        # The chunk that overflowed is not written; what came before it is kept
+        status = (await service.upload_status(created.upload_id, "alice"))[2]
+        assert status.offset == 5 and status.file_id is None
+
+        with pytest.raises(UploadOffsetMismatch):
+            await service.append_upload(created.upload_id, "alice", 0, body(b"world"))
+        ok, _, done = await service.append_upload(created.upload_id, "alice", 5, body(b"world"))
+        assert ok and done.offset == 10 and done.file_id is not None
+        assert service.mock_files[done.file_id]["size_bytes"] == 10
+
+        with pytest.raises(UploadOffsetMismatch):
+            await service.append_upload(created.upload_id, "alice", 10, body(b"!"))
+
+    asyncio.run(scenario())
+
+
+def test_uploads_belong_to_their_user():
+    service = SupabaseService()
+
+    async def scenario():
+        created = (await service.create_upload(MEETUP_ID, upload(10)))[2]
+        assert await service.upload_status(created.upload_id, "mallory") == (False, "Upload not found", None)
+        assert (await service.append_upload(created.upload_id, "mallory", 0, body(b"x")))[0] is False
+
+    asyncio.run(scenario())
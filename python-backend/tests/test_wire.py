@@ -0,0 +1,137 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+from pydantic import BaseModel
+from starlette.requests import Request
+from typing import List
+
+import wire
+from wire import COLUMNAR_JSON, JSON, MSGPACK, CompressionMiddleware, list_response, negotiate_encoding, negotiate_format, to_columnar
+
+
+@pytest.fixture
+def without(monkeypatch):
+    """Negotiation sees both optional codecs as installed, except those hidden with without(name)"""
+    for name in ("msgpack", "brotli"):
+        monkeypatch.setitem(wire._optional_modules, name, object())
+
+    def hide(name):
+        monkeypatch.setitem(wire._optional_modules, name, None)
+    return hide
+
+
+def test_format_follows_accept_and_defaults_to_json(without):
+    assert negotiate_format(None) == JSON
+    assert negotiate_format("text/html") == JSON
+    assert negotiate_format("*/*") == JSON
+    assert negotiate_format(f"{MSGPACK}, {JSON};q=0.5") == MSGPACK
+    assert negotiate_format(f"{MSGPACK};q=0.2, {COLUMNAR_JSON}") == COLUMNAR_JSON
+    # q=0 means "not this one"
+    assert negotiate_format(f"{MSGPACK};q=0") == JSON
+
+    without("msgpack")
+    assert negotiate_format(f"{MSGPACK}, {COLUMNAR_JSON};q=0.1") == COLUMNAR_JSON
+
+
+def test_encoding_prefers_brotli_on_ties_and_respects_q(without):
+    assert negotiate_encoding(None) is None
+    assert negotiate_encoding("identity") is None
+    assert negotiate_encoding("gzip, br") == "br"
+    assert negotiate_encoding("*") == "br"
+    assert negotiate_encoding("br;q=0.5, gzip") == "gzip"
+
+    without("brotli")
+    assert negotiate_encoding("br") is None
+    assert negotiate_encoding("br, gzip;q=0.1") == "gzip"
+
+
+def test_columnar_hoists_constants_and_flattens_nested_rows():
+    payload = {"total": 2, "messages": [
+        {"id": 1, "meetup_id": "m", "user": {"name": "a"}},
+        {"id": 2, "meetup_id": "m", "user": {"name": "b"}},
+    ]}
+    assert to_columnar(payload, "messages") == {"total": 2, "messages": {
+        "length": 2,
+        "constants": {"meetup_id": "m"},
+        "columns": {"id": [1, 2], "user.name": ["a", "b"]},
+    }}
+    assert to_columnar({"messages": []}, "messages")["messages"] == {"length": 0, "constants": {}, "columns": {}}
+
+
+class Row(BaseModel):
+    id: int
+    meetup_id: str
+
+
+class Page(BaseModel):
+    rows: List[Row]
+
+
+def client(rows: int) -> TestClient:
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware)
+
+    @app.get("/rows")
+    async def get_rows(request: Request):
+        return list_response(request, Page(rows=[Row(id=i, meetup_id="m") for i in range(rows)]), "rows")
+
+    @app.get("/stream")
+    async def stream():
+        async def chunks():
+            for _ in range(rows):
+                yield b"x" * 512
+        return StreamingResponse(chunks(), headers={"ETag": '"v1"'})
+
+    @app.get("/ranged")
+    async def ranged():
+        return StreamingResponse(iter([b"x" * 4096]), headers={"Accept-Ranges": "bytes"})
+
+    return TestClient(app)
+
+
+def test_list_response_renders_each_format():
+    api = client(3)
+    expected = {"rows": [{"id": i, "meetup_id": "m"} for i in range(3)]}
+
+    response = api.get("/rows")
+    assert response.headers["content-type"] == JSON
+    assert response.json() == expected
+    assert "Accept" in response.headers["vary"]
+
+    response = api.get("/rows", headers={"Accept": COLUMNAR_JSON})
+    assert response.json()["rows"]["columns"] == {"id": [0, 1, 2]}
+
+    msgpack = pytest.importorskip("msgpack")
+    response = api.get("/rows", headers={"Accept": MSGPACK})
+    assert response.headers["content-type"] == MSGPACK
+    assert msgpack.unpackb(response.content) == expected
+
+
+def test_small_bodies_are_sent_uncompressed():
+    response = client(3).get("/rows", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+
+
+def test_large_and_streamed_bodies_are_compressed(without):
+    without("brotli")
+    api = client(200)
+
+    response = api.get("/rows", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert len(response.json()["rows"]) == 200
+    assert "Accept-Encoding" in response.headers["vary"]
+
+    # Streamed: the strong ETag gets the encoding suffix and the body is one gzip stream
+    response = api.get("/stream", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["etag"] == '"v1-gzip"'
+    assert "content-length" not in response.headers
+    assert response.content == b"x" * 512 * 200
+
+
+def test_ranged_responses_are_left_alone():
+    api = client(1)
+    response = api.get("/ranged", headers={"Accept-Encoding": "gzip, br"})
+    assert "content-encoding" not in response.headers
+    assert response.content == b"x" * 4096
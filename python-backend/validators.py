@@ -2,10 +2,20 @@
 Request validation models for the PennApps Meetup API
 """
 
-from datetime import datetime
+from datetime import datetime, timezone
 from typing import Optional, Literal, List
 from pydantic import BaseModel, Field, validator
 import re
+import uuid
+
+from invites import SIGNED_TOKEN_PATTERN
+
+
+def _as_utc(v: Optional[datetime]) -> Optional[datetime]:
+    """Naive datetimes are taken as UTC, so request times always compare with each other"""
+    if v is None:
+        return v
+    return v.replace(tzinfo=timezone.utc) if v.tzinfo is None else v.astimezone(timezone.utc)
 
 
 class CreateMeetupRequest(BaseModel):
@@ -19,6 +29,10 @@ class CreateMeetupRequest(BaseModel):
     visibility: Literal["private", "public"] = Field("private", description="Meetup visibility")
     token_ttl_hours: Optional[int] = Field(None, ge=1, le=168, description="Token TTL in hours")
 
+    @validator('start_ts', 'end_ts')
+    def validate_utc(cls, v):
+        return _as_utc(v)
+
     @validator('title')
     def validate_title(cls, v):
         if not v or not v.strip():
@@ -59,7 +73,10 @@ class AcceptInviteRequest(BaseModel):
         # Allow demo tokens and mock tokens for testing
         if v in ['demo123abc'] or v.startswith('mock'):
             return v
-        # For production tokens, expect 32 hex chars
+        # Signed tokens (see invites.py); their signature is checked when the invite is accepted
+        if re.match(SIGNED_TOKEN_PATTERN, v):
+            return v
+        # For legacy production tokens, expect 32 hex chars
         if not re.match(r'^[a-f0-9]{32}$', v):
             raise ValueError('Invalid token format')
         return v
@@ -147,3 +164,243 @@ class ErrorResponse(BaseModel):
     success: bool = False
     error: str
     details: Optional[str] = None
+
+
+class SearchMessagesRequest(BaseModel):
+    """Request model for searching a meetup chat"""
+    meetup_id: str = Field(..., min_length=1, description="Meetup ID")
+    user_id: str = Field(..., min_length=1, description="User ID")
+    query: str = Field(..., min_length=1, max_length=200, description="Search text")
+    limit: int = Field(20, ge=1, le=50, description="Number of hits to retrieve")
+    cursor: Optional[str] = Field(None, max_length=200, description="Cursor from a previous page")
+
+    @validator('query')
+    def validate_query(cls, v):
+        if not v or not v.strip():
+            raise ValueError('Query cannot be empty')
+        return v.strip()
+
+
+class MessageSearchHit(BaseModel):
+    """A single ranked search hit"""
+    message: MessageResponse
+    rank: float
+    highlight: str
+
+
+class SearchMessagesResponse(BaseModel):
+    """Response model for searching a meetup chat"""
+    hits: List[MessageSearchHit]
+    next_cursor: Optional[str] = None
+
+
+class SearchMeetupsRequest(BaseModel):
+    """Request model for searching meetups"""
+    user_id: str = Field(..., min_length=1, description="User ID")
+    q: str = Field(..., min_length=1, max_length=200, description="Search text")
+    start: Optional[datetime] = Field(None, description="Only meetups still running at or after this time")
+    end: Optional[datetime] = Field(None, description="Only meetups starting at or before this time")
+    lat: Optional[float] = Field(None, ge=-90, le=90, description="Latitude of the search center")
+    lng: Optional[float] = Field(None, ge=-180, le=180, description="Longitude of the search center")
+    radius_m: Optional[float] = Field(None, gt=0, le=50000, description="Search radius in meters")
+    limit: int = Field(20, ge=1, le=50, description="Number of meetups to retrieve")
+
+    @validator('start', 'end')
+    def validate_utc(cls, v):
+        return _as_utc(v)
+
+    @validator('q')
+    def validate_q(cls, v):
+        if not v or not v.strip():
+            raise ValueError('Query cannot be empty')
+        return v.strip()
+
+    @validator('end')
+    def validate_end_after_start(cls, v, values):
+        if v is not None and values.get('start') is not None and v < values['start']:
+            raise ValueError('End of the time window must be after its start')
+        return v
+
+    @validator('radius_m')
+    def validate_location(cls, v, values):
+        has_center = values.get('lat') is not None and values.get('lng') is not None
+        if v is not None and not has_center:
+            raise ValueError('lat and lng are required with radius_m')
+        return v
+
+
+class MeetupSummary(BaseModel):
+    """A meetup as listed in search and discovery results"""
+    id: str
+    title: str
+    description: Optional[str] = None
+    start_ts: datetime
+    end_ts: datetime
+    lat: float
+    lng: float
+    visibility: str
+    attendee_count: int = 0
+    is_member: bool = False
+    score: Optional[float] = None
+
+
+class SearchMeetupsResponse(BaseModel):
+    """Response model for searching meetups"""
+    meetups: List[MeetupSummary]
+
+
+class ActiveMeetupsRequest(BaseModel):
+    """Request model for listing meetups running during a time window"""
+    user_id: str = Field(..., min_length=1, description="User ID")
+    at: Optional[datetime] = Field(None, description="Start of the window (default: now)")
+    until: Optional[datetime] = Field(None, description="End of the window (default: same as at)")
+    limit: int = Field(20, ge=1, le=50, description="Number of meetups to retrieve")
+    cursor: Optional[str] = Field(None, max_length=200, description="Cursor from a previous page")
+
+    @validator('at', 'until')
+    def validate_utc(cls, v):
+        return _as_utc(v)
+
+    @validator('until')
+    def validate_until_after_at(cls, v, values):
+        if v is not None and values.get('at') is not None and v < values['at']:
+            raise ValueError('End of the time window must be after its start')
+        return v
+
+
+class ActiveMeetupsResponse(BaseModel):
+    """Response model for listing meetups running during a time window"""
+    meetups: List[MeetupSummary]
+    next_cursor: Optional[str] = None
+
+
+class CreateUploadRequest(BaseModel):
+    """Request model for starting a resumable file upload"""
+    user_id: str = Field(..., min_length=1, description="User ID")
+    filename: str = Field(..., min_length=1, max_length=255, description="Original file name")
+    file_type: Literal["image", "pdf", "note"] = Field(..., description="File type")
+    length: int = Field(..., gt=0, description="Total size of the file in bytes")
+
+    @validator('filename')
+    def validate_filename(cls, v):
+        v = v.strip()
+        if not v or '/' in v or '\\' in v or v in ('.', '..'):
+            raise ValueError('Invalid file name')
+        return v
+
+
+class UploadStatusResponse(BaseModel):
+    """Progress of a resumable upload"""
+    upload_id: str
+    offset: int
+    length: int
+    expires_at: Optional[datetime] = None
+    file_id: Optional[str] = None
+
+
+class SubmitReportRequest(BaseModel):
+    """Request model for reporting a user, message or file"""
+    meetup_id: str = Field(..., min_length=1, description="Meetup ID")
+    reporter_id: str = Field(..., min_length=1, description="User ID of the reporter")
+    target_type: Literal["user", "message", "file"] = Field(..., description="What is being reported")
+    target_id: str = Field(..., min_length=1, description="ID of the reported user, message or file")
+    reason: Optional[str] = Field(None, max_length=500, description="Reason for the report")
+
+    @validator('reporter_id', 'target_id')
+    def validate_uuid(cls, v):
+        # Both are UUID columns; one malformed row would fail its whole insert batch
+        try:
+            return str(uuid.UUID(v))
+        except ValueError:
+            raise ValueError('Must be a valid UUID')
+
+    @validator('target_id')
+    def validate_not_self(cls, v, values):
+        if values.get('target_type') == 'user' and v == values.get('reporter_id'):
+            raise ValueError('You cannot report yourself')
+        return v
+
+
+class SubmitReportResponse(BaseModel):
+    """Response model for reporting"""
+    success: bool
+    message: str
+    auto_soft_banned: bool = False
+
+
+class HeartbeatRequest(BaseModel):
+    """Request model for a presence heartbeat"""
+    user_id: str = Field(..., min_length=1, description="User ID")
+
+
+class PresenceResponse(BaseModel):
+    """Response model for presence heartbeats"""
+    online_count: int
+    heartbeat_seconds: float
+
+
+class OnlineMember(BaseModel):
+    """A member who is currently online"""
+    user_id: str
+    last_seen: datetime
+
+
+class OnlineMembersRequest(BaseModel):
+    """Request model for listing who is online in a meetup"""
+    meetup_id: str = Field(..., min_length=1, description="Meetup ID")
+    user_id: str = Field(..., min_length=1, description="User ID")
+    limit: int = Field(50, ge=1, le=200, description="Number of members to retrieve")
+    cursor: Optional[str] = Field(None, max_length=200, description="Cursor from a previous page")
+
+
+class OnlineMembersResponse(BaseModel):
+    """Response model for listing who is online in a meetup"""
+    online_count: int
+    members: List[OnlineMember]
+    next_cursor: Optional[str] = None
+
+
+class HomeRequest(BaseModel):
+    """Request model for the home screen"""
+    user_id: str = Field(..., min_length=1, description="User ID")
+    lat: Optional[float] = Field(None, ge=-90, le=90, description="Latitude of the user, for nearby meetups")
+    lng: Optional[float] = Field(None, ge=-180, le=180, description="Longitude of the user, for nearby meetups")
+    radius_m: float = Field(2000, gt=0, le=50000, description="Radius for nearby meetups in meters")
+    limit: int = Field(10, ge=1, le=50, description="Number of meetups per section")
+    message_limit: int = Field(20, ge=1, le=100, description="Number of recent messages")
+
+    @validator('lng', always=True)
+    def validate_location(cls, v, values):
+        if (v is None) != (values.get('lat') is None):
+            raise ValueError('lat and lng must be given together')
+        return v
+
+
+class HomeResponse(BaseModel):
+    """
+    Response model for the home screen
+    Sections that failed or timed out are null and listed in missing;
+    nearby is empty without a location.
+    """
+    joined: Optional[List[MeetupSummary]] = None
+    nearby: Optional[List[MeetupSummary]] = None
+    recent_messages: Optional[List[MessageResponse]] = None
+    missing: List[str] = []
+
+
+class ExportRequest(BaseModel):
+    """Request model for exporting a meetup's data"""
+    meetup_id: str = Field(..., min_length=1, description="Meetup ID")
+    user_id: str = Field(..., min_length=1, description="User ID of the host")
+    format: Literal["ndjson", "csv"] = Field("ndjson", description="Output format")
+    sections: List[Literal["messages", "memberships", "soft_ban_events"]] = Field(
+        ["messages", "memberships", "soft_ban_events"], min_length=1, description="What to export, in order"
+    )
+
+    @validator('sections')
+    def validate_sections(cls, v, values):
+        if len(set(v)) != len(v):
+            raise ValueError('Sections must not repeat')
+        if values.get('format') == 'csv' and len(v) != 1:
+            raise ValueError('CSV exports take exactly one section')
+        return v
@@ -0,0 +1,86 @@
+"""
+Per-meetup version stamps for conditional GETs
+
+Every write that changes what a meetup read returns (new message, membership
+change, soft-ban) bumps the meetup's version. Read endpoints derive a strong
+ETag from the version plus the request variant, so If-None-Match can be
+answered with 304 Not Modified without touching the database. A 304 is only
+sent to callers the full response would be sent to.
+
+Versions live in process memory and are bumped by the write paths in this
+worker. Each process stamps its ETags with a random epoch, so a restart (or
+a request landing on a different worker) produces a new ETag and a full
+response rather than a stale 304. Writes this worker does not see (another
+worker's, or the web client inserting messages directly) are picked up
+because stamps also roll over every ETAG_MAX_STALE_SECONDS: a 304 is never
+more stale than that.
+"""
+
+import hashlib
+import os
+import time
+import uuid
+from typing import Callable, Dict, Optional
+
+ETAG_MAX_STALE_SECONDS = float(os.getenv("ETAG_MAX_STALE_SECONDS", "10"))
+
+
+class MeetupVersions:
+    """In-process version counters keyed by meetup ID"""
+
+    def __init__(self, max_stale: float = ETAG_MAX_STALE_SECONDS, clock: Callable[[], float] = time.monotonic):
+        self.epoch = uuid.uuid4().hex[:8]
+        self.max_stale = max_stale
+        self.clock = clock
+        self._versions: Dict[str, int] = {}
+
+    def get(self, meetup_id: str) -> int:
+        return self._versions.get(meetup_id, 0)
+
+    def bump(self, meetup_id: str) -> int:
+        """Record a change to a meetup and return its new version"""
+        version = self._versions.get(meetup_id, 0) + 1
+        self._versions[meetup_id] = version
+        return version
+
+    def stamp(self, meetup_id: str) -> str:
+        """The meetup's version, changing at least every max_stale seconds"""
+        return f"{self.epoch}-{self.get(meetup_id)}-{int(self.clock() // self.max_stale)}"
+
+
+def meetup_etag(meetup_id: str, version: str, *variant: object) -> str:
+    """
+    Strong ETag for a read of meetup_id at version
+    variant holds everything else the response depends on (user, page, ...).
+    """
+    digest = hashlib.blake2b(
+        "\x1f".join([meetup_id, *(str(v) for v in variant)]).encode(),
+        digest_size=8
+    ).hexdigest()
+    return f'"{version}-{digest}"'
+
+
+def matching_etag(if_none_match: Optional[str], etag: str) -> Optional[str]:
+    """
+    The entity tag in an If-None-Match header that matches etag (weak
+    comparison, as RFC 9110 requires), or None
+    It is returned as the client sent it, encoding suffix included, so a 304
+    carries the same ETag as the response the client has cached.
+    """
+    if not if_none_match:
+        return None
+    if if_none_match.strip() == "*":
+        return etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if _strip_encoding_suffix(candidate.removeprefix("W/")) == etag:
+            return candidate
+    return None
+
+
+def _strip_encoding_suffix(etag: str) -> str:
+    """Undo the Content-Encoding suffix CompressionMiddleware adds to compressed responses"""
+    for suffix in ('-gzip"', '-br"'):
+        if etag.endswith(suffix):
+            return etag[:-len(suffix)] + '"'
+    return etag
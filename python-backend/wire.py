@@ -0,0 +1,286 @@
+"""
+Response encoding negotiation for mobile clients
+
+Two independent layers:
+
+- Body format, chosen from the Accept header for list responses:
+    application/json                         the default, one object per row
+    application/vnd.pennapps.columnar+json   rows transposed into columns, with
+                                             columns that hold a single value
+                                             for every row hoisted out once
+    application/msgpack                      MessagePack of the default shape
+                                             (needs the optional msgpack package)
+
+- Content-Encoding, chosen from Accept-Encoding by CompressionMiddleware:
+  br (needs the optional brotli package) or gzip, for bodies of at least
+  COMPRESSION_MIN_BYTES.
+
+Install the optional packages with: pip install msgpack brotli
+"""
+
+import gzip
+import importlib
+import json
+import zlib
+from typing import Optional, Dict, Any, List, Tuple
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+JSON = "application/json"
+COLUMNAR_JSON = "application/vnd.pennapps.columnar+json"
+MSGPACK = "application/msgpack"
+
+# Below this size compression costs more CPU than it saves on the wire
+COMPRESSION_MIN_BYTES = 1024
+
+
+_optional_modules: Dict[str, Any] = {}
+
+
+def _optional(name: str) -> Any:
+    """Import an optional codec on first use (keeps it off the cold-start path); None if not installed"""
+    if name not in _optional_modules:
+        try:
+            _optional_modules[name] = importlib.import_module(name)
+        except ImportError:
+            _optional_modules[name] = None
+    return _optional_modules[name]
+
+
+def available_formats() -> List[str]:
+    return [JSON, COLUMNAR_JSON] + ([MSGPACK] if _optional("msgpack") is not None else [])
+
+
+def available_encodings() -> List[str]:
+    return (["br"] if _optional("brotli") is not None else []) + ["gzip"]
+
+
+def _parse_accept(header: Optional[str]) -> List[Tuple[str, float]]:
+    """(token, q) pairs from an Accept or Accept-Encoding header, best first"""
+    if not header:
+        return []
+    entries = []
+    for part in header.split(","):
+        token, _, params = part.strip().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if token and q > 0:
+            entries.append((token.strip().lower(), q))
+    return sorted(entries, key=lambda e: -e[1])
+
+
+def negotiate_format(accept: Optional[str]) -> str:
+    """Pick the body format for a list response; JSON unless a compact one is asked for"""
+    formats = available_formats()
+    for token, _ in _parse_accept(accept):
+        if token in formats:
+            return token
+        if token in ("*/*", "application/*"):
+            return JSON
+    return JSON
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Pick a Content-Encoding, preferring brotli on ties"""
+    encodings = available_encodings()
+    best: Optional[Tuple[float, int, str]] = None
+    for token, q in _parse_accept(accept_encoding):
+        candidates = encodings if token == "*" else [token]
+        for encoding in candidates:
+            if encoding in encodings:
+                rank = (q, -encodings.index(encoding), encoding)
+                if best is None or rank > best:
+                    best = rank
+    return best[2] if best else None
+
+
+def _flatten(row: Dict[str, Any], prefix: str = "") -> Dict[str, Any]:
+    """Nested objects become dotted keys: {"message": {"id": 1}} -> {"message.id": 1}"""
+    flat: Dict[str, Any] = {}
+    for name, value in row.items():
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f"{prefix}{name}."))
+        else:
+            flat[f"{prefix}{name}"] = value
+    return flat
+
+
+def to_columnar(payload: Dict[str, Any], list_key: str) -> Dict[str, Any]:
+    """
+    Transpose payload[list_key] from rows to columns
+
+    {"messages": [{"id": 1, "meetup_id": "m"}, {"id": 2, "meetup_id": "m"}]}
+    becomes
+    {"messages": {"length": 2, "constants": {"meetup_id": "m"}, "columns": {"id": [1, 2]}}}
+
+    Nested objects are flattened to dotted column names.
+    """
+    rows = [_flatten(row) for row in payload.get(list_key) or []]
+    names: List[str] = list(rows[0].keys()) if rows else []
+    constants: Dict[str, Any] = {}
+    columns: Dict[str, List[Any]] = {}
+    for name in names:
+        values = [row.get(name) for row in rows]
+        if all(v == values[0] for v in values):
+            constants[name] = values[0]
+        else:
+            columns[name] = values
+    return dict(payload, **{list_key: {"length": len(rows), "constants": constants, "columns": columns}})
+
+
+def encode_body(payload: Dict[str, Any], list_key: str, media_type: str) -> bytes:
+    """Serialise an already JSON-compatible payload in the given format"""
+    if media_type == COLUMNAR_JSON:
+        payload = to_columnar(payload, list_key)
+    if media_type == MSGPACK:
+        return _optional("msgpack").packb(payload, use_bin_type=True)
+    return json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def list_response(
+    request: Request,
+    model: BaseModel,
+    list_key: str,
+    headers: Optional[Dict[str, str]] = None
+) -> Response:
+    """
+    Render a list response model in the format the client asked for
+    Pass the list field's name so columnar clients get it transposed.
+    """
+    media_type = negotiate_format(request.headers.get("accept"))
+    payload = jsonable_encoder(model)
+    headers = dict(headers or {}, Vary="Accept, Accept-Encoding")
+    if media_type == JSON:
+        return JSONResponse(payload, headers=headers)
+    return Response(encode_body(payload, list_key, media_type), media_type=media_type, headers=headers)
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return _optional("brotli").compress(body, quality=5)
+    return gzip.compress(body, compresslevel=6)
+
+
+class _Compressor:
+    """Incremental compressor for one response body"""
+
+    def __init__(self, encoding: str):
+        if encoding == "br":
+            self._impl = _optional("brotli").Compressor(quality=5)
+            self._finish = self._impl.finish
+            self._chunk = self._impl.process
+        else:
+            self._impl = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+            self._finish = self._impl.flush
+            self._chunk = self._impl.compress
+
+    def chunk(self, data: bytes) -> bytes:
+        return self._chunk(data)
+
+    def finish(self) -> bytes:
+        return self._finish()
+
+
+class CompressionMiddleware:
+    """
+    Compress response bodies with the best Content-Encoding the client accepts
+
+    Bodies are buffered only until COMPRESSION_MIN_BYTES is reached, so
+    streamed responses stay streamed. Responses that already carry a
+    Content-Encoding or advertise Accept-Ranges are passed through untouched. Strong ETags get an
+    encoding suffix, since the compressed bytes are a different
+    representation (matching_etag() strips it again).
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = COMPRESSION_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start: Optional[Message] = None
+        buffered: List[bytes] = []
+        buffered_size = 0
+        compressor: Optional[_Compressor] = None
+        passthrough = False
+
+        async def send_compressed(message: Message) -> None:
+            nonlocal start, buffered_size, compressor, passthrough
+
+            if message["type"] == "http.response.start":
+                start = message
+                headers = Headers(raw=message["headers"])
+                # Ranged downloads must keep their byte offsets, so leave them as they are
+                passthrough = (
+                    "content-encoding" in headers
+                    or "accept-ranges" in headers
+                    or message["status"] in (204, 304)
+                )
+                if passthrough:
+                    await send(message)
+                return
+
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if compressor is None:
+                buffered.append(body)
+                buffered_size += len(body)
+                if buffered_size < self.minimum_size:
+                    if more_body:
+                        return
+                    # Small complete body: send it as-is
+                    passthrough = True
+                    await send(start)
+                    await send({"type": "http.response.body", "body": b"".join(buffered)})
+                    return
+
+                compressor = _Compressor(encoding)
+                headers = MutableHeaders(raw=start["headers"])
+                headers["Content-Encoding"] = encoding
+                if "accept-encoding" not in headers.get("vary", "").lower():
+                    headers.add_vary_header("Accept-Encoding")
+                etag = headers.get("etag")
+                if etag and not etag.startswith("W/") and etag.endswith('"'):
+                    headers["ETag"] = f'{etag[:-1]}-{encoding}"'
+                if "content-length" in headers:
+                    del headers["content-length"]
+                if not more_body:
+                    data = compressor.chunk(b"".join(buffered)) + compressor.finish()
+                    headers["Content-Length"] = str(len(data))
+                    await send(start)
+                    await send({"type": "http.response.body", "body": data})
+                    return
+                await send(start)
+                body = b"".join(buffered)
+
+            data = compressor.chunk(body)
+            if not more_body:
+                data += compressor.finish()
+            await send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
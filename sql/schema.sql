@@ -4,6 +4,12 @@
 -- Enable UUID extension
 CREATE EXTENSION IF NOT EXISTS "uuid-ossp";
 
+-- Enable btree_gin so meetup_id can share a GIN index with tsvector columns
+CREATE EXTENSION IF NOT EXISTS btree_gin;
+
+-- Enable trigram matching for typo-tolerant meetup search
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
 -- Create custom types
 CREATE TYPE role AS ENUM ('host', 'admin', 'member');
 CREATE TYPE message_type AS ENUM ('chat', 'announcement');
@@ -36,6 +42,7 @@ CREATE TABLE meetups (
     is_archived BOOLEAN DEFAULT FALSE,
     created_at TIMESTAMPTZ DEFAULT NOW(),
     ended_at TIMESTAMPTZ,
+    messages_archived_at TIMESTAMPTZ,
     attendee_count INTEGER DEFAULT 0,
     files_count INTEGER DEFAULT 0,
     total_bytes BIGINT DEFAULT 0
@@ -71,7 +78,8 @@ CREATE TABLE messages (
     type message_type NOT NULL DEFAULT 'chat',
     text TEXT NOT NULL,
     parent_id UUID REFERENCES messages(id) ON DELETE CASCADE,
-    created_at TIMESTAMPTZ DEFAULT NOW()
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    search_vector TSVECTOR GENERATED ALWAYS AS (to_tsvector('english', text)) STORED
 );
 
 -- Files table
@@ -89,6 +97,37 @@ CREATE TABLE files (
     deleted_at TIMESTAMPTZ
 );
 
+-- Thumbnails and previews of image files, content-addressed by the SHA-256
+-- of the original so identical uploads share one set of objects
+CREATE TABLE file_derivatives (
+    file_id UUID NOT NULL REFERENCES files(id) ON DELETE CASCADE,
+    variant TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    storage_path TEXT NOT NULL,
+    width INTEGER NOT NULL,
+    height INTEGER NOT NULL,
+    size_bytes BIGINT NOT NULL,
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    PRIMARY KEY (file_id, variant)
+);
+
+-- In-progress resumable uploads; their declared length counts against the
+-- meetup's quota until they complete or expire
+CREATE TABLE file_uploads (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    meetup_id UUID NOT NULL REFERENCES meetups(id) ON DELETE CASCADE,
+    user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    type file_type NOT NULL,
+    storage_path TEXT NOT NULL,
+    filename TEXT,
+    upload_length BIGINT NOT NULL,
+    upload_ref TEXT,
+    file_id UUID REFERENCES files(id) ON DELETE SET NULL,
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    expires_at TIMESTAMPTZ NOT NULL DEFAULT NOW() + INTERVAL '24 hours',
+    completed_at TIMESTAMPTZ
+);
+
 -- Reports table
 CREATE TABLE reports (
     id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
@@ -110,11 +149,36 @@ CREATE TABLE soft_ban_events (
     created_at TIMESTAMPTZ DEFAULT NOW()
 );
 
+-- Cold storage blocks of an archived meetup's chat, in order; each is an
+-- object in the meetup-files bucket holding message_count messages, the
+-- newest of which is (last_created_at, last_message_id)
+CREATE TABLE message_archive_blocks (
+    meetup_id UUID NOT NULL REFERENCES meetups(id) ON DELETE CASCADE,
+    seq INTEGER NOT NULL,
+    storage_path TEXT NOT NULL,
+    byte_length INTEGER NOT NULL,
+    message_count INTEGER NOT NULL,
+    last_created_at TIMESTAMPTZ NOT NULL,
+    last_message_id UUID NOT NULL,
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    PRIMARY KEY (meetup_id, seq)
+);
+
 -- Indexes for performance
 CREATE INDEX idx_meetups_host_id ON meetups(host_id);
 CREATE INDEX idx_meetups_start_ts ON meetups(start_ts);
 CREATE INDEX idx_meetups_end_ts ON meetups(end_ts);
 CREATE INDEX idx_meetups_ended_at ON meetups(ended_at);
+CREATE INDEX idx_meetups_unarchived_end_ts ON meetups(end_ts) WHERE NOT is_archived;
+-- Archived meetups whose chat has not been moved to cold storage yet
+CREATE INDEX idx_meetups_uncompacted_ended_at ON meetups(ended_at)
+    WHERE is_archived AND messages_archived_at IS NULL;
+-- Time-window overlap ("what is on between A and B") for discovery; the btrees
+-- on start_ts and end_ts can each bound only one side of an overlap
+CREATE INDEX idx_meetups_active_range ON meetups
+    USING GIST (tstzrange(start_ts, end_ts, '[]')) WHERE NOT is_archived;
+CREATE INDEX idx_meetups_search_trgm ON meetups
+    USING GIN ((title || ' ' || coalesce(description, '')) gin_trgm_ops);
 
 CREATE INDEX idx_memberships_user_id ON memberships(user_id);
 CREATE INDEX idx_memberships_soft_banned ON memberships(soft_banned);
@@ -122,14 +186,19 @@ CREATE INDEX idx_memberships_soft_banned ON memberships(soft_banned);
 CREATE INDEX idx_invite_tokens_meetup_id ON invite_tokens(meetup_id);
 CREATE INDEX idx_invite_tokens_token ON invite_tokens(token);
 CREATE INDEX idx_invite_tokens_expires_at ON invite_tokens(expires_at);
+CREATE INDEX idx_invite_tokens_revoked_at ON invite_tokens(revoked_at);
 
 CREATE INDEX idx_messages_meetup_id_created_at ON messages(meetup_id, created_at);
 CREATE INDEX idx_messages_user_id ON messages(user_id);
+CREATE INDEX idx_messages_meetup_id_search ON messages USING GIN (meetup_id, search_vector);
 
 CREATE INDEX idx_files_meetup_id_created_at ON files(meetup_id, created_at);
 CREATE INDEX idx_files_user_id ON files(user_id);
 CREATE INDEX idx_files_deleted_at ON files(deleted_at);
 
+CREATE INDEX idx_file_derivatives_content_hash ON file_derivatives(content_hash);
+CREATE INDEX idx_file_uploads_pending ON file_uploads(meetup_id, expires_at) WHERE completed_at IS NULL;
+
 CREATE INDEX idx_reports_meetup_id ON reports(meetup_id);
 CREATE INDEX idx_reports_target_type_target_id ON reports(target_type, target_id);
 CREATE INDEX idx_reports_created_at ON reports(created_at);
@@ -144,8 +213,12 @@ ALTER TABLE memberships ENABLE ROW LEVEL SECURITY;
 ALTER TABLE invite_tokens ENABLE ROW LEVEL SECURITY;
 ALTER TABLE messages ENABLE ROW LEVEL SECURITY;
 ALTER TABLE files ENABLE ROW LEVEL SECURITY;
+ALTER TABLE file_uploads ENABLE ROW LEVEL SECURITY;
+ALTER TABLE file_derivatives ENABLE ROW LEVEL SECURITY;
 ALTER TABLE reports ENABLE ROW LEVEL SECURITY;
 ALTER TABLE soft_ban_events ENABLE ROW LEVEL SECURITY;
+-- No policies: only the service role reads and writes archive blocks
+ALTER TABLE message_archive_blocks ENABLE ROW LEVEL SECURITY;
 
 -- Users can read their own data and other users' public data
 CREATE POLICY "Users can view their own data" ON users
@@ -242,6 +315,11 @@ CREATE POLICY "Users can view files for their meetups" ON files
         deleted_at IS NULL
     );
 
+CREATE POLICY "Users can view derivatives of files they can view" ON file_derivatives
+    FOR SELECT USING (
+        file_id IN (SELECT id FROM files)
+    );
+
 CREATE POLICY "Users can insert files for their meetups" ON files
     FOR INSERT WITH CHECK (
         meetup_id IN (
@@ -404,7 +482,11 @@ CREATE OR REPLACE FUNCTION create_meetup(
     p_lng DOUBLE PRECISION,
     p_desc TEXT DEFAULT NULL,
     p_visibility visibility DEFAULT 'private',
-    p_token_ttl_hours INTEGER DEFAULT NULL
+    p_token_ttl_hours INTEGER DEFAULT NULL,
+    -- Set by the API when it issues a signed invite token, which embeds both IDs
+    p_meetup_id UUID DEFAULT NULL,
+    p_token_id UUID DEFAULT NULL,
+    p_token TEXT DEFAULT NULL
 )
 RETURNS TABLE(
     meetup_id UUID,
@@ -443,7 +525,7 @@ BEGIN
     END IF;
     
     -- Generate meetup ID
-    v_meetup_id := uuid_generate_v4();
+    v_meetup_id := coalesce(p_meetup_id, uuid_generate_v4());
     
     -- Generate fuzzed coordinates for public meetups
     IF p_visibility = 'public' THEN
@@ -466,7 +548,7 @@ BEGIN
     VALUES (v_meetup_id, p_host_id, 'host');
     
     -- Generate invite token
-    v_token := encode(gen_random_bytes(16), 'hex');
+    v_token := coalesce(p_token, encode(gen_random_bytes(16), 'hex'));
     
     -- Set expiry if specified
     IF p_token_ttl_hours IS NOT NULL THEN
@@ -476,8 +558,8 @@ BEGIN
     END IF;
     
     -- Insert invite token
-    INSERT INTO invite_tokens (meetup_id, token, expires_at, created_by)
-    VALUES (v_meetup_id, v_token, v_expires_at, p_host_id);
+    INSERT INTO invite_tokens (id, meetup_id, token, expires_at, created_by)
+    VALUES (coalesce(p_token_id, uuid_generate_v4()), v_meetup_id, v_token, v_expires_at, p_host_id);
     
     -- Generate deep link
     v_deep_link := 'pennapps://join/' || v_token;
@@ -491,6 +573,444 @@ BEGIN
 END;
 $$ LANGUAGE plpgsql SECURITY DEFINER;
 
+-- Ranked full-text search within one meetup's chat
+-- Pages are keyed on (rank, id) so callers can resume after the last hit they saw
+CREATE OR REPLACE FUNCTION search_messages(
+    p_meetup_id UUID,
+    p_query TEXT,
+    p_limit INTEGER DEFAULT 20,
+    p_after_rank REAL DEFAULT NULL,
+    p_after_id UUID DEFAULT NULL
+)
+RETURNS TABLE(
+    id UUID,
+    meetup_id UUID,
+    user_id UUID,
+    user_name TEXT,
+    type message_type,
+    text TEXT,
+    created_at TIMESTAMPTZ,
+    rank REAL,
+    headline TEXT
+) AS $$
+    WITH q AS (
+        SELECT websearch_to_tsquery('english', p_query) AS query
+    ),
+    hits AS (
+        SELECT m.id, m.meetup_id, m.user_id, m.type, m.text, m.created_at,
+               ts_rank(m.search_vector, q.query) AS rank
+        FROM messages m, q
+        WHERE m.meetup_id = p_meetup_id
+          AND m.search_vector @@ q.query
+    )
+    SELECT h.id, h.meetup_id, h.user_id, u.handle, h.type, h.text, h.created_at, h.rank,
+           ts_headline('english', h.text, q.query)
+    FROM hits h
+    CROSS JOIN q
+    LEFT JOIN users u ON u.id = h.user_id
+    WHERE p_after_rank IS NULL OR (h.rank, h.id) < (p_after_rank, p_after_id)
+    ORDER BY h.rank DESC, h.id DESC
+    LIMIT p_limit;
+$$ LANGUAGE sql STABLE;
+
+-- Typo-tolerant meetup search over public meetups and the user's own meetups
+-- Public meetups the user has not joined only expose their fuzzed coordinates
+CREATE OR REPLACE FUNCTION search_meetups(
+    p_user_id UUID,
+    p_query TEXT,
+    p_window_start TIMESTAMPTZ DEFAULT NULL,
+    p_window_end TIMESTAMPTZ DEFAULT NULL,
+    p_lat DOUBLE PRECISION DEFAULT NULL,
+    p_lng DOUBLE PRECISION DEFAULT NULL,
+    p_radius_m DOUBLE PRECISION DEFAULT NULL,
+    p_limit INTEGER DEFAULT 20
+)
+RETURNS TABLE(
+    id UUID,
+    title TEXT,
+    description TEXT,
+    start_ts TIMESTAMPTZ,
+    end_ts TIMESTAMPTZ,
+    lat DOUBLE PRECISION,
+    lng DOUBLE PRECISION,
+    visibility visibility,
+    attendee_count INTEGER,
+    is_member BOOLEAN,
+    score REAL
+) AS $$
+    SELECT m.id, m.title, m.description, m.start_ts, m.end_ts,
+           CASE WHEN mb.user_id IS NOT NULL THEN m.lat ELSE m.public_lat END,
+           CASE WHEN mb.user_id IS NOT NULL THEN m.lng ELSE m.public_lng END,
+           m.visibility, m.attendee_count,
+           mb.user_id IS NOT NULL,
+           word_similarity(p_query, m.title || ' ' || coalesce(m.description, ''))
+    FROM meetups m
+    LEFT JOIN memberships mb ON mb.meetup_id = m.id AND mb.user_id = p_user_id
+    WHERE p_query <% (m.title || ' ' || coalesce(m.description, ''))
+      AND (m.visibility = 'public' OR mb.user_id IS NOT NULL)
+      AND NOT m.is_archived
+      -- NULL bounds leave the range open on that side
+      AND tstzrange(m.start_ts, m.end_ts, '[]') && tstzrange(p_window_start, p_window_end, '[]')
+      AND (
+          p_radius_m IS NULL OR
+          -- Haversine distance on the coordinates the caller is allowed to see
+          2 * 6371000 * asin(sqrt(
+              power(sin(radians(coalesce(CASE WHEN mb.user_id IS NOT NULL THEN m.lat END, m.public_lat) - p_lat) / 2), 2) +
+              cos(radians(p_lat)) * cos(radians(coalesce(CASE WHEN mb.user_id IS NOT NULL THEN m.lat END, m.public_lat))) *
+              power(sin(radians(coalesce(CASE WHEN mb.user_id IS NOT NULL THEN m.lng END, m.public_lng) - p_lng) / 2), 2)
+          )) <= p_radius_m
+      )
+    ORDER BY 11 DESC, m.start_ts
+    LIMIT p_limit;
+$$ LANGUAGE sql STABLE;
+
+-- Public meetups and the user's own meetups running at any point of
+-- [p_at, p_until], soonest start first: "happening now" when p_until = p_at,
+-- "upcoming" for a window ahead. Keyset-paged on (start_ts, id). Public
+-- meetups the user has not joined only expose their fuzzed coordinates
+CREATE OR REPLACE FUNCTION active_meetups(
+    p_user_id UUID,
+    p_at TIMESTAMPTZ,
+    p_until TIMESTAMPTZ,
+    p_limit INTEGER DEFAULT 20,
+    p_after_start TIMESTAMPTZ DEFAULT NULL,
+    p_after_id UUID DEFAULT NULL
+)
+RETURNS TABLE(
+    id UUID,
+    title TEXT,
+    description TEXT,
+    start_ts TIMESTAMPTZ,
+    end_ts TIMESTAMPTZ,
+    lat DOUBLE PRECISION,
+    lng DOUBLE PRECISION,
+    visibility visibility,
+    attendee_count INTEGER,
+    is_member BOOLEAN
+) AS $$
+    SELECT m.id, m.title, m.description, m.start_ts, m.end_ts,
+           CASE WHEN mb.user_id IS NOT NULL THEN m.lat ELSE m.public_lat END,
+           CASE WHEN mb.user_id IS NOT NULL THEN m.lng ELSE m.public_lng END,
+           m.visibility, m.attendee_count,
+           mb.user_id IS NOT NULL
+    FROM meetups m
+    LEFT JOIN memberships mb ON mb.meetup_id = m.id AND mb.user_id = p_user_id
+    -- Matches idx_meetups_active_range
+    WHERE tstzrange(m.start_ts, m.end_ts, '[]') && tstzrange(p_at, p_until, '[]')
+      AND NOT m.is_archived
+      AND (m.visibility = 'public' OR mb.user_id IS NOT NULL)
+      AND (p_after_start IS NULL OR (m.start_ts, m.id) > (p_after_start, p_after_id))
+    ORDER BY m.start_ts, m.id
+    LIMIT p_limit;
+$$ LANGUAGE sql STABLE;
+
+-- Home screen: the user's unarchived meetups that haven't ended by p_at,
+-- soonest start first
+CREATE OR REPLACE FUNCTION joined_meetups(
+    p_user_id UUID,
+    p_at TIMESTAMPTZ,
+    p_limit INTEGER DEFAULT 10
+)
+RETURNS TABLE(
+    id UUID,
+    title TEXT,
+    description TEXT,
+    start_ts TIMESTAMPTZ,
+    end_ts TIMESTAMPTZ,
+    lat DOUBLE PRECISION,
+    lng DOUBLE PRECISION,
+    visibility visibility,
+    attendee_count INTEGER,
+    is_member BOOLEAN
+) AS $$
+    SELECT m.id, m.title, m.description, m.start_ts, m.end_ts, m.lat, m.lng,
+           m.visibility, m.attendee_count, TRUE
+    FROM memberships mb
+    JOIN meetups m ON m.id = mb.meetup_id
+    WHERE mb.user_id = p_user_id
+      AND NOT m.is_archived
+      AND m.end_ts >= p_at
+    ORDER BY m.start_ts, m.id
+    LIMIT p_limit;
+$$ LANGUAGE sql STABLE;
+
+-- Home screen: public meetups the user hasn't joined within p_radius_m of
+-- (p_lat, p_lng) running at any point of [p_at, p_until], soonest start
+-- first. Only fuzzed coordinates are exposed, and distance is measured on them
+CREATE OR REPLACE FUNCTION nearby_meetups(
+    p_user_id UUID,
+    p_lat DOUBLE PRECISION,
+    p_lng DOUBLE PRECISION,
+    p_radius_m DOUBLE PRECISION,
+    p_at TIMESTAMPTZ,
+    p_until TIMESTAMPTZ,
+    p_limit INTEGER DEFAULT 10
+)
+RETURNS TABLE(
+    id UUID,
+    title TEXT,
+    description TEXT,
+    start_ts TIMESTAMPTZ,
+    end_ts TIMESTAMPTZ,
+    lat DOUBLE PRECISION,
+    lng DOUBLE PRECISION,
+    visibility visibility,
+    attendee_count INTEGER,
+    is_member BOOLEAN
+) AS $$
+    SELECT m.id, m.title, m.description, m.start_ts, m.end_ts, m.public_lat, m.public_lng,
+           m.visibility, m.attendee_count, FALSE
+    FROM meetups m
+    -- Matches idx_meetups_active_range
+    WHERE tstzrange(m.start_ts, m.end_ts, '[]') && tstzrange(p_at, p_until, '[]')
+      AND NOT m.is_archived
+      AND m.visibility = 'public'
+      AND NOT EXISTS (
+          SELECT 1 FROM memberships mb WHERE mb.meetup_id = m.id AND mb.user_id = p_user_id
+      )
+      AND 2 * 6371000 * asin(sqrt(
+          power(sin(radians(m.public_lat - p_lat) / 2), 2) +
+          cos(radians(p_lat)) * cos(radians(m.public_lat)) *
+          power(sin(radians(m.public_lng - p_lng) / 2), 2)
+      )) <= p_radius_m
+    ORDER BY m.start_ts, m.id
+    LIMIT p_limit;
+$$ LANGUAGE sql STABLE;
+
+-- Home screen: the latest chat across the user's unarchived meetups, newest
+-- first. Each meetup contributes at most p_limit rows, read backwards from
+-- idx_messages_meetup_id_created_at
+CREATE OR REPLACE FUNCTION recent_messages(
+    p_user_id UUID,
+    p_limit INTEGER DEFAULT 20
+)
+RETURNS TABLE(
+    id UUID,
+    meetup_id UUID,
+    user_id UUID,
+    user_name TEXT,
+    type message_type,
+    text TEXT,
+    created_at TIMESTAMPTZ
+) AS $$
+    SELECT r.id, r.meetup_id, r.user_id, u.handle, r.type, r.text, r.created_at
+    FROM memberships mb
+    JOIN meetups m ON m.id = mb.meetup_id AND NOT m.is_archived
+    CROSS JOIN LATERAL (
+        SELECT msg.id, msg.meetup_id, msg.user_id, msg.type, msg.text, msg.created_at
+        FROM messages msg
+        WHERE msg.meetup_id = mb.meetup_id
+        ORDER BY msg.created_at DESC
+        LIMIT p_limit
+    ) r
+    LEFT JOIN users u ON u.id = r.user_id
+    WHERE mb.user_id = p_user_id
+    ORDER BY r.created_at DESC, r.id DESC
+    LIMIT p_limit;
+$$ LANGUAGE sql STABLE;
+
+-- One batch of background cleanup, called periodically by the API's sweeper
+-- Archives ended meetups, revokes tokens of archived meetups and purges tokens
+-- that expired more than p_token_retention ago, or were revoked that long ago
+-- and have expired since. Returns locked = FALSE without doing anything if
+-- another sweeper holds the lock.
+CREATE OR REPLACE FUNCTION sweep_expired(
+    p_batch_size INTEGER DEFAULT 500,
+    p_token_retention INTERVAL DEFAULT INTERVAL '7 days'
+)
+RETURNS TABLE(
+    locked BOOLEAN,
+    archived_meetup_ids UUID[],
+    revoked_tokens INTEGER,
+    purged_tokens INTEGER
+) AS $$
+BEGIN
+    IF NOT pg_try_advisory_xact_lock(hashtext('sweep_expired')) THEN
+        locked := FALSE;
+        RETURN NEXT;
+        RETURN;
+    END IF;
+    locked := TRUE;
+    
+    WITH batch AS (
+        SELECT id FROM meetups
+        WHERE NOT is_archived AND (end_ts < NOW() OR ended_at IS NOT NULL)
+        ORDER BY end_ts
+        LIMIT p_batch_size
+        FOR UPDATE SKIP LOCKED
+    ), archived AS (
+        UPDATE meetups m
+        SET is_archived = TRUE, ended_at = COALESCE(m.ended_at, m.end_ts)
+        FROM batch
+        WHERE m.id = batch.id
+        RETURNING m.id
+    )
+    SELECT COALESCE(array_agg(id), '{}') INTO archived_meetup_ids FROM archived;
+    
+    WITH batch AS (
+        SELECT t.id FROM invite_tokens t
+        JOIN meetups m ON m.id = t.meetup_id
+        WHERE m.is_archived AND t.revoked_at IS NULL
+        LIMIT p_batch_size
+        FOR UPDATE OF t SKIP LOCKED
+    ), revoked AS (
+        UPDATE invite_tokens t
+        SET revoked_at = NOW()
+        FROM batch
+        WHERE t.id = batch.id
+        RETURNING t.id
+    )
+    SELECT count(*) INTO revoked_tokens FROM revoked;
+    
+    -- A revoked row stays until its token expires: signed tokens are checked
+    -- without a lookup, so the row is all that keeps one from verifying again
+    WITH batch AS (
+        SELECT id FROM invite_tokens
+        WHERE expires_at < NOW() - p_token_retention
+           OR (revoked_at < NOW() - p_token_retention AND expires_at < NOW())
+        LIMIT p_batch_size
+        FOR UPDATE SKIP LOCKED
+    ), purged AS (
+        DELETE FROM invite_tokens t
+        USING batch
+        WHERE t.id = batch.id
+        RETURNING t.id
+    )
+    SELECT count(*) INTO purged_tokens FROM purged;
+    
+    RETURN NEXT;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+-- Delete a meetup's messages up to (p_created_at, p_id), the newest message in
+-- its cold storage. Ancestors of newer, not yet archived messages are
+-- kept: the parent_id cascade would delete those replies with them. They go
+-- in a later batch, once the replies are archived too.
+CREATE OR REPLACE FUNCTION delete_archived_messages(
+    p_meetup_id UUID,
+    p_created_at TIMESTAMPTZ,
+    p_id UUID
+)
+RETURNS INTEGER AS $$
+DECLARE
+    deleted INTEGER;
+BEGIN
+    WITH RECURSIVE kept(id) AS (
+        SELECT parent_id FROM messages
+        WHERE meetup_id = p_meetup_id
+          AND (created_at, id) > (p_created_at, p_id)
+          AND parent_id IS NOT NULL
+        UNION
+        SELECT m.parent_id FROM messages m
+        JOIN kept ON m.id = kept.id
+        WHERE m.parent_id IS NOT NULL
+    ), removed AS (
+        DELETE FROM messages m
+        WHERE m.meetup_id = p_meetup_id
+          AND (m.created_at, m.id) <= (p_created_at, p_id)
+          AND NOT EXISTS (SELECT 1 FROM kept WHERE kept.id = m.id)
+        RETURNING m.id
+    )
+    SELECT count(*) INTO deleted FROM removed;
+    RETURN deleted;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+-- Record an uploaded cold storage block and delete the hot messages it holds,
+-- in one transaction, so every message is always in one place or the other.
+-- p_seq is the number of blocks already recorded: two compactions of the same
+-- meetup both try the same seq and the second fails on the primary key.
+CREATE OR REPLACE FUNCTION archive_message_block(
+    p_meetup_id UUID,
+    p_seq INTEGER,
+    p_storage_path TEXT,
+    p_byte_length INTEGER,
+    p_message_count INTEGER,
+    p_last_created_at TIMESTAMPTZ,
+    p_last_message_id UUID
+)
+RETURNS INTEGER AS $$
+BEGIN
+    INSERT INTO message_archive_blocks (
+        meetup_id, seq, storage_path, byte_length, message_count, last_created_at, last_message_id
+    ) VALUES (
+        p_meetup_id, p_seq, p_storage_path, p_byte_length, p_message_count, p_last_created_at, p_last_message_id
+    );
+    RETURN delete_archived_messages(p_meetup_id, p_last_created_at, p_last_message_id);
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+-- Start a resumable upload if the meetup has room for it
+-- The meetup row is locked so concurrent reservations cannot overshoot the
+-- quota. Status is one of: ok, not_member, too_many_files, quota_exceeded.
+CREATE OR REPLACE FUNCTION reserve_file_upload(
+    p_meetup_id UUID,
+    p_user_id UUID,
+    p_type file_type,
+    p_filename TEXT,
+    p_storage_path TEXT,
+    p_upload_length BIGINT,
+    p_max_meetup_bytes BIGINT,
+    p_max_files INTEGER
+)
+RETURNS TABLE(status TEXT, upload_id UUID, expires_at TIMESTAMPTZ) AS $$
+DECLARE
+    used_bytes BIGINT;
+    used_files INTEGER;
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM memberships
+        WHERE meetup_id = p_meetup_id AND user_id = p_user_id AND NOT soft_banned
+    ) THEN
+        status := 'not_member';
+        RETURN NEXT;
+        RETURN;
+    END IF;
+    
+    SELECT m.total_bytes, m.files_count INTO used_bytes, used_files
+    FROM meetups m WHERE m.id = p_meetup_id FOR UPDATE;
+    
+    SELECT used_bytes + COALESCE(SUM(u.upload_length), 0), used_files + count(*)
+    INTO used_bytes, used_files
+    FROM file_uploads u
+    WHERE u.meetup_id = p_meetup_id AND u.completed_at IS NULL AND u.expires_at > NOW();
+    
+    IF used_files + 1 > p_max_files THEN
+        status := 'too_many_files';
+    ELSIF used_bytes + p_upload_length > p_max_meetup_bytes THEN
+        status := 'quota_exceeded';
+    ELSE
+        INSERT INTO file_uploads (meetup_id, user_id, type, filename, storage_path, upload_length)
+        VALUES (p_meetup_id, p_user_id, p_type, p_filename, p_storage_path, p_upload_length)
+        RETURNING file_uploads.id, file_uploads.expires_at INTO upload_id, expires_at;
+        status := 'ok';
+    END IF;
+    RETURN NEXT;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+-- Turn a fully received upload into a files row (the file stats trigger
+-- then moves its bytes from the reservation into meetups.total_bytes)
+CREATE OR REPLACE FUNCTION complete_file_upload(p_upload_id UUID)
+RETURNS UUID AS $$
+DECLARE
+    new_file_id UUID;
+BEGIN
+    SELECT file_id INTO new_file_id FROM file_uploads WHERE id = p_upload_id FOR UPDATE;
+    IF new_file_id IS NOT NULL THEN
+        RETURN new_file_id;
+    END IF;
+    
+    INSERT INTO files (meetup_id, user_id, type, storage_path, filename, size_bytes)
+    SELECT meetup_id, user_id, type, storage_path, filename, upload_length
+    FROM file_uploads WHERE id = p_upload_id
+    RETURNING id INTO new_file_id;
+    
+    UPDATE file_uploads SET file_id = new_file_id, completed_at = NOW() WHERE id = p_upload_id;
+    RETURN new_file_id;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
 -- Create storage bucket for meetup files
 INSERT INTO storage.buckets (id, name, public) VALUES ('meetup-files', 'meetup-files', false);
 